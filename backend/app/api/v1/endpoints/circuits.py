@@ -16,6 +16,8 @@ class PartitionRequest(BaseModel):
     num_qubits: int
     placed_gates: list
     measurements: list
+    observables: Optional[list] = None
+    noise: Optional[dict] = None
     options: Optional[dict] = None
     strategy: Optional[str] = "kahn"
     session_id: Optional[str] = None
@@ -56,6 +58,8 @@ async def partition_circuit(
         num_qubits=request.num_qubits,
         placed_gates=request.placed_gates,
         measurements=request.measurements,
+        observables=request.observables,
+        noise=request.noise,
         options=request.options,
         strategy=request.strategy or "kahn",
         session_id=request.session_id,
@@ -233,6 +237,8 @@ async def run_partition(
     strategy: str = "kahn",
     session_id: Optional[str] = None,
     circuit_name: Optional[str] = None,
+    observables: Optional[list] = None,
+    noise: Optional[dict] = None,
 ) -> None:
     room = f"partition-{job_id}"
     client = None
@@ -283,6 +289,8 @@ async def run_partition(
             options=options or {},
             strategy=strategy,
             circuit_name=circuit_name,
+            observables=observables,
+            noise=noise,
         ):
             await manager.broadcast_to_room(room, {
                 **update,
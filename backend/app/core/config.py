@@ -44,6 +44,8 @@ class Settings(BaseSettings):
     SQUANDER_SSH_USER: Optional[str] = None
     SQUANDER_SSH_PATH: Optional[str] = None
     SQUANDER_EXEC_TIMEOUT: int = 300
+    # Unix socket of a resident `simulate.py --serve` on the SQUANDER host, jobs start a fresh interpreter when unset
+    SQUANDER_SIMULATION_SOCKET: Optional[str] = None
     SSH_KEY_PATH: Optional[str] = None
     SSH_TIMEOUT: int = 30
 
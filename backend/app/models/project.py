@@ -25,47 +25,120 @@ class PartitionInfo(BaseModel):
     max_partition_size: int
     total_partitions: int
     partitions: List[Partition]
+    cached: Optional[bool] = None
 
 class DensityMatrix(BaseModel):
     """density matrix"""
     real: Optional[List[List[float]]] = None
     imag: Optional[List[List[float]]] = None
+    qubits: Optional[List[int]] = None
 
 class EntropyScaling(BaseModel):
     """entropy scaling data"""
     subsystem_size: int
     entropy: float
+    von_neumann_entropy: Optional[float] = None
+
+class SparseProbabilities(BaseModel):
+    """probabilities of selected outcomes in (index, value) form"""
+    indices: List[int]
+    values: List[float]
+    num_outcomes: int
+    retained_probability: Optional[float] = None
+
+class ObservableValue(BaseModel):
+    """expectation value of a Pauli-string observable"""
+    name: str
+    expectation: float
 
 class QuantumState(BaseModel):
     """quantum state data"""
     state_vector: Optional[List[List[float]]] = None
     probabilities: Optional[List[float]] = None
+    sparse_probabilities: Optional[SparseProbabilities] = None
     counts: Optional[Dict[str, int]] = None
     density_matrix: Optional[DensityMatrix] = None
     entropy_scaling: Optional[List[EntropyScaling]] = None
+    observables: Optional[List[ObservableValue]] = None
     unitary: Optional[List[List[float]]] = None
+    cached: Optional[List[str]] = None
 
 class SimulationComparison(BaseModel):
     """comparison between original and partitioned"""
     fidelity: Optional[float] = None
     probability_difference: Optional[List[float]] = None
     max_difference: Optional[float] = None
+    total_variation_distance: Optional[float] = None
+    hellinger_distance: Optional[float] = None
+    kl_divergence: Optional[float] = None
 
 class SimulationError(BaseModel):
     """simulation error"""
     stage: str
     error: str
     timeout: Optional[bool] = None
+    checkpoint: Optional[str] = None
+    resumed: Optional[int] = None
+
+class ResourceEstimate(BaseModel):
+    """pre-flight memory and runtime estimate"""
+    peak_bytes: int
+    estimated_seconds: float
+    memory_budget: Optional[int] = None
+    downgrades: List[str] = []
+
+class PrecisionCheck(BaseModel):
+    """reduced precision state compared against a double precision run"""
+    fidelity: float
+    max_amplitude_error: float
+
+class SimulationPrecision(BaseModel):
+    """state vector precision of the simulation"""
+    simulation: str = "double"
+    backend: Optional[str] = None
+    check: Optional[PrecisionCheck] = None
+
+class StageMetric(BaseModel):
+    """resource usage of one pipeline stage"""
+    stage: str
+    wall_seconds: float
+    cpu_seconds: float
+    peak_rss_delta: Optional[int] = None
+    array_bytes: int = 0
+
+class NoisyResults(BaseModel):
+    """Monte-Carlo trajectory simulation of the circuit's noise model"""
+    trajectories: int
+    num_shots: int
+    counts: Dict[str, int]
+    probabilities: Optional[List[float]] = None
+    sparse_probabilities: Optional[SparseProbabilities] = None
+    fidelity: Optional[float] = None
+    error_branches: int = 0
+    comparison: Optional[SimulationComparison] = None
+
+class ShardingInfo(BaseModel):
+    """state vector shards of the partitioned simulation"""
+    shards: int
+    workers: int
+    steps: int
+    shard_swaps: int
 
 class SimulationResults(BaseModel):
     """simulation results for a circuit"""
     num_qubits: Optional[int] = None
     num_shots: Optional[int] = None
+    measured_qubits: Optional[List[int]] = None
     errors: Optional[List[SimulationError]] = None
     partition_info: Optional[PartitionInfo] = None
     original: Optional[QuantumState] = None
     partitioned: Optional[QuantumState] = None
     comparison: Optional[SimulationComparison] = None
+    noisy: Optional[NoisyResults] = None
+    sharding: Optional[ShardingInfo] = None
+    precision: Optional[SimulationPrecision] = None
+    resource_estimate: Optional[ResourceEstimate] = None
+    metrics: Optional[List[StageMetric]] = None
     timestamp: Optional[int] = None
 
 class GateDefinition(BaseModel):
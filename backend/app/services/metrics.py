@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+SQUANDER Simulation Stage Metrics
+
+Measures the stages of the simulation pipeline: wall time, CPU time, peak RSS
+growth and bytes of arrays allocated. Peak RSS is read from the VmHWM
+high-water mark, which is reset through /proc/self/clear_refs when a stage
+starts, so every stage reports its own peak instead of the process lifetime
+one. Stages executed by the StageWorker child are measured there and folded
+into the stage record of the parent.
+
+Copyright 2024 SQUANDER
+Licensed under Apache License 2.0
+"""
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+MIB = 1 << 20
+
+def _status_bytes(field: str) -> Optional[int]:
+    """a kB field of /proc/self/status in bytes, None where it is not available"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def _reset_peak_rss() -> bool:
+    """reset VmHWM to the current RSS, False where the kernel does not allow it"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def array_bytes(value: Any) -> int:
+    """total bytes of the numpy arrays in a nested result"""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(array_bytes(v) for v in value.values())
+    if isinstance(value, list):
+        return sum(array_bytes(v) for v in value)
+    return 0
+
+class UsageMeter:
+    """wall time, CPU time and peak RSS growth of the current process between start and stop"""
+    def start(self) -> "UsageMeter":
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._peak_reset = _reset_peak_rss()
+        # without a reset only growth beyond the lifetime peak is visible
+        self._rss = _status_bytes('VmRSS' if self._peak_reset else 'VmHWM')
+        return self
+
+    def stop(self) -> Dict[str, Any]:
+        peak = _status_bytes('VmHWM')
+        return {
+            'wall_seconds': time.perf_counter() - self._wall,
+            'cpu_seconds': time.process_time() - self._cpu,
+            'peak_rss_delta': max(peak - self._rss, 0) if peak is not None and self._rss is not None else None
+        }
+
+    def __enter__(self) -> "UsageMeter":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.usage = self.stop()
+
+def _max_or_none(values: List[Optional[int]]) -> Optional[int]:
+    known = [value for value in values if value is not None]
+    return max(known) if known else None
+
+class StageMetrics:
+    """
+    per-stage records of one pipeline run, a stage lasting from enter(name) until the next stage starts
+    every finished stage is also printed as a [metrics] log line
+    """
+    def __init__(self):
+        self.stages: List[Dict[str, Any]] = []
+        self._current = None
+        self._worker = None
+        self._pool = None
+
+    def track(self, worker=None, pool=None):
+        """fold in work done by a StageWorker child and arrays allocated from a SharedArrayPool"""
+        self._worker = worker
+        self._pool = pool
+        if self._current is not None:
+            self._current['worker_runs'] = len(worker.usage) if worker is not None else 0
+            self._current['pool_bytes'] = pool.allocated_bytes if pool is not None else 0
+
+    def enter(self, stage: str):
+        """start measuring stage, finishing the previous one; repeated names continue the current stage"""
+        if self._current is not None and self._current['stage'] == stage:
+            return
+        self.finish()
+        self._current = {
+            'stage': stage,
+            'meter': UsageMeter().start(),
+            'worker_runs': len(self._worker.usage) if self._worker is not None else 0,
+            'pool_bytes': self._pool.allocated_bytes if self._pool is not None else 0,
+            'array_bytes': 0
+        }
+
+    def add_array_bytes(self, nbytes: int):
+        """count arrays the current stage allocated outside the shared pool"""
+        if self._current is not None:
+            self._current['array_bytes'] += nbytes
+
+    def finish(self):
+        """close the current stage"""
+        if self._current is None:
+            return
+        current, self._current = self._current, None
+        usage = current['meter'].stop()
+        worker_usage = self._worker.usage[current['worker_runs']:] if self._worker is not None else []
+        pool_bytes = self._pool.allocated_bytes - current['pool_bytes'] if self._pool is not None else 0
+        record = {
+            'stage': current['stage'],
+            'wall_seconds': usage['wall_seconds'],
+            'cpu_seconds': usage['cpu_seconds'] + sum(run['cpu_seconds'] for run in worker_usage),
+            'peak_rss_delta': _max_or_none([usage['peak_rss_delta']] + [run['peak_rss_delta'] for run in worker_usage]),
+            'array_bytes': current['array_bytes'] + max(pool_bytes, 0)
+        }
+        self.stages.append(record)
+        peak = f"{record['peak_rss_delta'] / MIB:+.1f}MiB" if record['peak_rss_delta'] is not None else "n.a."
+        print(
+            f"[metrics] {record['stage']}: wall {record['wall_seconds']:.3f}s cpu {record['cpu_seconds']:.3f}s "
+            f"peak_rss {peak} arrays {record['array_bytes'] / MIB:.1f}MiB",
+            flush=True
+        )
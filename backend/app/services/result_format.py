@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+SQUANDER Simulation Result Container
+
+Binary alternative to the nested-list result.json: every NumPy array of the
+results is stored as a little-endian .npy member of an uncompressed .npz
+archive, and everything else goes into a small JSON manifest member that
+references the arrays by key. simulate.py writes the archive on the SQUANDER
+host; the backend reads it back with the arrays kept as NumPy buffers and only
+flattens them into the JSON layout at the API boundary.
+
+The result stream is the incremental companion of both: simulate.py appends
+one NDJSON record per result section as soon as that section is ready, so the
+backend can forward partial results while the heavy stages are still running.
+
+Stream layout (one JSON object per line):
+    {"format": "squander-result-stream", "version": 1}
+    {"section": "<top-level result key>", "data": ...}    (repeated)
+    {"complete": true}                                    (last, once the run finished)
+A section recorded twice is merged key by key, so a first record can carry the
+counts of a state and a later one the rest of it.
+
+Copyright 2024 SQUANDER
+Licensed under Apache License 2.0
+"""
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Union
+
+import numpy as np
+
+FORMAT_NAME = "squander-result"
+FORMAT_VERSION = 1
+MANIFEST_KEY = "__manifest__"
+ARRAY_REF = "__array__"
+STREAM_FORMAT_NAME = "squander-result-stream"
+# stdout line prefix announcing that a section was appended to the stream
+STREAM_MARKER = "[result]"
+# decimals kept when flattening single-precision arrays, about float32 resolution for values in [-1, 1]
+FLOAT32_DECIMALS = 7
+
+def _extract_arrays(value: Any, key: str, arrays: Dict[str, np.ndarray]) -> Any:
+    """replace arrays in value with manifest references, collecting them in arrays"""
+    if isinstance(value, np.ndarray):
+        arrays[key] = np.ascontiguousarray(value, dtype=value.dtype.newbyteorder('<'))
+        return {ARRAY_REF: key}
+    if isinstance(value, dict):
+        return {k: _extract_arrays(v, f"{key}.{k}" if key else str(k), arrays) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_extract_arrays(v, f"{key}.{i}", arrays) for i, v in enumerate(value)]
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    return value
+
+def _resolve_arrays(value: Any, archive) -> Any:
+    if isinstance(value, dict):
+        if set(value) == {ARRAY_REF}:
+            return archive[value[ARRAY_REF]]
+        return {k: _resolve_arrays(v, archive) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_resolve_arrays(v, archive) for v in value]
+    return value
+
+def write_result_archive(results: Dict, path: Union[str, Path]):
+    """write results with raw NumPy arrays to an .npz archive with a JSON manifest"""
+    arrays: Dict[str, np.ndarray] = {}
+    manifest = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'results': _extract_arrays(results, "", arrays)
+    }
+    arrays[MANIFEST_KEY] = np.frombuffer(json.dumps(manifest).encode(), dtype=np.uint8)
+    with open(path, 'wb') as f:
+        np.savez(f, **arrays)
+
+def read_result_archive(path: Union[str, Path]) -> Dict:
+    """read an archive written by write_result_archive, arrays come back as NumPy arrays"""
+    with np.load(path, allow_pickle=False) as archive:
+        manifest = json.loads(archive[MANIFEST_KEY].tobytes().decode())
+        if manifest.get('format') != FORMAT_NAME:
+            raise ValueError(f"Not a {FORMAT_NAME} archive: {path}")
+        if manifest.get('version', 0) > FORMAT_VERSION:
+            raise ValueError(f"Unsupported {FORMAT_NAME} version {manifest.get('version')}")
+        return _resolve_arrays(manifest['results'], archive)
+
+def array_to_json(value: np.ndarray) -> list:
+    """
+    flatten an array into the JSON result layout with vectorised tolist calls
+    complex arrays become [[real, imag], ...] over the flattened array
+    """
+    if np.iscomplexobj(value):
+        return np.stack((value.real, value.imag), axis=-1).reshape(-1, 2).astype(np.float64).tolist()
+    if value.dtype == np.float32:
+        # float32 -> float64 widening would otherwise print 17 noisy digits per entry
+        return np.round(value.astype(np.float64), FLOAT32_DECIMALS).tolist()
+    return value.tolist()
+
+def to_json_compatible(results: Any) -> Any:
+    """convert results with NumPy arrays to the plain JSON layout of result.json"""
+    if isinstance(results, np.ndarray):
+        return array_to_json(results)
+    if isinstance(results, dict):
+        return {k: to_json_compatible(v) for k, v in results.items()}
+    if isinstance(results, list):
+        return [to_json_compatible(v) for v in results]
+    if isinstance(results, np.integer):
+        return int(results)
+    if isinstance(results, np.floating):
+        return float(results)
+    return results
+
+def _drop_arrays(value: Any) -> Any:
+    """leave NumPy arrays out of value, for streams that keep them to the result file"""
+    if isinstance(value, dict):
+        return {k: _drop_arrays(v) for k, v in value.items() if not isinstance(v, np.ndarray)}
+    if isinstance(value, list):
+        return [_drop_arrays(v) for v in value if not isinstance(v, np.ndarray)]
+    return value
+
+class ResultStreamWriter:
+    """
+    append result sections to an NDJSON stream, flushing every record so a reader tailing the file sees whole sections
+    arrays are flattened into the JSON layout, or left out with include_arrays=False
+    """
+    def __init__(self, path: Union[str, Path], include_arrays: bool = False):
+        self.include_arrays = include_arrays
+        self._file = open(path, 'w')
+        self._write({'format': STREAM_FORMAT_NAME, 'version': FORMAT_VERSION})
+
+    def _write(self, record: Dict):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def write_section(self, section: str, data: Any):
+        self._write({'section': section, 'data': to_json_compatible(data if self.include_arrays else _drop_arrays(data))})
+
+    def close(self, complete: bool = True):
+        """end the stream, marking it complete unless the run failed"""
+        if self._file.closed:
+            return
+        if complete:
+            self._write({'complete': True})
+        self._file.close()
+
+    def __enter__(self) -> "ResultStreamWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        self.close(complete=exc_type is None)
+
+def parse_stream_records(data: bytes) -> Tuple[List[Dict], int]:
+    """
+    decode the whole NDJSON records at the start of data, returning them and the bytes they took
+    a trailing line still being written is left for the next read
+    """
+    end = data.rfind(b"\n") + 1
+    records = [json.loads(line) for line in data[:end].decode().splitlines() if line.strip()]
+    return records, end
+
+def merge_section(results: Dict, section: str, data: Any):
+    """merge a streamed section into results, key by key when both are objects"""
+    if isinstance(data, dict) and isinstance(results.get(section), dict):
+        results[section] = {**results[section], **data}
+    else:
+        results[section] = data
+
+def read_result_stream(path: Union[str, Path]) -> Tuple[Dict, bool]:
+    """read a stream written by ResultStreamWriter, returning the merged results and whether the run completed"""
+    with open(path, 'rb') as f:
+        records, _ = parse_stream_records(f.read())
+    if not records or records[0].get('format') != STREAM_FORMAT_NAME:
+        raise ValueError(f"Not a {STREAM_FORMAT_NAME} file: {path}")
+    if records[0].get('version', 0) > FORMAT_VERSION:
+        raise ValueError(f"Unsupported {STREAM_FORMAT_NAME} version {records[0].get('version')}")
+    results: Dict = {}
+    complete = False
+    for record in records[1:]:
+        if 'section' in record:
+            merge_section(results, record['section'], record['data'])
+        complete = complete or bool(record.get('complete'))
+    return results, complete
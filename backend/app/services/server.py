@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+SQUANDER Simulation Server
+
+Keeps the simulation code resident so that jobs skip interpreter start-up and
+the imports of NumPy, SQUANDER, the partitioner and the optional qiskit/bqskit
+toolchains. Requests are newline-delimited JSON-RPC 2.0 messages read from
+stdin or from a Unix socket. Every job runs in its own forked child (and
+process group), so a crash, leak or timeout of one job cannot affect the
+server or the next job; its stdout is streamed back to the caller line by line
+as "progress" notifications followed by the JSON-RPC response.
+
+Started with `python3 simulate.py --serve [--socket PATH]`. This file also
+works as a lightweight stdlib-only client that forwards one job to a running
+server and prints its progress lines as if simulate.py ran locally:
+
+    python3 -u server.py --connect /tmp/squander-simulate.sock --cwd JOB_DIR -- circuit.json --output result.npz
+
+The client exits with EXIT_UNAVAILABLE when no server is listening, so callers
+can fall back to running simulate.py directly.
+
+Copyright 2024 SQUANDER
+Licensed under Apache License 2.0
+"""
+import io
+import os
+import sys
+import json
+import time
+import signal
+import contextlib
+import socket
+import argparse
+import importlib
+import threading
+import socketserver
+import multiprocessing
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+JSONRPC_VERSION = "2.0"
+# JSON-RPC 2.0 error codes, the last two from the implementation-defined server error range
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+JOB_FAILED = -32000
+JOB_TIMEOUT = -32001
+# client exit status when no server is listening (EX_TEMPFAIL)
+EXIT_UNAVAILABLE = 75
+# seconds the output of a finished job is still drained before its process group is killed
+DRAIN_SECONDS = 1.0
+
+def preload(modules: List[str]) -> List[str]:
+    """import optional modules ahead of the first job, returning the ones that are available"""
+    loaded = []
+    for name in modules:
+        try:
+            importlib.import_module(name)
+            loaded.append(name)
+        except Exception:
+            pass
+    return loaded
+
+def _kill_job(process):
+    """kill a job child together with any workers it spawned"""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+    if process.is_alive():
+        process.kill()
+    process.join()
+
+def _run_job(conn, output_fd: int, func: Callable, params: Dict[str, Any]):
+    """child side of run_isolated: run one job with stdout redirected into the output pipe"""
+    # own process group, so a timeout also takes down the stage workers of the job
+    os.setpgid(0, 0)
+    os.dup2(output_fd, 1)
+    os.close(output_fd)
+    # a fresh stream instead of the inherited one, whose lock another server thread may have held at fork
+    sys.stdout = io.TextIOWrapper(io.FileIO(1, 'w', closefd=False), line_buffering=True)
+    try:
+        reply = ('success', func(params))
+    except BaseException as e:
+        reply = ('error', f"{type(e).__name__}: {e}")
+    sys.stdout.flush()
+    try:
+        conn.send(reply)
+    except Exception as e:
+        conn.send(('error', f"result could not be sent: {type(e).__name__}: {e}"))
+    conn.close()
+
+def run_isolated(func: Callable[[Dict], Any], params: Dict[str, Any], timeout_seconds: Optional[float] = None, on_line: Optional[Callable[[str], None]] = None, fork_lock: Optional[threading.Lock] = None) -> Tuple[str, Any]:
+    """
+    run func(params) in a forked child, passing every line it prints to on_line as it arrives
+    returns (status, value) with status 'success', 'error' or 'timeout'
+    """
+    context = multiprocessing.get_context('fork')
+    # the write ends must be closed before another thread forks, or that job keeps them open
+    with fork_lock or contextlib.nullcontext():
+        reader, writer = context.Pipe(duplex=False)
+        output_read, output_write = os.pipe()
+        # not a daemon: jobs start their own stage workers
+        process = context.Process(target=_run_job, args=(writer, output_write, func, params))
+        sys.stdout.flush()
+        process.start()
+        writer.close()
+        os.close(output_write)
+
+    output = io.FileIO(output_read, 'r')
+    deadline = time.monotonic() + timeout_seconds if timeout_seconds else None
+    pending = b""
+    outcome = None
+    sources = [reader, output]
+    try:
+        while sources:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if reader not in sources:
+                # the result is in, only give stragglers a moment to flush their output
+                timeout = DRAIN_SECONDS if timeout is None else min(timeout, DRAIN_SECONDS)
+            ready = wait(sources, timeout=timeout)
+            if not ready:
+                if reader in sources:
+                    outcome = ('timeout', f"Job timed out after {timeout_seconds} seconds")
+                break
+            for source in ready:
+                if source is reader:
+                    try:
+                        outcome = reader.recv()
+                    except EOFError:
+                        pass
+                    sources.remove(reader)
+                    continue
+                chunk = output.read(1 << 16)
+                if not chunk:
+                    sources.remove(output)
+                    continue
+                lines = (pending + chunk).split(b"\n")
+                pending = lines.pop()
+                for line in lines:
+                    if on_line and line.strip():
+                        on_line(line.decode('utf-8', errors='replace').rstrip("\r"))
+        if pending.strip() and on_line:
+            on_line(pending.decode('utf-8', errors='replace'))
+    finally:
+        _kill_job(process)
+        reader.close()
+        output.close()
+    if outcome is None:
+        outcome = ('error', f"Job process ended with exit code {process.exitcode} without returning a result")
+    return outcome
+
+class SimulationServer:
+    """
+    JSON-RPC 2.0 server for simulation jobs
+    job methods run isolated in forked children, at most max_jobs at once; ping and shutdown are answered directly
+    """
+    def __init__(self, methods: Dict[str, Callable[[Dict], Any]], job_timeout: Optional[float] = None, max_jobs: int = 1, preloaded: Optional[List[str]] = None):
+        self.methods = methods
+        self.job_timeout = job_timeout
+        self.preloaded = preloaded or []
+        self._slots = threading.BoundedSemaphore(max(1, max_jobs))
+        # held while writing messages and while forking, so children never inherit a half-written stream
+        self._io_lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self._started = time.time()
+        self._running = 0
+        self._completed = 0
+        self._stopping = threading.Event()
+        self._socket_server = None
+
+    def _send(self, wfile, message: Dict[str, Any]):
+        data = (json.dumps(message) + "\n").encode()
+        with self._io_lock:
+            try:
+                wfile.write(data)
+                wfile.flush()
+            except (BrokenPipeError, ConnectionResetError, ValueError):
+                # the caller went away; the job result is dropped
+                pass
+
+    def _error(self, wfile, request_id: Any, code: int, message: str):
+        self._send(wfile, {'jsonrpc': JSONRPC_VERSION, 'id': request_id, 'error': {'code': code, 'message': message}})
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'pid': os.getpid(),
+            'uptime_seconds': time.time() - self._started,
+            'jobs_running': self._running,
+            'jobs_completed': self._completed,
+            'methods': sorted(self.methods),
+            'preloaded': self.preloaded
+        }
+
+    def _execute(self, wfile, request_id: Any, method: str, params: Dict[str, Any]):
+        def forward(line: str):
+            self._send(wfile, {'jsonrpc': JSONRPC_VERSION, 'method': 'progress', 'params': {'id': request_id, 'line': line}})
+
+        timeout = params.get('timeout_seconds', self.job_timeout)
+        with self._slots:
+            with self._count_lock:
+                self._running += 1
+            try:
+                status, value = run_isolated(self.methods[method], params, timeout, forward, self._io_lock)
+            finally:
+                with self._count_lock:
+                    self._running -= 1
+                    self._completed += 1
+        if status == 'success':
+            self._send(wfile, {'jsonrpc': JSONRPC_VERSION, 'id': request_id, 'result': value})
+        else:
+            self._error(wfile, request_id, JOB_TIMEOUT if status == 'timeout' else JOB_FAILED, value)
+
+    def handle(self, line: bytes, wfile, jobs: List[threading.Thread]):
+        """dispatch one request line; jobs run in threads so the channel keeps accepting requests"""
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            self._error(wfile, None, PARSE_ERROR, f"Parse error: {e}")
+            return
+        if not isinstance(request, dict) or request.get('jsonrpc') != JSONRPC_VERSION or not isinstance(request.get('method'), str):
+            self._error(wfile, request.get('id') if isinstance(request, dict) else None, INVALID_REQUEST, "Invalid request")
+            return
+        request_id = request.get('id')
+        method = request['method']
+        params = request.get('params', {})
+        if not isinstance(params, dict):
+            self._error(wfile, request_id, INVALID_PARAMS, "params must be an object")
+            return
+        if method == 'ping':
+            self._send(wfile, {'jsonrpc': JSONRPC_VERSION, 'id': request_id, 'result': self.status()})
+        elif method == 'shutdown':
+            self._send(wfile, {'jsonrpc': JSONRPC_VERSION, 'id': request_id, 'result': self.status()})
+            self.stop()
+        elif method in self.methods:
+            job = threading.Thread(target=self._execute, args=(wfile, request_id, method, params), daemon=True)
+            job.start()
+            jobs.append(job)
+        else:
+            self._error(wfile, request_id, METHOD_NOT_FOUND, f"Method not found: {method}")
+
+    def serve_stream(self, rfile, wfile):
+        """serve one channel until it closes or the server stops, then wait for its jobs"""
+        jobs: List[threading.Thread] = []
+        for line in rfile:
+            if line.strip():
+                self.handle(line, wfile, jobs)
+            if self._stopping.is_set():
+                break
+        for job in jobs:
+            job.join()
+
+    def serve_stdio(self):
+        """serve requests from stdin, writing notifications and responses to stdout"""
+        self.serve_stream(sys.stdin.buffer, sys.stdout.buffer)
+
+    def serve_socket(self, path: str):
+        """serve every connection to the Unix socket at path in its own thread until shutdown"""
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server.serve_stream(self.rfile, self.wfile)
+
+        if os.path.exists(path):
+            os.unlink(path)
+        self._socket_server = socketserver.ThreadingUnixStreamServer(path, Handler)
+        self._socket_server.daemon_threads = True
+        try:
+            print(f"Serving simulation jobs on {path}", file=sys.stderr, flush=True)
+            self._socket_server.serve_forever()
+        finally:
+            self._socket_server.server_close()
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def stop(self):
+        self._stopping.set()
+        if self._socket_server is not None:
+            # shutdown blocks until serve_forever returns, which runs in another thread
+            threading.Thread(target=self._socket_server.shutdown, daemon=True).start()
+
+def call(socket_path: str, method: str, params: Dict[str, Any], on_progress: Optional[Callable[[str], None]] = None) -> Any:
+    """send one request to a server, passing its progress lines to on_progress; raises RuntimeError with the server error"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall((json.dumps({'jsonrpc': JSONRPC_VERSION, 'id': 1, 'method': method, 'params': params}) + "\n").encode())
+        for line in sock.makefile('rb'):
+            message = json.loads(line)
+            if message.get('method') == 'progress':
+                if on_progress:
+                    on_progress(message['params']['line'])
+            elif message.get('id') == 1:
+                if 'error' in message:
+                    raise RuntimeError(message['error']['message'])
+                return message['result']
+    raise RuntimeError("Server closed the connection without a response")
+
+def main():
+    parser = argparse.ArgumentParser(description='Forward one simulate.py job to a running SQUANDER simulation server')
+    parser.add_argument('--connect', required=True, help='Unix socket of the server')
+    parser.add_argument('--cwd', default=None, help='working directory of the job (default: current directory)')
+    parser.add_argument('--timeout', type=float, default=None, help='job timeout in seconds (default: the server default)')
+    parser.add_argument('argv', nargs=argparse.REMAINDER, help='simulate.py arguments, after --')
+    args = parser.parse_args()
+
+    argv = args.argv[1:] if args.argv[:1] == ['--'] else args.argv
+    params = {'argv': argv, 'cwd': os.path.abspath(args.cwd or os.getcwd())}
+    if args.timeout:
+        params['timeout_seconds'] = args.timeout
+    try:
+        call(args.connect, 'simulate', params, on_progress=lambda line: print(line, flush=True))
+    except (FileNotFoundError, ConnectionRefusedError) as e:
+        print(f"Simulation server unavailable: {e}", file=sys.stderr)
+        sys.exit(EXIT_UNAVAILABLE)
+    except RuntimeError as e:
+        print(f"Simulation failed: {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+SQUANDER Sharded State Vector
+
+Splits the 2^n amplitudes of a shared-memory state vector into 2^k contiguous
+shards of 2^(n-k) amplitudes and evolves them in a pool of local worker
+processes. The k most significant bits of the physical amplitude index select
+the shard, so the qubits sitting on those bits are global and every other qubit
+is local to each shard. A block on local qubits runs shard by shard in parallel;
+before a block touches a global qubit, that qubit is swapped with a local one by
+exchanging amplitude halves between shard pairs. The schedule follows the
+circuit's blocks (partitions, or single gates) and evicts the local qubit needed
+again last, which keeps the number of shard swaps low.
+
+Copyright 2024 SQUANDER
+Licensed under Apache License 2.0
+"""
+import os
+import time
+import math
+import bisect
+import multiprocessing
+from multiprocessing.connection import wait
+from typing import Any, Callable, List, Optional, Tuple
+
+import numpy as np
+
+from worker import SharedArray, TimeoutError, attach
+
+def schedule(block_qubits: List[List[int]], num_qubits: int, shard_qubits: int, batch: Optional[int] = None) -> Tuple[List[Tuple], int]:
+    """
+    plan blocks with the given qubits on 2^shard_qubits shards
+    returns (steps, shard_swaps): ('apply', start, stop, positions) runs blocks start..stop with logical
+    qubit q at physical bit positions[q], all of their qubits being local; ('swap', a, b) exchanges
+    physical bits a and b. Runs are split every batch blocks, and the plan ends in the standard layout
+    """
+    local_qubits = num_qubits - shard_qubits
+    if shard_qubits < 1 or local_qubits < 1:
+        raise ValueError(f"Cannot split a {num_qubits}-qubit state into 2^{shard_qubits} shards")
+    uses: List[List[int]] = [[] for _ in range(num_qubits)]
+    for index, qubits in enumerate(block_qubits):
+        if len(qubits) > local_qubits:
+            raise ValueError(f"A block on {len(qubits)} qubits does not fit the {local_qubits} local qubits of a shard")
+        for qubit in qubits:
+            uses[qubit].append(index)
+
+    def next_use(qubit: int, index: int) -> float:
+        position = bisect.bisect_left(uses[qubit], index)
+        return uses[qubit][position] if position < len(uses[qubit]) else math.inf
+
+    # the all-zero initial state is the same in every layout, so the qubits needed last start out global
+    positions = [0] * num_qubits
+    for position, qubit in enumerate(sorted(range(num_qubits), key=lambda qubit: next_use(qubit, 0))):
+        positions[qubit] = position
+    steps: List[Tuple] = []
+    shard_swaps = 0
+    start = 0
+    for index, qubits in enumerate(block_qubits):
+        missing = [qubit for qubit in qubits if positions[qubit] >= local_qubits]
+        if not missing and (batch is None or index - start < batch):
+            continue
+        if start < index:
+            steps.append(('apply', start, index, list(positions)))
+        start = index
+        for qubit in missing:
+            victim = max(
+                (other for other in range(num_qubits) if positions[other] < local_qubits and other not in qubits),
+                key=lambda other: next_use(other, index)
+            )
+            steps.append(('swap', positions[victim], positions[qubit]))
+            positions[victim], positions[qubit] = positions[qubit], positions[victim]
+            shard_swaps += 1
+    if start < len(block_qubits):
+        steps.append(('apply', start, len(block_qubits), list(positions)))
+
+    # move every qubit back to its own bit
+    for position in range(num_qubits):
+        occupant = positions.index(position)
+        if occupant != position:
+            steps.append(('swap', position, positions[position]))
+            shard_swaps += positions[position] >= local_qubits
+            positions[occupant], positions[position] = positions[position], position
+    return steps, shard_swaps
+
+def swap_bits(shards: List[np.ndarray], local_qubits: int, a: int, b: int, worker: int = 0, num_workers: int = 1):
+    """
+    exchange physical bits a < b of the sharded state in place, doing the share of worker out of num_workers
+    both local: an in-shard transposition; one global: amplitude halves move between shard pairs;
+    both global: whole shards trade places
+    """
+    a, b = sorted((a, b))
+    if b < local_qubits:
+        for shard in shards[worker::num_workers]:
+            view = shard.reshape(-1, 2, 1 << (b - a - 1), 2, 1 << a)
+            held = view[:, 0, :, 1, :].copy()
+            view[:, 0, :, 1, :] = view[:, 1, :, 0, :]
+            view[:, 1, :, 0, :] = held
+        return
+    global_b = 1 << (b - local_qubits)
+    if a < local_qubits:
+        pairs = [(index, index | global_b) for index in range(len(shards)) if not index & global_b]
+        for low, high in pairs[worker::num_workers]:
+            low_view = shards[low].reshape(-1, 2, 1 << a)
+            high_view = shards[high].reshape(-1, 2, 1 << a)
+            held = low_view[:, 1, :].copy()
+            low_view[:, 1, :] = high_view[:, 0, :]
+            high_view[:, 0, :] = held
+        return
+    global_a = 1 << (a - local_qubits)
+    pairs = [(index, index ^ global_a ^ global_b) for index in range(len(shards)) if index & global_a and not index & global_b]
+    for first, second in pairs[worker::num_workers]:
+        held = shards[first].copy()
+        shards[first][...] = shards[second]
+        shards[second][...] = held
+
+def _shards(handle: SharedArray, shard_qubits: int) -> List[np.ndarray]:
+    state_vector = attach(handle)
+    size = state_vector.shape[0] >> shard_qubits
+    return [state_vector[index * size:(index + 1) * size] for index in range(1 << shard_qubits)]
+
+def _serve_shards(conn, handle: SharedArray, shard_qubits: int, apply_run: Callable, worker: int, num_workers: int):
+    """shard worker loop: run ('apply', ...) and ('swap', ...) steps on this worker's share until None arrives"""
+    shards = _shards(handle, shard_qubits)
+    local_qubits = shards[0].shape[0].bit_length() - 1
+    while True:
+        try:
+            step = conn.recv()
+        except EOFError:
+            break
+        if step is None:
+            break
+        try:
+            if step[0] == 'apply':
+                _, start, stop, positions = step
+                apply_run(start, stop, positions, shards[worker::num_workers])
+            else:
+                swap_bits(shards, local_qubits, step[1], step[2], worker, num_workers)
+            reply = ('success', None)
+        except Exception as e:
+            reply = ('error', e)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            conn.send(('error', RuntimeError(f"{type(e).__name__}: {e}")))
+
+class ShardedStateVector:
+    """
+    worker processes sharing one state vector, 2^shard_qubits shards spread over them round robin
+    apply_run(start, stop, positions, shards) applies blocks start..stop to a list of shard views;
+    it is inherited by the forked workers, so it may close over circuits that do not pickle
+    """
+    def __init__(self, handle: SharedArray, shard_qubits: int, apply_run: Callable[[int, int, List[int], List[np.ndarray]], Any], num_workers: Optional[int] = None):
+        self.num_workers = max(1, min(1 << shard_qubits, num_workers or os.cpu_count() or 1))
+        context = multiprocessing.get_context('fork')
+        self._processes = []
+        self._conns = []
+        for worker in range(self.num_workers):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_serve_shards, args=(child_conn, handle, shard_qubits, apply_run, worker, self.num_workers), daemon=True)
+            process.start()
+            child_conn.close()
+            self._processes.append(process)
+            self._conns.append(parent_conn)
+
+    def step(self, step: Tuple, timeout_seconds: Optional[float] = None):
+        """run one step on every worker and wait until all of them are done"""
+        for conn in self._conns:
+            conn.send(step)
+        pending = list(self._conns)
+        deadline = time.monotonic() + timeout_seconds if timeout_seconds else None
+        failure = None
+        while pending:
+            ready = wait(pending, timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            if not ready:
+                self.close(kill=True)
+                raise TimeoutError(f"Operation timed out after {timeout_seconds} seconds")
+            for conn in ready:
+                pending.remove(conn)
+                try:
+                    status, error = conn.recv()
+                except EOFError:
+                    status, error = 'error', RuntimeError("Shard worker ended without returning a result")
+                if status == 'error' and failure is None:
+                    failure = error
+        if failure is not None:
+            raise failure
+
+    def run(self, steps: List[Tuple], on_progress: Optional[Callable[[int, int], None]] = None, timeout_seconds: Optional[float] = None):
+        """run a schedule, calling on_progress(blocks done, total blocks) after every run of blocks; the timeout covers all steps"""
+        total = max((step[2] for step in steps if step[0] == 'apply'), default=0)
+        deadline = time.monotonic() + timeout_seconds if timeout_seconds else None
+        for step in steps:
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.close(kill=True)
+                    raise TimeoutError(f"Operation timed out after {timeout_seconds} seconds")
+            try:
+                self.step(step, remaining)
+            except TimeoutError:
+                raise TimeoutError(f"Operation timed out after {timeout_seconds} seconds")
+            if step[0] == 'apply' and on_progress:
+                on_progress(step[2], total)
+
+    def close(self, kill: bool = False):
+        for conn, process in zip(self._conns, self._processes):
+            if not kill and process.is_alive():
+                try:
+                    conn.send(None)
+                    process.join(timeout=1)
+                except (BrokenPipeError, OSError):
+                    pass
+            if process.is_alive():
+                process.kill()
+            process.join(timeout=1)
+            conn.close()
+        self._conns = []
+        self._processes = []
+
+    def __enter__(self) -> "ShardedStateVector":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
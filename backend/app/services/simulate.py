@@ -7,6 +7,7 @@ Designed to be executed on SQUANDER server and return JSON-serializable results.
 
 Usage:
     python3 simulate.py <circuit.json> [--output results.json] [--partition-size 4]
+    python3 simulate.py --serve [--socket /tmp/squander-simulate.sock]
 
 Copyright 2024 SQUANDER
 Licensed under Apache License 2.0
@@ -15,48 +16,109 @@ import json
 import argparse
 import time
 import os
+import glob
+import copyreg
+import hashlib
+import shutil
 import tempfile
 import numpy as np
-import multiprocessing
-from typing import Dict, List, Optional, Callable, Any
+from contextlib import ExitStack
+from functools import partial
+from typing import Dict, List, Optional, Callable, Any, Tuple
 
 from squander import Circuit
 from squander.partitioning.partition import PartitionCircuit
-from convert import CircuitConverter
-
-class TimeoutError(Exception):
-    """Raised when a step times out"""
-    pass
-
-def run_with_timeout(func, args=(), kwargs=None, timeout_seconds=None):
-    """Run a function with a timeout using multiprocessing (works with C/C++)"""
-    if kwargs is None:
-        kwargs = {}
-    if timeout_seconds is None or timeout_seconds <= 0:
-        return func(*args, **kwargs)
-    result_queue = multiprocessing.Queue()
-    def wrapper():
+from squander.partitioning.kahn import kahn_partition_preparts
+from squander.partitioning.tools import translate_param_order
+from convert import CircuitConverter, GateRegistry
+from worker import StageWorker, SharedArray, SharedArrayPool, TimeoutError, attach, on_shared, run_concurrently
+from result_format import STREAM_MARKER, ResultStreamWriter, write_result_archive, array_to_json, to_json_compatible
+from metrics import StageMetrics, array_bytes
+from sharding import ShardedStateVector, schedule
+
+# density matrices grow as 4^k: views are capped at this many qubits and shipped in single precision
+MAX_DENSITY_QUBITS = 10
+DENSITY_DTYPE = np.complex64
+# state vector precisions; single halves memory and bandwidth at the cost of about 7 significant digits
+STATE_DTYPES = {'double': np.complex128, 'single': np.complex64}
+# amplitudes processed at once when a step needs a temporary copy of part of the state
+CHUNK_AMPLITUDES = 1 << 20
+# floor for the partitioned probabilities in KL(original || partitioned)
+KL_EPSILON = 1e-12
+# rough cost model of run_simulation used by estimate_resources
+BASELINE_BYTES = 256 << 20  # interpreter, SQUANDER and NumPy before any state is allocated
+JSON_BYTES_PER_VALUE = 64  # Python float in a nested list plus its encoded text
+SECONDS_PER_AMPLITUDE_OP = 2e-9
+# pipeline downgrades tried in order until the estimated peak fits the memory budget
+DOWNGRADES = [
+    ('skip_entropy', {'compute_entropy': False}),
+    ('skip_density_matrix', {'compute_density_matrix': False}),
+    ('single_precision', {'output_precision': 'single'}),
+    ('sparse_output', {'output_mode': 'sparse'}),
+]
+# optional toolchains imported up front in server mode, so the first job of each strategy does not pay for them
+PRELOAD_MODULES = ['qiskit', 'qiskit.qasm2', 'bqskit']
+# progress lines per partitioned simulation at most, partitions are applied in batches beyond this
+MAX_PARTITION_UPDATES = 100
+# partitioned-simulation checkpoints, named by the fingerprint of the run they belong to
+CHECKPOINT_DIR = os.path.join(tempfile.gettempdir(), 'squander_checkpoints')
+CHECKPOINT_MAX_AGE_SECONDS = 24 * 3600
+# partition assignments of earlier runs, named by the fingerprint of the circuit and partitioning settings
+PARTITION_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'squander_partition_cache')
+PARTITION_CACHE_BYTES = 64 << 20
+# original-circuit state, probabilities and seeded counts, named by the fingerprint of the gates and parameters;
+# entries are read back through a memory map into the run's own buffers, so only the disk use is bounded here
+ORIGINAL_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'squander_original_cache')
+ORIGINAL_CACHE_BYTES = 1 << 30
+# Monte-Carlo trajectories of a noisy simulation, each holding one state vector in its pool process
+NOISE_TRAJECTORIES = 100
+# noise channels attachable to gates, with the JSON field holding their strength
+NOISE_CHANNELS = {'depolarizing': 'probability', 'amplitude_damping': 'gamma'}
+# X, Y and Z by their index in a base-4 Pauli string, 0 being the identity
+PAULI_KERNELS = (
+    None,
+    np.array([[0, 1], [1, 0]], dtype=np.complex128),
+    np.array([[0, -1j], [1j, 0]], dtype=np.complex128),
+    np.array([[1, 0], [0, -1]], dtype=np.complex128)
+)
+# strategies that partition a QASM export of the circuit instead of the SQUANDER circuit itself
+QASM_STRATEGIES = ["qiskit", "qiskit-fusion", "bqskit-Quick", "bqskit-Scan", "bqskit-Greedy", "bqskit-Cluster"]
+
+def _rebuild_circuit(num_qubits: int, blocks: List[Circuit]) -> Circuit:
+    circuit = Circuit(num_qubits)
+    for block in blocks:
+        circuit.add_Circuit(block)
+    return circuit
+
+def _reduce_circuit(circuit: Circuit):
+    """
+    pickle partitioned circuits as their blocks: SQUANDER pickles flat circuits itself but crashes
+    on circuits of sub-circuits, which the StageWorker pipe has to carry
+    """
+    blocks = circuit.get_Gates()
+    if blocks and all(isinstance(block, Circuit) for block in blocks):
+        return _rebuild_circuit, (circuit.get_Qbit_Num(), blocks)
+    return circuit.__reduce_ex__(2)
+
+copyreg.pickle(Circuit, _reduce_circuit)
+
+# whether SQUANDER evolves complex64 states in place, probed on first use
+_single_precision_support: Optional[bool] = None
+
+def squander_single_precision() -> bool:
+    """probe once whether Circuit.apply_to accepts a complex64 state and evolves it in place"""
+    global _single_precision_support
+    if _single_precision_support is None:
+        probe = Circuit(1)
+        probe.add_X(0)
+        state = np.zeros((2, 1), dtype=np.complex64)
+        state[0] = 1.0
         try:
-            result = func(*args, **kwargs)
-            result_queue.put(('success', result))
-        except Exception as e:
-            result_queue.put(('error', e))
-    process = multiprocessing.Process(target=wrapper)
-    process.start()
-    process.join(timeout=timeout_seconds)
-    if process.is_alive():
-        process.terminate()
-        process.join(timeout=1)
-        if process.is_alive():
-            process.kill()
-        raise TimeoutError(f"Operation timed out after {timeout_seconds} seconds")
-    if not result_queue.empty():
-        status, result = result_queue.get()
-        if status == 'error':
-            raise result
-        return result
-    else:
-        raise TimeoutError(f"Process ended without returning a result")
+            probe.apply_to(np.zeros(0, dtype=np.float64), state)
+            _single_precision_support = bool(state[1, 0] == 1.0)
+        except Exception:
+            _single_precision_support = False
+    return _single_precision_support
 
 class QuantumCircuitSimulator:    
     def __init__(self, num_qubits: int):
@@ -66,21 +128,25 @@ class QuantumCircuitSimulator:
         self.matrix_size = 1 << num_qubits
         self.gate_ids = []
 
-    def partition_circuit(self, circuit: Circuit, parameters: np.ndarray, max_partition_size: int = 4, strategy: str = 'kahn', qasm_file: str = None) -> Dict:
+    def partition_circuit(self, circuit: Circuit, parameters: np.ndarray, max_partition_size: int = 4, strategy: str = 'kahn', qasm_file: str = None, assignments: Optional[List[List[int]]] = None) -> Dict:
         """
         Partition a circuit using the specified strategy.
 
         For qiskit/bqskit strategies, qasm_file must be provided.
         For other strategies, circuit and parameters are used directly.
+        With assignments (original gate indices per partition, e.g. from the partition cache)
+        the partitioned circuit is rebuilt from them and the strategy is not run.
         """
-        qasm_strategies = ["qiskit", "qiskit-fusion", "bqskit-Quick", "bqskit-Scan", "bqskit-Greedy", "bqskit-Cluster"]
-
-        if strategy in qasm_strategies and not qasm_file:
-            raise ValueError(f"Strategy '{strategy}' requires a QASM file, but none was provided")
+        if assignments is not None:
+            partitioned_circ, param_order, partition_assignments = kahn_partition_preparts(circuit, max_partition_size, assignments)
+            partitioned_params = translate_param_order(parameters, param_order)
+        else:
+            if strategy in QASM_STRATEGIES and not qasm_file:
+                raise ValueError(f"Strategy '{strategy}' requires a QASM file, but none was provided")
 
-        partitioned_circ, partitioned_params, partition_assignments = PartitionCircuit(
-            circuit, parameters, max_partition_size, strategy, qasm_file
-        )
+            partitioned_circ, partitioned_params, partition_assignments = PartitionCircuit(
+                circuit, parameters, max_partition_size, strategy, qasm_file
+            )
 
         partitions = []
         for i, partition in enumerate(partitioned_circ.get_Gates()):
@@ -121,56 +187,489 @@ class QuantumCircuitSimulator:
                 'strategy': strategy,
                 'max_partition_size': max_partition_size,
                 'total_partitions': len(partitions),
-                'partitions': partitions
+                'partitions': partitions,
+                'cached': assignments is not None
             }
         }
     
-    def simulate_statevector(self, circuit: Circuit, parameters: np.ndarray) -> np.ndarray:
-        """Simulate circuit and return state vector"""
-        initial_state = np.zeros((self.matrix_size, 1), dtype=np.complex128)
-        initial_state[0] = 1.0 + 0j
-        state_vector = initial_state.copy()
-        params_real = np.array(parameters, dtype=np.float64)
-        circuit.apply_to(params_real, state_vector)
+    def simulate_statevector(self, circuit: Circuit, parameters: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Simulate circuit and return state vector, evolving `out` in place when given
+        complex64 states go through SQUANDER where it supports them, gate by gate in NumPy otherwise
+        """
+        state_vector = np.empty((self.matrix_size, 1), dtype=np.complex128) if out is None else out
+        state_vector.fill(0)
+        state_vector[0] = 1.0 + 0j
+        params_real = np.asarray(parameters, dtype=np.float64)
+        if state_vector.dtype == np.complex128 or squander_single_precision():
+            circuit.apply_to(params_real, state_vector)
+        else:
+            for qubits, kernel in self.gate_kernels(circuit, params_real):
+                self.apply_kernel(state_vector, qubits, kernel)
+        return state_vector
+
+    def gate_kernels(self, circuit: Circuit, parameters: np.ndarray, dtype=np.complex64, start: int = 0, stop: Optional[int] = None) -> List[Tuple[List[int], np.ndarray]]:
+        """
+        (qubits, unitary) of every top-level gate or partition block of circuit, or of blocks start..stop
+        the small unitaries come from SQUANDER itself: each gate is remapped onto its own qubits
+        and its 2^k x 2^k matrix taken, bit i of the matrix index being the i-th qubit in ascending order
+        """
+        kernels = []
+        for gate in circuit.get_Gates()[start:stop]:
+            if isinstance(gate, Circuit):
+                # partition blocks remap directly, single gates need a circuit around them first
+                qubits = sorted(gate.get_Qbits())
+                local = gate.Remap_Qbits({q: i for i, q in enumerate(qubits)}, len(qubits))
+            else:
+                qubits = sorted(gate.get_Involved_Qbits())
+                wrapper = Circuit(self.num_qubits)
+                wrapper.add_Gate(gate)
+                local = wrapper.Remap_Qbits({q: i for i, q in enumerate(qubits)}, len(qubits))
+            offset = gate.get_Parameter_Start_Index()
+            gate_parameters = np.ascontiguousarray(parameters[offset:offset + gate.get_Parameter_Num()], dtype=np.float64)
+            kernels.append((qubits, np.asarray(local.get_Matrix(gate_parameters), dtype=dtype)))
+        return kernels
+
+    def apply_kernel(self, state_vector: np.ndarray, qubits: List[int], kernel: np.ndarray) -> np.ndarray:
+        """
+        apply a unitary on qubits to the state in place, in the precision of the state
+        leading free qubits are fixed chunk by chunk so the temporary stays below CHUNK_AMPLITUDES
+        """
+        n = self.num_qubits
+        k = len(qubits)
+        tensor = state_vector.reshape((2,) * n)
+        # the highest kernel qubit is the most significant bit of the kernel index
+        axes = [n - 1 - q for q in reversed(qubits)]
+        free = [axis for axis in range(n) if axis not in axes]
+        fixed = free[:max(0, len(free) - (CHUNK_AMPLITUDES.bit_length() - 1))]
+        chunk_axes = [axis - sum(f < axis for f in fixed) for axis in axes]
+        operator = kernel.astype(state_vector.dtype, copy=False).reshape((2,) * (2 * k))
+        for index in np.ndindex(*(2,) * len(fixed)):
+            selector = [slice(None)] * n
+            for axis, bit in zip(fixed, index):
+                selector[axis] = bit
+            chunk = tensor[tuple(selector)]
+            result = np.tensordot(operator, chunk, axes=(list(range(k, 2 * k)), chunk_axes))
+            chunk[...] = np.moveaxis(result, list(range(k)), chunk_axes)
         return state_vector
+
+    def precision_check(self, circuit: Circuit, parameters: np.ndarray, state_vector: np.ndarray) -> Dict[str, float]:
+        """fidelity and largest amplitude error of a reduced precision state against a double precision run"""
+        reference = self.simulate_statevector(circuit, parameters).reshape(-1)
+        reduced = state_vector.reshape(-1)
+        max_error = 0.0
+        for start in range(0, self.matrix_size, CHUNK_AMPLITUDES):
+            stop = start + CHUNK_AMPLITUDES
+            max_error = max(max_error, float(np.abs(reference[start:stop] - reduced[start:stop]).max()))
+        return {'fidelity': self.calculate_fidelity(reference, reduced), 'max_amplitude_error': max_error}
     
-    def get_probabilities(self, state_vector: np.ndarray) -> np.ndarray:
-        """calculate measurement probabilities from state vector"""
-        return np.abs(state_vector.flatten())**2
+    def get_probabilities(self, state_vector: np.ndarray, out: Optional[np.ndarray] = None, qubits: Optional[List[int]] = None) -> np.ndarray:
+        """calculate measurement probabilities from state vector, marginalised onto qubits when given"""
+        if qubits is not None and len(qubits) < self.num_qubits:
+            return self.get_marginal_probabilities(self.get_probabilities(state_vector), qubits, out=out)
+        probabilities = np.abs(state_vector.reshape(-1), out=out)
+        return np.square(probabilities, out=probabilities)
+
+    def get_marginal_probabilities(self, probabilities: np.ndarray, qubits: List[int], out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        sum the full distribution over every qubit not in qubits
+        bit j of the marginal outcome index is the j-th measured qubit in ascending order,
+        so bitstrings read like the full-register ones with the unmeasured qubits dropped
+        """
+        # qubit q is bit q of the basis index, i.e. axis num_qubits - 1 - q of the reshaped tensor
+        traced_axes = tuple(self.num_qubits - 1 - q for q in range(self.num_qubits) if q not in set(qubits))
+        marginal = probabilities.reshape((2,) * self.num_qubits).sum(axis=traced_axes).reshape(-1)
+        if out is None:
+            return marginal
+        out[:] = marginal
+        return out
     
-    def get_density_matrix(self, state_vector: np.ndarray) -> np.ndarray:
-        """calculate density matrix from state vector"""
-        psi = state_vector.flatten()
-        return np.outer(psi, psi.conj())
+    def get_density_matrix(self, state_vector: np.ndarray, out: Optional[np.ndarray] = None, qubits: Optional[List[int]] = None) -> np.ndarray:
+        """
+        calculate the density matrix of qubits (default: all) from state vector, tracing out the other qubits
+        the result is written in the precision of out when given
+        """
+        matrix = self._bipartition(state_vector, range(self.num_qubits) if qubits is None else qubits)
+        # rho[a, a'] = sum_r psi[r, a] * conj(psi[r, a'])
+        density = matrix.T @ matrix.conj()
+        if out is None:
+            return density
+        out[...] = density
+        return out
     
-    def calculate_entropy(self, circuit: Circuit, parameters: np.ndarray, qubit_subset: List[int]) -> float:
-        """Calculate Second Rényi entropy for qubit subset"""
-        try:
-            initial_state = np.zeros((self.matrix_size, 1), dtype=np.complex128)
-            initial_state[0] = 1.0 + 0j
-            entropy = circuit.get_Second_Renyi_Entropy(
-                parameters=parameters,
-                input_state=initial_state,
-                qubit_list=qubit_subset
-            )
-            return entropy
-        except Exception as e:
-            return 0.0
+    def apply_partitions(self, circuit: Circuit, parameters: np.ndarray, state_vector: np.ndarray, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """
+        apply top-level blocks start..stop of circuit to the state in place, one partition each for a
+        partitioned circuit; every block gets its own slice of the circuit parameters
+        """
+        params_real = np.asarray(parameters, dtype=np.float64)
+        if state_vector.dtype == np.complex128 or squander_single_precision():
+            for block in circuit.get_Gates()[start:stop]:
+                offset = block.get_Parameter_Start_Index()
+                block_parameters = np.ascontiguousarray(params_real[offset:offset + block.get_Parameter_Num()])
+                if not isinstance(block, Circuit):
+                    # gates of an unpartitioned circuit take (state, parameters), a one-gate circuit keeps the call uniform
+                    wrapper = Circuit(self.num_qubits)
+                    wrapper.add_Gate(block)
+                    block = wrapper
+                block.apply_to(block_parameters, state_vector)
+        else:
+            for qubits, kernel in self.gate_kernels(circuit, params_real, start=start, stop=stop):
+                self.apply_kernel(state_vector, qubits, kernel)
+        return state_vector
+
+    def apply_to_shards(self, circuit: Circuit, parameters: np.ndarray, shards: List[np.ndarray], positions: List[int], start: int = 0, stop: Optional[int] = None) -> List[np.ndarray]:
+        """
+        apply top-level blocks start..stop of circuit to every shard of a sharded state in place,
+        logical qubit q of a block acting on bit positions[q] of the shard-local amplitude index
+        """
+        local_qubits = shards[0].shape[0].bit_length() - 1
+        params_real = np.asarray(parameters, dtype=np.float64)
+        on_squander = shards[0].dtype == np.complex128 or squander_single_precision()
+        for block in circuit.get_Gates()[start:stop]:
+            offset = block.get_Parameter_Start_Index()
+            block_parameters = np.ascontiguousarray(params_real[offset:offset + block.get_Parameter_Num()])
+            if isinstance(block, Circuit):
+                qubits = sorted(block.get_Qbits())
+            else:
+                qubits = sorted(block.get_Involved_Qbits())
+                wrapper = Circuit(self.num_qubits)
+                wrapper.add_Gate(block)
+                block = wrapper
+            if on_squander:
+                local = block.Remap_Qbits({q: positions[q] for q in qubits}, local_qubits)
+                for shard in shards:
+                    local.apply_to(block_parameters, shard)
+            else:
+                kernel = np.asarray(block.Remap_Qbits({q: i for i, q in enumerate(qubits)}, len(qubits)).get_Matrix(block_parameters), dtype=shards[0].dtype)
+                shard_simulator = QuantumCircuitSimulator(local_qubits)
+                for shard in shards:
+                    shard_simulator.apply_kernel(shard, [positions[q] for q in qubits], kernel)
+        return shards
+
+    def get_entanglement_spectrum(self, state_vector: np.ndarray, qubit_subset: List[int]) -> np.ndarray:
+        """
+        eigenvalues of the reduced density matrix of qubit_subset
+        taken from the Gram matrix of the smaller side of the cut, so no 2^n x 2^n object is formed
+        """
+        matrix = self._bipartition(state_vector, qubit_subset)
+        rest_dim, subset_dim = matrix.shape
+        gram = matrix.conj().T @ matrix if subset_dim <= rest_dim else matrix @ matrix.conj().T
+        return np.clip(np.linalg.eigvalsh(gram), 0.0, None)
+
+    def _bipartition(self, state_vector: np.ndarray, qubit_subset) -> np.ndarray:
+        """
+        state vector as a (rest, subset) amplitude matrix
+        column bits follow the subset qubits in ascending order, like marginal outcome indices
+        """
+        n = self.num_qubits
+        subset = sorted(set(qubit_subset))
+        k = len(subset)
+        if subset == list(range(k)):
+            # the lowest qubits are the fastest-varying index bits: a plain reshape, no copy
+            return state_vector.reshape(1 << (n - k), 1 << k)
+        kept_axes = [n - 1 - q for q in reversed(subset)]
+        rest_axes = [axis for axis in range(n) if axis not in kept_axes]
+        return np.transpose(state_vector.reshape((2,) * n), rest_axes + kept_axes).reshape(1 << (n - k), 1 << k)
+
+    def calculate_entropy(self, state_vector: np.ndarray, qubit_subset: List[int]) -> Dict[str, float]:
+        """Second Rényi and von Neumann entropy (natural log) of the qubit subset"""
+        spectrum = self.get_entanglement_spectrum(state_vector, qubit_subset)
+        purity = float(np.sum(spectrum ** 2))
+        nonzero = spectrum[spectrum > 1e-15]
+        return {
+            'renyi_2': -float(np.log(purity)) if purity > 0 else 0.0,
+            'von_neumann': -float(np.sum(nonzero * np.log(nonzero)))
+        }
     
     def calculate_fidelity(self, state1: np.ndarray, state2: np.ndarray) -> float:
-        """calculate fidelity between two state vectors"""
-        return float(np.abs(np.vdot(state1.flatten(), state2.flatten()))**2)
+        """calculate fidelity between two state vectors, accumulating in double precision"""
+        psi1, psi2 = state1.reshape(-1), state2.reshape(-1)
+        if psi1.dtype == psi2.dtype == np.complex128:
+            return float(np.abs(np.vdot(psi1, psi2))**2)
+        overlap = sum(
+            np.vdot(psi1[start:start + CHUNK_AMPLITUDES].astype(np.complex128), psi2[start:start + CHUNK_AMPLITUDES].astype(np.complex128))
+            for start in range(0, psi1.size, CHUNK_AMPLITUDES)
+        )
+        return float(np.abs(overlap)**2)
     
-    def sample_measurements(self, state_vector: np.ndarray, num_shots: int = 1000) -> Dict[str, int]:
-        """simulate measurements by sampling from probability distribution"""
-        probabilities = self.get_probabilities(state_vector)
-        samples = np.random.choice(self.matrix_size, size=num_shots, p=probabilities)
-        counts = {}
-        for sample in samples:
-            binary = format(sample, f'0{self.num_qubits}b')
-            counts[binary] = counts.get(binary, 0) + 1
-        return counts
+    def sample_measurements(self, state_vector: np.ndarray, num_shots: int = 1000, rng: Optional[np.random.Generator] = None, qubits: Optional[List[int]] = None, probs_out: Optional[np.ndarray] = None) -> Dict[str, int]:
+        """simulate measurements of qubits (default: all) by sampling from probability distribution, kept in probs_out when given"""
+        return self.sample_counts(self.get_probabilities(state_vector, out=probs_out, qubits=qubits), num_shots, rng)
+
+    def sample_counts(self, probabilities: np.ndarray, num_shots: int = 1000, rng: Optional[np.random.Generator] = None) -> Dict[str, int]:
+        """
+        draw num_shots outcomes at once with a multinomial over the basis states
+        only the distinct observed outcomes are formatted as bitstrings, one bit per qubit of the distribution
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        total = probabilities.sum()
+        if num_shots <= 0 or total <= 0:
+            return {}
+        # renormalise away the rounding error of |amplitude|^2 so multinomial accepts the distribution
+        outcome_counts = rng.multinomial(num_shots, probabilities / total)
+        outcomes = np.flatnonzero(outcome_counts)
+        num_bits = probabilities.size.bit_length() - 1
+        return {format(outcome, f'0{num_bits}b'): int(count) for outcome, count in zip(outcomes.tolist(), outcome_counts[outcomes].tolist())}
     
+    def select_outcomes(self, probabilities: List[np.ndarray], top_k: Optional[int] = None, threshold: float = 0.0) -> np.ndarray:
+        """
+        ascending outcome indices worth reporting: those whose largest probability across the
+        distributions exceeds threshold (default: nonzero), limited to the top_k heaviest
+        """
+        weight = np.maximum.reduce(probabilities)
+        indices = np.flatnonzero(weight > threshold)
+        if top_k is not None and 0 <= top_k < indices.size:
+            heaviest = np.argpartition(weight[indices], indices.size - top_k)[indices.size - top_k:]
+            indices = np.sort(indices[heaviest])
+        return indices
+
+    def sparse_probabilities(self, probabilities: np.ndarray, indices: np.ndarray) -> Dict:
+        """(index, value) form of a distribution restricted to indices"""
+        values = probabilities[indices]
+        return {
+            'indices': indices,
+            'values': values,
+            'num_outcomes': int(probabilities.size),
+            'retained_probability': float(values.sum())
+        }
+
+    def sparsify(self, probs_original: np.ndarray, probs_partitioned: np.ndarray, top_k: Optional[int] = None, threshold: float = 0.0) -> Tuple[Dict, Dict]:
+        """sparse forms of both distributions over one shared set of outcomes"""
+        indices = self.select_outcomes([probs_original, probs_partitioned], top_k, threshold)
+        return self.sparse_probabilities(probs_original, indices), self.sparse_probabilities(probs_partitioned, indices)
+
+    def compare_distributions(self, p: np.ndarray, q: np.ndarray) -> Dict[str, float]:
+        """
+        distance metrics between two outcome distributions
+        KL(p || q) floors q at KL_EPSILON so outcomes missing from q stay finite
+        """
+        difference = np.abs(p - q)
+        # the root-difference form stays accurate for nearly identical distributions, unlike sqrt(1 - BC)
+        root_difference = np.sqrt(p) - np.sqrt(q)
+        support = p > 0
+        kl_divergence = float(np.sum(p[support] * np.log(p[support] / np.maximum(q[support], KL_EPSILON))))
+        return {
+            'max_difference': float(difference.max()) if difference.size else 0.0,
+            'total_variation_distance': 0.5 * float(difference.sum()),
+            'hellinger_distance': float(np.sqrt(0.5 * np.dot(root_difference, root_difference))),
+            'kl_divergence': max(kl_divergence, 0.0)
+        }
+
+    def z_expectations(self, probabilities: np.ndarray) -> List[float]:
+        """<Z> of every qubit of the (marginal) distribution, lowest qubit first"""
+        num_bits = probabilities.size.bit_length() - 1
+        tensor = probabilities.reshape((2,) * num_bits)
+        expectations = []
+        for bit in range(num_bits):
+            axis = num_bits - 1 - bit
+            p0, p1 = tensor.sum(axis=tuple(a for a in range(num_bits) if a != axis))
+            expectations.append(float(p0 - p1))
+        return expectations
+
+    def partitioned_parameter_order(self, circuit: Circuit, partition_info: Dict) -> np.ndarray:
+        """
+        indices into the circuit's parameter vector, in the order the partitioned circuit consumes them,
+        so that parameters[order] is the partitioned parameter vector for any parameter set
+        """
+        if not partition_info['partitions']:
+            return np.arange(circuit.get_Parameter_Num())
+        gates = circuit.get_Gates()
+        order = []
+        for partition in partition_info['partitions']:
+            for original_idx in partition['original_gate_indices']:
+                start = gates[original_idx].get_Parameter_Start_Index()
+                order.extend(range(start, start + gates[original_idx].get_Parameter_Num()))
+        return np.array(order, dtype=np.int64)
+
+    def sweep_point(self, circuit: Circuit, parameters: np.ndarray, num_shots: int, state_out: Optional[np.ndarray] = None, probs_out: Optional[np.ndarray] = None, rng: Optional[np.random.Generator] = None, qubits: Optional[List[int]] = None, observables: Optional[List[Dict]] = None) -> Dict:
+        """counts, per-qubit <Z> and observable expectation values of one parameter set"""
+        state_vector = self.simulate_statevector(circuit, parameters, out=state_out)
+        probabilities = self.get_probabilities(state_vector, out=probs_out, qubits=qubits)
+        point = {'counts': self.sample_counts(probabilities, num_shots, rng), 'expectation_z': self.z_expectations(probabilities)}
+        if observables:
+            point['observables'] = self.expectation_values(state_vector, observables)
+        return point
+
+    def rotate_to_z_basis(self, state_vector: np.ndarray, basis: Dict[int, str]) -> np.ndarray:
+        """rotate the given qubits in place so that a Z measurement measures their X or Y basis"""
+        tensor = state_vector.reshape((2,) * self.num_qubits)
+        for qubit, pauli in basis.items():
+            axis = self.num_qubits - 1 - qubit
+            zero = tensor[(slice(None),) * axis + (0,)]
+            one = tensor[(slice(None),) * axis + (1,)]
+            if pauli == 'Y':
+                one *= -1j  # S^dagger maps the Y eigenbasis onto the X eigenbasis
+            # unnormalised Hadamard (a, b) -> (a + b, a - b) without temporaries
+            zero += one
+            one *= -2
+            one += zero
+        if basis:
+            state_vector *= 2 ** (-len(basis) / 2)
+        return state_vector
+
+    def rotate_from_z_basis(self, state_vector: np.ndarray, basis: Dict[int, str]) -> np.ndarray:
+        """undo rotate_to_z_basis in place: the unnormalised Hadamard again, then S for Y"""
+        tensor = state_vector.reshape((2,) * self.num_qubits)
+        for qubit, pauli in basis.items():
+            axis = self.num_qubits - 1 - qubit
+            zero = tensor[(slice(None),) * axis + (0,)]
+            one = tensor[(slice(None),) * axis + (1,)]
+            zero += one
+            one *= -2
+            one += zero
+            if pauli == 'Y':
+                one *= 1j
+        if basis:
+            state_vector *= 2 ** (-len(basis) / 2)
+        return state_vector
+
+    def parity_expectation(self, probabilities: np.ndarray, qubits: List[int]) -> float:
+        """<Z...Z> on qubits: the marginal distribution summed with sign (-1)^(parity of the outcome bits)"""
+        signed = self.get_marginal_probabilities(probabilities, qubits)
+        # fold one outcome bit at a time, outcomes with the bit set enter with a minus sign
+        for _ in qubits:
+            signed = signed.reshape(2, -1)
+            signed = signed[0] - signed[1]
+        return float(signed.sum())
+
+    def expectation_values(self, state_vector: np.ndarray, observables: List[Dict]) -> List[Dict]:
+        """
+        exact expectation values of weighted Pauli-string observables, without operator matrices
+        terms are grouped by their X/Y qubits: each group rotates one scratch copy of the state into
+        the Z basis, after which every term of the group is a parity sum over its marginal distribution
+        the scratch is copied once and moved from group to group by rotating back only the qubits whose
+        basis changes; the input state is never rotated, since a timed out worker is killed mid-rotation
+        """
+        groups: Dict[Tuple, List] = {}
+        for index, observable in enumerate(observables):
+            for coefficient, paulis in observable['terms']:
+                basis = tuple(sorted((qubit, pauli) for qubit, pauli in paulis.items() if pauli != 'Z'))
+                groups.setdefault(basis, []).append((index, coefficient, sorted(paulis)))
+
+        values = [0.0] * len(observables)
+        probabilities = np.empty(self.matrix_size, dtype=np.float64)
+        scratch, rotated = None, {}
+        # sorted, groups sharing their lowest rotated qubits follow each other
+        for basis, terms in sorted(groups.items()):
+            if basis:
+                target = dict(basis)
+                if scratch is None:
+                    scratch = state_vector.copy()
+                self.rotate_from_z_basis(scratch, {qubit: pauli for qubit, pauli in rotated.items() if target.get(qubit) != pauli})
+                self.rotate_to_z_basis(scratch, {qubit: pauli for qubit, pauli in target.items() if rotated.get(qubit) != pauli})
+                rotated = target
+                self.get_probabilities(scratch, out=probabilities)
+            else:
+                self.get_probabilities(state_vector, out=probabilities)
+            for index, coefficient, qubits in terms:
+                values[index] += coefficient * self.parity_expectation(probabilities, qubits)
+        return [{'name': observable['name'], 'expectation': value} for observable, value in zip(observables, values)]
+
+    def apply_noise(self, state_vector: np.ndarray, qubits: List[int], channels: List[Tuple[str, float]], rng: np.random.Generator) -> int:
+        """
+        apply one randomly drawn branch of every channel to the state in place, keeping it normalised
+        depolarizing: with the given probability, a uniformly random non-identity Pauli string on qubits
+        amplitude_damping: per qubit, a decay |1> -> |0> with probability gamma * P(qubit is 1), else the
+        no-decay branch that damps the |1> amplitudes by sqrt(1 - gamma)
+        returns the number of error branches taken
+        """
+        tensor = state_vector.reshape((2,) * self.num_qubits)
+        taken = 0
+        for kind, strength in channels:
+            if kind == 'depolarizing':
+                if strength > 0 and rng.random() < strength:
+                    string = int(rng.integers(1, 4 ** len(qubits)))
+                    for qubit in qubits:
+                        string, pauli = divmod(string, 4)
+                        if pauli:
+                            self.apply_kernel(state_vector, [qubit], PAULI_KERNELS[pauli])
+                    taken += 1
+                continue
+            for qubit in qubits:
+                axis = self.num_qubits - 1 - qubit
+                # length-one slices keep views even when the qubit is the only axis
+                zero = tensor[(slice(None),) * axis + (slice(0, 1),)]
+                one = tensor[(slice(None),) * axis + (slice(1, 2),)]
+                excited = float(np.vdot(one, one).real)
+                decay = strength * excited
+                if decay > 0 and rng.random() < decay:
+                    zero[...] = one
+                    one[...] = 0
+                    state_vector /= np.sqrt(excited)
+                    taken += 1
+                elif decay > 0:
+                    one *= np.sqrt(1 - strength)
+                    state_vector /= np.sqrt(1 - decay)
+        return taken
+
+    def apply_readout_error(self, probabilities: np.ndarray, p01: float = 0.0, p10: float = 0.0) -> np.ndarray:
+        """fold independent readout bit flips into a measured distribution in place: 0 reads as 1 with p01, 1 as 0 with p10"""
+        if not p01 and not p10:
+            return probabilities
+        num_bits = probabilities.size.bit_length() - 1
+        tensor = probabilities.reshape((2,) * num_bits)
+        for axis in range(num_bits):
+            zero = tensor[(slice(None),) * axis + (slice(0, 1),)]
+            one = tensor[(slice(None),) * axis + (slice(1, 2),)]
+            flow = zero * p01 - one * p10
+            zero -= flow
+            one += flow
+        return probabilities
+
+    def run_trajectories(
+        self,
+        circuit: Circuit,
+        parameters: np.ndarray,
+        gate_noise: List[List[Tuple[str, float]]],
+        seeds: List[np.random.SeedSequence],
+        shots: List[int],
+        qubits: List[int],
+        readout: Tuple[float, float] = (0.0, 0.0),
+        reference: Optional[np.ndarray] = None
+    ) -> Dict:
+        """
+        Monte-Carlo trajectories of the noisy circuit, one per seed: the gates run in SQUANDER, each gate
+        with noise followed by one drawn branch of its channels (apply_noise), runs of noiseless gates
+        going through as one circuit; every trajectory then samples shots[i] outcomes of qubits through
+        the readout error
+        returns sums over the trajectories - counts, measured distribution, fidelity to reference and
+        error branches taken - so batches from several processes combine by addition
+        """
+        params_real = np.asarray(parameters, dtype=np.float64)
+        segments = []
+        segment, segment_parameters = Circuit(self.num_qubits), []
+        for gate, channels in zip(circuit.get_Gates(), gate_noise):
+            segment.add_Gate(gate)
+            offset = gate.get_Parameter_Start_Index()
+            segment_parameters.append(params_real[offset:offset + gate.get_Parameter_Num()])
+            if channels:
+                segments.append((segment, np.concatenate(segment_parameters), sorted(gate.get_Involved_Qbits()), channels))
+                segment, segment_parameters = Circuit(self.num_qubits), []
+        if segment_parameters:
+            segments.append((segment, np.concatenate(segment_parameters), [], []))
+
+        state_vector = np.empty((self.matrix_size, 1), dtype=np.complex128)
+        probabilities = np.empty(1 << len(qubits), dtype=np.float64)
+        totals = {'trajectories': 0, 'counts': {}, 'probabilities': np.zeros_like(probabilities), 'fidelity': 0.0, 'error_branches': 0}
+        for seed, num_shots in zip(seeds, shots):
+            rng = np.random.default_rng(seed)
+            state_vector.fill(0)
+            state_vector[0] = 1.0 + 0j
+            for segment, segment_parameters, noisy_qubits, channels in segments:
+                segment.apply_to(segment_parameters, state_vector)
+                if channels:
+                    totals['error_branches'] += self.apply_noise(state_vector, noisy_qubits, channels, rng)
+            self.apply_readout_error(self.get_probabilities(state_vector, out=probabilities, qubits=qubits), *readout)
+            for outcome, count in self.sample_counts(probabilities, num_shots, rng).items():
+                totals['counts'][outcome] = totals['counts'].get(outcome, 0) + count
+            totals['probabilities'] += probabilities
+            if reference is not None:
+                totals['fidelity'] += self.calculate_fidelity(reference, state_vector)
+            totals['trajectories'] += 1
+        return totals
+
     def get_unitary_matrix(self, circuit: Circuit, parameters: np.ndarray) -> np.ndarray:
         """get unitary matrix representation of circuit"""
         try:
@@ -178,17 +677,18 @@ class QuantumCircuitSimulator:
         except:
             return None
     
-    def analyze_entanglement_scaling(self, circuit: Circuit, parameters: np.ndarray) -> List[Dict]:
-        """Calculate entropy for different subsystem sizes"""
+    def analyze_entanglement_scaling(self, state_vector: np.ndarray) -> List[Dict]:
+        """Calculate entropy for different subsystem sizes from the final state vector"""
         entropy_data = []
         for size in range(1, self.num_qubits):
             qubit_subset = list(range(size))
             try:
-                entropy = self.calculate_entropy(circuit, parameters, qubit_subset)
+                entropy = self.calculate_entropy(state_vector, qubit_subset)
                 entropy_data.append({
                     'subsystem_size': size,
                     'qubits': qubit_subset,
-                    'entropy': float(entropy)
+                    'entropy': entropy['renyi_2'],
+                    'von_neumann_entropy': entropy['von_neumann']
                 })
             except Exception as e:
                 entropy_data.append({
@@ -201,30 +701,862 @@ class QuantumCircuitSimulator:
 
 def serialize_complex_array(arr: np.ndarray) -> List:
     """convert complex numpy array to JSON-serializable format as [[real, imag], ...]"""
-    if np.iscomplexobj(arr):
-        return [[float(x.real), float(x.imag)] for x in arr.flatten()]
-    return arr.tolist()
+    return array_to_json(arr)
 
 def serialize_results(results: Dict) -> Dict:
     """convert numpy arrays to JSON-serializable format"""
-    serialized = {}
-    for key, value in results.items():
-        if isinstance(value, np.ndarray):
-            if np.iscomplexobj(value):
-                serialized[key] = serialize_complex_array(value)
-            else:
-                serialized[key] = value.tolist()
-        elif isinstance(value, (np.int64, np.int32)):
-            serialized[key] = int(value)
-        elif isinstance(value, (np.float64, np.float32)):
-            serialized[key] = float(value)
-        elif isinstance(value, dict):
-            serialized[key] = serialize_results(value)
-        elif isinstance(value, list):
-            serialized[key] = [serialize_results(item) if isinstance(item, dict) else item for item in value]
+    return to_json_compatible(results)
+
+def copy_arrays(value: Any) -> Any:
+    """copy numpy arrays out of shared memory so they outlive the pool"""
+    if isinstance(value, np.ndarray):
+        # arrays owning their memory are private already
+        return value if value.base is None else value.copy()
+    if isinstance(value, dict):
+        return {k: copy_arrays(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [copy_arrays(v) for v in value]
+    return value
+
+def get_measured_qubits(circuit_data: Dict) -> List[int]:
+    """probabilities and counts cover only the measured qubits, all of them when none are marked"""
+    num_qubits = circuit_data['num_qubits']
+    measured_qubits = [q for q, measured in enumerate(circuit_data.get('measurements') or []) if measured and q < num_qubits]
+    return measured_qubits or list(range(num_qubits))
+
+def get_observables(circuit_data: Dict) -> List[Dict]:
+    """
+    parse the optional observables section of the circuit JSON:
+    [{"name": "H", "terms": [{"coefficient": -1.05, "pauli": "Z0 Z1"}, {"coefficient": 0.4, "pauli": "X0 Y1"}]}]
+    a term is a coefficient times a tensor product of Paulis given as <X|Y|Z><qubit> factors, "" being identity
+    returns [{'name', 'terms': [(coefficient, {qubit: pauli})]}]
+    """
+    num_qubits = circuit_data['num_qubits']
+    observables = []
+    for index, observable in enumerate(circuit_data.get('observables') or []):
+        name = observable.get('name') or f"observable_{index}"
+        terms = []
+        for term in observable.get('terms', []):
+            paulis = {}
+            for factor in term.get('pauli', '').upper().split():
+                pauli, qubit = factor[0], factor[1:]
+                if pauli == 'I':
+                    continue
+                if pauli not in 'XYZ' or not qubit.isdigit() or int(qubit) >= num_qubits:
+                    raise ValueError(f"Invalid Pauli factor '{factor}' in observable '{name}'")
+                if int(qubit) in paulis:
+                    raise ValueError(f"Qubit {qubit} appears twice in a term of observable '{name}'")
+                paulis[int(qubit)] = pauli
+            terms.append((float(term.get('coefficient', 1.0)), paulis))
+        observables.append({'name': name, 'terms': terms})
+    return observables
+
+def gate_names(placed_gates: List[Dict]) -> List[str]:
+    """upper-case gate names in circuit order, nested circuits flattened as json_to_squander flattens them"""
+    names = []
+    for gate_info in placed_gates:
+        if 'circuit' in gate_info:
+            names.extend(gate_names(gate_info['circuit']['gates']))
+        else:
+            names.append(gate_info['gate']['name'].upper())
+    return names
+
+def canonical_gate_name(name: str) -> str:
+    """first registry name of the SQUANDER gate behind name, so that aliases such as CX and CNOT share their noise"""
+    name = name.upper()
+    spec = GateRegistry.SQUANDER_GATES.get(name)
+    if spec is None:
+        return name
+    return next(alias for alias, other in GateRegistry.SQUANDER_GATES.items() if other.method == spec.method)
+
+def get_noise_model(circuit_data: Dict) -> Optional[Dict]:
+    """
+    parse the optional noise section of the circuit JSON:
+    {"gates": {"CNOT": [{"type": "depolarizing", "probability": 0.01}], "H": [{"type": "amplitude_damping", "gamma": 0.002}]},
+     "readout": {"p01": 0.02, "p10": 0.05}}
+    channels act after every gate of that name on the gate's qubits; a measured 0 reads as 1 with p01
+    and a 1 as 0 with p10, "probability" setting both
+    returns {'gates': [(type, strength)] channels of every circuit gate in order, 'readout': (p01, p10)}, None without noise
+    """
+    noise = circuit_data.get('noise')
+    if not noise:
+        return None
+    channels_by_gate = {}
+    for name, channels in (noise.get('gates') or {}).items():
+        parsed = []
+        for channel in channels:
+            kind = channel.get('type')
+            if kind not in NOISE_CHANNELS:
+                raise ValueError(f"Unsupported noise channel '{kind}' on gate '{name}'")
+            strength = float(channel.get(NOISE_CHANNELS[kind], 0.0))
+            if not 0.0 <= strength <= 1.0:
+                raise ValueError(f"Noise channel '{kind}' on gate '{name}' needs {NOISE_CHANNELS[kind]} between 0 and 1")
+            parsed.append((kind, strength))
+        channels_by_gate.setdefault(canonical_gate_name(name), []).extend(parsed)
+    readout = noise.get('readout') or {}
+    p01 = float(readout.get('p01', readout.get('probability', 0.0)))
+    p10 = float(readout.get('p10', readout.get('probability', 0.0)))
+    if not (0.0 <= p01 <= 1.0 and 0.0 <= p10 <= 1.0):
+        raise ValueError("Readout error probabilities need to be between 0 and 1")
+    return {
+        'gates': [channels_by_gate.get(canonical_gate_name(name), []) for name in gate_names(circuit_data['placed_gates'])],
+        'readout': (p01, p10)
+    }
+
+def estimate_resources(
+    num_qubits: int,
+    num_gates: int,
+    num_outcomes: int,
+    density_qubits: int = 0,
+    compute_density_matrix: bool = False,
+    compute_entropy: bool = False,
+    num_observable_terms: int = 0,
+    output_mode: str = 'dense',
+    output_precision: str = 'double',
+    raw_arrays: bool = True,
+    simulation_precision: str = 'double',
+    precision_check: bool = False,
+    noise_trajectories: int = 0,
+    noise_workers: int = 1
+) -> Dict:
+    """
+    predict peak memory and rough runtime of run_simulation with the given stages enabled
+    peak = resident buffers (two state vectors, two distributions, density outputs)
+    plus the largest temporary of any single stage, since stages run one after another
+    noisy trajectories run in up to noise_workers processes at once, each with its own state vector
+    """
+    amplitudes = 1 << num_qubits
+    state_bytes = amplitudes * np.dtype(STATE_DTYPES[simulation_precision]).itemsize
+    resident = BASELINE_BYTES + 2 * state_bytes + 2 * num_outcomes * 8
+    stages = {
+        # |psi|^2 of the full register before marginalising
+        'probabilities': amplitudes * 8 + num_outcomes * 8,
+        'sampling': 2 * num_outcomes * 8,
+        'comparing_distributions': 7 * num_outcomes * 8,
+    }
+    # original and partitioned simulations touch every amplitude once per gate
+    ops = 2 * num_gates * amplitudes
+    if compute_density_matrix:
+        density = 1 << (2 * density_qubits)
+        resident += 2 * density * np.dtype(DENSITY_DTYPE).itemsize
+        # transposed copy and conjugate of the state, product in state precision and its conversion
+        stages['density_matrix'] = 2 * state_bytes + density * (state_bytes // amplitudes + 8)
+        ops += 2 * amplitudes * (1 << density_qubits)
+    if compute_entropy:
+        # the even cut has the largest Gram matrix, eigvalsh works on a copy of it
+        gram = 1 << (2 * (num_qubits // 2))
+        stages['entropy'] = state_bytes + 2 * gram * (state_bytes // amplitudes)
+        for size in range(1, num_qubits):
+            side = 1 << min(size, num_qubits - size)
+            ops += 2 * (amplitudes * side + side ** 3)
+    if precision_check and simulation_precision != 'double':
+        # double precision reference of the original circuit
+        stages['precision_check'] = amplitudes * 16 + CHUNK_AMPLITUDES * 16
+        ops += num_gates * amplitudes
+    if num_observable_terms:
+        # rotated scratch state and its full distribution
+        stages['observables'] = state_bytes + amplitudes * 8
+        ops += 2 * num_observable_terms * amplitudes
+    if noise_trajectories:
+        # per process: a double precision trajectory state, the |psi|^2 it marginalises and the summed distribution
+        workers = max(1, min(noise_workers, noise_trajectories))
+        stages['noise'] = workers * (amplitudes * 16 + amplitudes * 8 + 3 * num_outcomes * 8)
+        ops += noise_trajectories * num_gates * amplitudes // workers
+    if output_mode == 'sparse':
+        stages['finalizing'] = 3 * num_outcomes * 8
+    elif raw_arrays:
+        # state vectors are copied out of shared memory, or converted to single precision
+        state_output = min(state_bytes, amplitudes * 8) if output_precision == 'single' else state_bytes
+        stages['finalizing'] = 2 * state_output + 3 * num_outcomes * 8
+    else:
+        stages['finalizing'] = (2 * 2 * amplitudes + 3 * num_outcomes) * JSON_BYTES_PER_VALUE
+    return {
+        'peak_bytes': resident + max(stages.values()),
+        'resident_bytes': resident,
+        'stage_bytes': stages,
+        'estimated_seconds': ops * SECONDS_PER_AMPLITUDE_OP
+    }
+
+def _fit_noise_workers(memory_budget: int, settings: Dict, requested: int) -> Tuple[Dict, Dict]:
+    """the most noise workers, up to requested and at least one, that keep the estimate within memory_budget"""
+    low, high = 1, max(1, requested)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_resources(**dict(settings, noise_workers=middle))['peak_bytes'] <= memory_budget:
+            low = middle
+        else:
+            high = middle - 1
+    settings = dict(settings, noise_workers=low)
+    return settings, estimate_resources(**settings)
+
+def fit_memory_budget(memory_budget: int, **settings) -> Tuple[Dict, List[str], Dict]:
+    """
+    apply DOWNGRADES in order until estimate_resources(**settings) fits memory_budget bytes
+    noisy trajectories first run in fewer processes, which only costs time, before any stage is given up
+    returns the adjusted settings, the downgrades applied and the final estimate
+    raises MemoryError when even the fully downgraded pipeline does not fit
+    """
+    requested_workers = settings.get('noise_workers', 1)
+    if settings.get('noise_trajectories'):
+        settings, estimate = _fit_noise_workers(memory_budget, settings, requested_workers)
+    else:
+        estimate = estimate_resources(**settings)
+    applied = []
+    previous = {}
+    for name, change in DOWNGRADES:
+        if estimate['peak_bytes'] <= memory_budget:
+            break
+        if all(settings.get(key) == value for key, value in change.items()):
+            continue
+        previous[name] = {key: settings.get(key) for key in change}
+        settings.update(change)
+        applied.append(name)
+        estimate = estimate_resources(**settings)
+    # give back earlier downgrades that the later ones made unnecessary
+    for name in reversed(applied[:-1]):
+        restored = dict(settings, **previous[name])
+        candidate = estimate_resources(**restored)
+        if candidate['peak_bytes'] <= memory_budget:
+            settings, estimate = restored, candidate
+            applied.remove(name)
+    if settings.get('noise_trajectories'):
+        # the downgrades may have left room for more trajectory processes
+        settings, estimate = _fit_noise_workers(memory_budget, settings, requested_workers)
+        if settings['noise_workers'] < min(requested_workers, settings['noise_trajectories']):
+            applied.insert(0, 'fewer_noise_workers')
+    if estimate['peak_bytes'] > memory_budget:
+        raise MemoryError(
+            f"Simulation needs about {estimate['peak_bytes'] / 2**30:.2f} GiB even with "
+            f"{', '.join(applied) or 'no optional stages'}, memory budget is {memory_budget / 2**30:.2f} GiB"
+        )
+    return settings, applied, estimate
+
+def estimate_comparison(num_qubits: int, num_strategies: int, max_workers: int) -> Dict:
+    """
+    predict peak memory of run_strategy_comparison: the shared original state, and in every
+    strategy process running at once its own partitioned state vector
+    """
+    state_bytes = (1 << num_qubits) * np.dtype(np.complex128).itemsize
+    workers = max(1, min(max_workers, num_strategies))
+    return {
+        'peak_bytes': BASELINE_BYTES + state_bytes + workers * state_bytes,
+        'strategy_bytes': state_bytes,
+        'workers': workers
+    }
+
+def fit_comparison_workers(memory_budget: int, num_qubits: int, num_strategies: int, max_workers: int) -> Dict:
+    """
+    estimate_comparison with as many of max_workers strategy processes as fit memory_budget bytes
+    raises MemoryError when not even one strategy at a time fits
+    """
+    estimate = estimate_comparison(num_qubits, num_strategies, max_workers)
+    if estimate['peak_bytes'] > memory_budget:
+        spare = memory_budget - (estimate['peak_bytes'] - estimate['workers'] * estimate['strategy_bytes'])
+        estimate = estimate_comparison(num_qubits, num_strategies, max(1, spare // estimate['strategy_bytes']))
+    if estimate['peak_bytes'] > memory_budget:
+        raise MemoryError(
+            f"Strategy comparison needs about {estimate['peak_bytes'] / 2**30:.2f} GiB with one strategy at a time, "
+            f"memory budget is {memory_budget / 2**30:.2f} GiB"
+        )
+    return estimate
+
+def available_memory() -> Optional[int]:
+    """MemAvailable of the host in bytes, None where /proc/meminfo is not available"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def partition_in_worker(
+    worker: Optional[StageWorker],
+    simulator: QuantumCircuitSimulator,
+    circuit: Circuit,
+    parameters: np.ndarray,
+    max_partition_size: int,
+    strategy: str,
+    simulation_timeout: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+    cache_bytes: int = PARTITION_CACHE_BYTES
+) -> Dict:
+    """
+    run partition_circuit in the worker (in-process without one), exporting the QASM input first for qiskit/bqskit strategies
+    with a cache_dir, a cached partitioning of the same circuit and settings is rebuilt instead of solved again,
+    and a freshly solved one is added to the cache
+    """
+    fingerprint = None
+    assignments = None
+    if cache_dir:
+        fingerprint = circuit_fingerprint(circuit, parameters, strategy, max_partition_size)
+        assignments = load_partition_assignments(cache_dir, fingerprint, len(circuit.get_Gates()))
+    qasm_file = None
+    if strategy in QASM_STRATEGIES and assignments is None:
+        fd, qasm_file = tempfile.mkstemp(suffix='.qasm', text=True)
+        try:
+            os.close(fd)
+            CircuitConverter.squander_to_qasm(circuit, parameters, qasm_file)
+        except Exception as e:
+            if qasm_file and os.path.exists(qasm_file):
+                os.unlink(qasm_file)
+            raise RuntimeError(f"Failed to create QASM file for {strategy}: {str(e)}")
+    try:
+        if worker is None:
+            result = simulator.partition_circuit(circuit, parameters, max_partition_size, strategy, qasm_file, assignments)
+        else:
+            result = worker.run(
+                simulator.partition_circuit,
+                args=(circuit, parameters, max_partition_size, strategy, qasm_file, assignments),
+                timeout_seconds=simulation_timeout
+            )
+    finally:
+        if qasm_file and os.path.exists(qasm_file):
+            os.unlink(qasm_file)
+    if fingerprint is not None and assignments is None:
+        try:
+            store_partition_assignments(
+                cache_dir, fingerprint,
+                [partition['original_gate_indices'] for partition in result['partition_info']['partitions']],
+                len(circuit.get_Gates()), cache_bytes
+            )
+        except OSError:
+            # the cache only saves time, a full or read-only directory must not fail the run
+            pass
+    return result
+
+def unpartitioned_result(circuit: Circuit, parameters: np.ndarray, max_partition_size: int, strategy: str) -> Dict:
+    """stand-in partition result that keeps the original circuit, used when partitioning is skipped"""
+    return {
+        'partitioned_circuit': circuit,
+        'partitioned_params': parameters,
+        'partition_info': {
+            'strategy': strategy,
+            'max_partition_size': max_partition_size,
+            'total_partitions': 0,
+            'partitions': [],
+            'cached': False
+        }
+    }
+
+def circuit_fingerprint(circuit: Circuit, parameters: np.ndarray, *keys: Any) -> str:
+    """sha256 of the gate list, the exact parameter values and any further JSON-serialisable keys"""
+    digest = hashlib.sha256()
+    digest.update(str(circuit.get_Qbit_Num()).encode())
+    for gate in circuit.get_Gates():
+        digest.update(f"{gate.get_Name()}:{gate.get_Target_Qbit()}:{gate.get_Control_Qbit()}:{sorted(gate.get_Involved_Qbits())};".encode())
+    digest.update(np.ascontiguousarray(parameters, dtype=np.float64).tobytes())
+    digest.update(json.dumps(keys, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+def _covers_gates(assignments: Any, num_gates: int) -> bool:
+    """whether assignments place every gate of a num_gates circuit in exactly one partition"""
+    try:
+        return sorted(int(index) for partition in assignments for index in partition) == list(range(num_gates))
+    except (TypeError, ValueError):
+        return False
+
+def load_partition_assignments(cache_dir: str, fingerprint: str, num_gates: int) -> Optional[List[List[int]]]:
+    """partition assignments cached under fingerprint, marked as most recently used, or None without a usable entry"""
+    path = os.path.join(cache_dir, fingerprint + '.json')
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+        assignments = entry['assignments']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if entry.get('fingerprint') != fingerprint or not _covers_gates(assignments, num_gates):
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return assignments
+
+def store_partition_assignments(cache_dir: str, fingerprint: str, assignments: List[List[int]], num_gates: int, max_bytes: int = PARTITION_CACHE_BYTES):
+    """
+    cache the partition assignments of a circuit under its fingerprint, then evict the least
+    recently used entries until the cache fits max_bytes; assignments that do not cover the
+    circuit's gates (a partitioner that rewrote the circuit) are not cached
+    """
+    if not _covers_gates(assignments, num_gates):
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, fingerprint + '.json')
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'fingerprint': fingerprint, 'assignments': [[int(index) for index in partition] for partition in assignments]}, f)
+    os.replace(tmp_path, path)
+    entries = []
+    for entry in glob.glob(os.path.join(cache_dir, '*.json')):
+        try:
+            stat = os.stat(entry)
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry))
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        if entry == path:
+            continue
+        try:
+            os.unlink(entry)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+def _original_entry(cache_dir: str, fingerprint: str) -> Tuple[str, Dict]:
+    """directory and metadata of the original-output entry under fingerprint, empty metadata without a usable entry"""
+    entry_dir = os.path.join(cache_dir, fingerprint)
+    try:
+        with open(os.path.join(entry_dir, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return entry_dir, {}
+    return entry_dir, meta if isinstance(meta, dict) and meta.get('fingerprint') == fingerprint else {}
+
+def _load_array_into(path: str, out: np.ndarray) -> bool:
+    try:
+        saved = np.load(path, mmap_mode='r')
+    except (OSError, ValueError):
+        return False
+    if saved.shape != out.shape or saved.dtype != out.dtype:
+        return False
+    out[...] = saved
+    return True
+
+def load_original_outputs(
+    cache_dir: str,
+    fingerprint: str,
+    state_vector: np.ndarray,
+    probabilities: np.ndarray,
+    qubits: List[int],
+    counts_key: Optional[str] = None
+) -> Dict:
+    """
+    restore cached outputs of the original circuit into state_vector and probabilities of the given qubits
+    returns the parts found: 'state_vector' and 'probabilities' (True when restored), 'counts' for counts_key
+    and 'precision_check'; a found entry is marked as most recently used
+    """
+    entry_dir, meta = _original_entry(cache_dir, fingerprint)
+    found: Dict = {}
+    if not meta or not _load_array_into(os.path.join(entry_dir, 'state.npy'), state_vector):
+        return found
+    found['state_vector'] = True
+    probability_file = meta.get('probabilities', {}).get(json.dumps(qubits))
+    if probability_file and _load_array_into(os.path.join(entry_dir, probability_file), probabilities):
+        found['probabilities'] = True
+        if counts_key is not None and counts_key in meta.get('counts', {}):
+            found['counts'] = meta['counts'][counts_key]
+    if meta.get('precision_check') is not None:
+        found['precision_check'] = meta['precision_check']
+    try:
+        os.utime(os.path.join(entry_dir, 'meta.json'))
+    except OSError:
+        pass
+    return found
+
+def store_original_outputs(
+    cache_dir: str,
+    fingerprint: str,
+    state_vector: np.ndarray,
+    probabilities: Optional[np.ndarray] = None,
+    qubits: Optional[List[int]] = None,
+    counts_key: Optional[str] = None,
+    counts: Optional[Dict[str, int]] = None,
+    precision_check: Optional[Dict] = None,
+    max_bytes: int = ORIGINAL_CACHE_BYTES
+):
+    """
+    add original-circuit outputs to the entry under fingerprint, writing the state only when the entry has none,
+    then evict the least recently used entries until the cache fits max_bytes; a state larger than the whole
+    cache is not stored
+    concurrent jobs may store into the same entry: every file is written under a temporary name and renamed into
+    place, probabilities are named after their qubits, and the metadata is re-read and merged just before it is
+    replaced, so a lost race drops an entry at worst and never maps one qubit set to another's array
+    """
+    if state_vector.nbytes > max_bytes:
+        return
+    entry_dir = os.path.join(cache_dir, fingerprint)
+    os.makedirs(entry_dir, exist_ok=True)
+    state_path = os.path.join(entry_dir, 'state.npy')
+    if not os.path.exists(state_path):
+        with open(f"{state_path}.{os.getpid()}.tmp", 'wb') as f:
+            np.save(f, state_vector)
+        os.replace(f"{state_path}.{os.getpid()}.tmp", state_path)
+    probability_file = None
+    if probabilities is not None and qubits is not None:
+        probability_file = f"probabilities.{hashlib.sha1(json.dumps(qubits).encode()).hexdigest()}.npy"
+        probability_path = os.path.join(entry_dir, probability_file)
+        if not os.path.exists(probability_path):
+            with open(f"{probability_path}.{os.getpid()}.tmp", 'wb') as f:
+                np.save(f, probabilities)
+            os.replace(f"{probability_path}.{os.getpid()}.tmp", probability_path)
+    _, meta = _original_entry(cache_dir, fingerprint)
+    meta = meta or {'fingerprint': fingerprint}
+    meta.setdefault('probabilities', {})
+    meta.setdefault('counts', {})
+    if probability_file is not None:
+        meta['probabilities'][json.dumps(qubits)] = probability_file
+    if counts_key is not None and counts is not None:
+        meta['counts'][counts_key] = {str(outcome): int(count) for outcome, count in counts.items()}
+    if precision_check is not None:
+        meta['precision_check'] = to_json_compatible(precision_check)
+    meta_path = os.path.join(entry_dir, 'meta.json')
+    with open(f"{meta_path}.{os.getpid()}.tmp", 'w') as f:
+        json.dump(meta, f)
+    os.replace(f"{meta_path}.{os.getpid()}.tmp", meta_path)
+
+    entries = []
+    for entry in glob.glob(os.path.join(cache_dir, '*', 'meta.json')):
+        try:
+            directory = os.path.dirname(entry)
+            size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+            entries.append((os.path.getmtime(entry), size, directory))
+        except FileNotFoundError:
+            continue
+    total = sum(size for _, size, _ in entries)
+    for _, size, directory in sorted(entries):
+        if total <= max_bytes:
+            break
+        if directory == entry_dir:
+            continue
+        shutil.rmtree(directory, ignore_errors=True)
+        total -= size
+
+def load_checkpoint(checkpoint_dir: str, fingerprint: str, state_vector: np.ndarray) -> int:
+    """restore the state of a matching checkpoint into state_vector, returning the partitions it covers (0 without one)"""
+    try:
+        with open(os.path.join(checkpoint_dir, fingerprint + '.json')) as f:
+            meta = json.load(f)
+        saved = np.load(os.path.join(checkpoint_dir, meta['state']), mmap_mode='r')
+    except (OSError, ValueError, KeyError):
+        return 0
+    if meta.get('fingerprint') != fingerprint or saved.shape != state_vector.shape or saved.dtype != state_vector.dtype:
+        return 0
+    state_vector[...] = saved
+    return int(meta['partitions_done'])
+
+def save_checkpoint(checkpoint_dir: str, fingerprint: str, state_vector: np.ndarray, partitions_done: int, total_partitions: int):
+    """
+    write the state after partitions_done partitions next to the previous checkpoint, then switch the
+    metadata over to it, so an interrupted save leaves the previous checkpoint intact
+    """
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    state_file = f"{fingerprint}.{partitions_done}.npy"
+    path = os.path.join(checkpoint_dir, state_file)
+    with open(path + '.tmp', 'wb') as f:
+        np.save(f, state_vector)
+    os.replace(path + '.tmp', path)
+    meta_path = os.path.join(checkpoint_dir, fingerprint + '.json')
+    with open(meta_path + '.tmp', 'w') as f:
+        json.dump({'fingerprint': fingerprint, 'state': state_file, 'partitions_done': partitions_done, 'total_partitions': total_partitions}, f)
+    os.replace(meta_path + '.tmp', meta_path)
+    for previous in glob.glob(os.path.join(checkpoint_dir, glob.escape(fingerprint) + '.*.npy')):
+        if os.path.basename(previous) != state_file:
+            os.unlink(previous)
+    # checkpoints of jobs that never came back are dropped after a day
+    for stale in glob.glob(os.path.join(checkpoint_dir, '*.json')):
+        try:
+            if time.time() - os.path.getmtime(stale) > CHECKPOINT_MAX_AGE_SECONDS:
+                remove_checkpoint(checkpoint_dir, os.path.basename(stale)[:-len('.json')])
+        except OSError:
+            pass
+
+def remove_checkpoint(checkpoint_dir: str, fingerprint: str):
+    for path in [os.path.join(checkpoint_dir, fingerprint + '.json')] + glob.glob(os.path.join(checkpoint_dir, glob.escape(fingerprint) + '.*.npy')):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+def simulate_partitions_in_worker(
+    worker: StageWorker,
+    simulator: QuantumCircuitSimulator,
+    circuit: Circuit,
+    parameters: np.ndarray,
+    state_handle: SharedArray,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    timeout_seconds: Optional[int] = None,
+    checkpoint_every: int = 0,
+    checkpoint_dir: str = CHECKPOINT_DIR,
+    fingerprint: Optional[str] = None
+) -> int:
+    """
+    evolve the shared state through the partitions of circuit batch by batch in the worker,
+    calling on_progress(done, total) after every batch; the timeout covers all batches together
+    with checkpoint_every and a fingerprint, the state is saved every that many partitions and a
+    matching earlier checkpoint is resumed from; returns the number of partitions it resumed after
+    """
+    total = len(circuit.get_Gates())
+    state_vector = attach(state_handle)
+    checkpointing = checkpoint_every > 0 and fingerprint is not None
+    resumed = load_checkpoint(checkpoint_dir, fingerprint, state_vector) if checkpointing else 0
+    if not resumed:
+        state_vector.fill(0)
+        state_vector[0] = 1.0 + 0j
+    batch = max(1, -(-total // MAX_PARTITION_UPDATES))
+    deadline = time.monotonic() + timeout_seconds if timeout_seconds else None
+    done = resumed
+    while done < total:
+        stop = min(total, done + batch)
+        if checkpointing:
+            # batches end on checkpoint boundaries
+            stop = min(stop, (done // checkpoint_every + 1) * checkpoint_every)
+        remaining = None
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"Operation timed out after {timeout_seconds} seconds")
+        try:
+            worker.run(
+                on_shared,
+                args=(simulator.apply_partitions, circuit, parameters, state_handle, done, stop),
+                timeout_seconds=remaining
+            )
+        except TimeoutError:
+            raise TimeoutError(f"Operation timed out after {timeout_seconds} seconds")
+        done = stop
+        if checkpointing and done % checkpoint_every == 0 and done < total:
+            save_checkpoint(checkpoint_dir, fingerprint, state_vector, done, total)
+        if on_progress:
+            on_progress(done, total)
+    if checkpointing:
+        remove_checkpoint(checkpoint_dir, fingerprint)
+    return resumed
+
+def simulate_noise(
+    simulator: QuantumCircuitSimulator,
+    circuit: Circuit,
+    parameters: np.ndarray,
+    noise: Dict,
+    num_trajectories: int,
+    num_shots: int,
+    qubits: List[int],
+    reference: Optional[SharedArray] = None,
+    seed_sequence: Optional[np.random.SeedSequence] = None,
+    timeout_seconds: Optional[int] = None,
+    max_workers: Optional[int] = None
+) -> Tuple[Optional[Dict], List[Dict]]:
+    """
+    run the trajectories of a noise model (get_noise_model) in batches across up to max_workers processes
+    (default: one per CPU), each batch under its own timeout, and combine them: counts of num_shots samples
+    in all, the mean measured distribution, and the mean fidelity to the reference (noiseless) state
+    every trajectory has its own seed, so results do not depend on how trajectories are batched
+    returns (noisy results or None when no batch finished, errors)
+    """
+    max_workers = max(1, max_workers or os.cpu_count() or 1)
+    num_trajectories = max(1, num_trajectories)
+    seeds = (seed_sequence or np.random.SeedSequence()).spawn(num_trajectories)
+    shots = [num_shots // num_trajectories + (i < num_shots % num_trajectories) for i in range(num_trajectories)]
+    # a few batches per process balance the load, and a timeout loses only its own batch
+    bounds = np.linspace(0, num_trajectories, min(num_trajectories, 4 * max_workers) + 1).astype(int).tolist()
+    outcomes = run_concurrently(
+        [
+            (on_shared, (simulator.run_trajectories, circuit, parameters, noise['gates'], seeds[start:stop], shots[start:stop], qubits, noise['readout'], reference), {})
+            for start, stop in zip(bounds[:-1], bounds[1:])
+        ],
+        timeout_seconds=timeout_seconds,
+        max_workers=max_workers
+    )
+    totals = None
+    failures = []
+    for status, value in outcomes:
+        if status != 'success':
+            failures.append((status, value))
+        elif totals is None:
+            totals = value
         else:
-            serialized[key] = value
-    return serialized
+            totals['trajectories'] += value['trajectories']
+            totals['probabilities'] += value['probabilities']
+            totals['fidelity'] += value['fidelity']
+            totals['error_branches'] += value['error_branches']
+            for outcome, count in value['counts'].items():
+                totals['counts'][outcome] = totals['counts'].get(outcome, 0) + count
+    errors = []
+    if failures:
+        status, value = failures[0]
+        error = {'stage': 'simulating_noise', 'error': f"{len(failures)} of {len(outcomes)} trajectory batches did not finish, the first: {value}"}
+        if any(status == 'timeout' for status, _ in failures):
+            error['timeout'] = True
+        errors.append(error)
+    if totals is None:
+        return None, errors
+    count = totals['trajectories']
+    noisy = {
+        'trajectories': count,
+        'num_shots': sum(totals['counts'].values()),
+        'counts': totals['counts'],
+        'probabilities': totals['probabilities'] / count,
+        'error_branches': totals['error_branches']
+    }
+    if reference is not None:
+        noisy['fidelity'] = totals['fidelity'] / count
+    return noisy, errors
+
+def simulate_partitions_sharded(
+    simulator: QuantumCircuitSimulator,
+    circuit: Circuit,
+    parameters: np.ndarray,
+    state_handle: SharedArray,
+    shard_qubits: int,
+    num_workers: Optional[int] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    timeout_seconds: Optional[int] = None
+) -> Dict:
+    """
+    evolve the shared state through the blocks of circuit split into 2^shard_qubits shards over up to
+    num_workers processes (default: one per CPU), swapping global qubits in as the blocks need them;
+    blocks may not be wider than the num_qubits - shard_qubits local qubits of a shard
+    returns the shard count, workers, steps and shard swaps of the schedule
+    """
+    blocks = circuit.get_Gates()
+    block_qubits = [sorted(block.get_Qbits() if isinstance(block, Circuit) else block.get_Involved_Qbits()) for block in blocks]
+    steps, shard_swaps = schedule(block_qubits, simulator.num_qubits, shard_qubits, batch=max(1, -(-len(blocks) // MAX_PARTITION_UPDATES)))
+    state_vector = attach(state_handle)
+    state_vector.fill(0)
+    state_vector[0] = 1.0 + 0j
+    def apply_run(start: int, stop: int, positions: List[int], shards: List[np.ndarray]):
+        simulator.apply_to_shards(circuit, parameters, shards, positions, start, stop)
+    with ShardedStateVector(state_handle, shard_qubits, apply_run, num_workers) as sharded:
+        sharded.run(steps, on_progress=on_progress, timeout_seconds=timeout_seconds)
+    return {
+        'shards': 1 << shard_qubits,
+        'workers': sharded.num_workers,
+        'steps': len(steps),
+        'shard_swaps': shard_swaps
+    }
+
+def emit_progress(stage: str, current: int, total: int, message: str = "", progress_callback: Optional[Callable[[str, int, int, str], None]] = None, metrics: Optional[StageMetrics] = None):
+    """print a progress line and pass it to progress_callback, starting the stage in metrics when given"""
+    if metrics is not None:
+        metrics.enter(stage)
+    print(f"[{current}/{total}] {stage}: {message}", flush=True)
+    if progress_callback:
+        try:
+            progress_callback(stage, current, total, message)
+        except Exception:
+            pass
+
+def compare_strategy(simulator: QuantumCircuitSimulator, circuit: Circuit, parameters: np.ndarray, max_partition_size: int, strategy: str, state_original: SharedArray, partition_cache_dir: Optional[str] = None, partition_cache_bytes: int = PARTITION_CACHE_BYTES) -> Dict:
+    """partition and simulate with one strategy, returning its comparison table row"""
+    start_time = time.time()
+    partition_result = partition_in_worker(None, simulator, circuit, parameters, max_partition_size, strategy, cache_dir=partition_cache_dir, cache_bytes=partition_cache_bytes)
+    partition_seconds = time.time() - start_time
+    state = simulator.simulate_statevector(partition_result['partitioned_circuit'], partition_result['partitioned_params'])
+    fidelity = simulator.calculate_fidelity(attach(state_original), state)
+    sizes = [partition['num_qubits'] for partition in partition_result['partition_info']['partitions']]
+    gates = [partition['num_gates'] for partition in partition_result['partition_info']['partitions']]
+    return {
+        'strategy': strategy,
+        'total_partitions': len(sizes),
+        'partition_sizes': sizes,
+        'max_partition_qubits': max(sizes, default=0),
+        'mean_partition_qubits': float(np.mean(sizes)) if sizes else 0.0,
+        'mean_partition_gates': float(np.mean(gates)) if gates else 0.0,
+        'fidelity': fidelity,
+        'partition_cached': partition_result['partition_info']['cached'],
+        'partition_seconds': partition_seconds,
+        'simulation_seconds': time.time() - start_time - partition_seconds,
+        'wall_seconds': time.time() - start_time
+    }
+
+def run_strategy_comparison(
+    circuit_data: Dict,
+    strategies: List[str],
+    max_partition_size: int = 4,
+    progress_callback: Optional[Callable[[str, int, int, str], None]] = None,
+    simulation_timeout: Optional[int] = None,
+    max_workers: Optional[int] = None,
+    partition_cache_dir: Optional[str] = None,
+    partition_cache_bytes: int = PARTITION_CACHE_BYTES,
+    memory_budget: Optional[int] = None
+) -> Dict:
+    """
+        compare partitioning strategies on one circuit, simulating the original only once
+
+        Every strategy partitions and simulates in its own process, up to max_workers at once
+        (default: one per CPU) with simulation_timeout applying to each strategy separately.
+        Each process holds one partitioned state vector, so memory grows with max_workers;
+        with memory_budget (bytes) only as many run at once as fit it.
+        With partition_cache_dir, strategies reuse cached partitionings of the same circuit.
+
+        Returns the original simulation time and one table row per strategy, in the requested
+        order, with partition count and sizes, fidelity against the original and wall time,
+        or the error / timeout that stopped it
+    """
+    report_progress = partial(emit_progress, progress_callback=progress_callback)
+
+    start_time = time.time()
+    num_qubits = circuit_data['num_qubits']
+    simulator = QuantumCircuitSimulator(num_qubits)
+    errors = []
+    total_steps = 4
+
+    # pre-flight estimate, running fewer strategies at once before anything large is allocated
+    requested_workers = max(1, max_workers or os.cpu_count() or 1)
+    if memory_budget:
+        estimate = fit_comparison_workers(memory_budget, num_qubits, len(strategies), requested_workers)
+        if estimate['workers'] < min(requested_workers, len(strategies)):
+            errors.append({'stage': 'memory_budget', 'error': f"{estimate['workers']} of {requested_workers} strategies run at once to fit the memory budget of {memory_budget / 2**30:.2f} GiB"})
+    else:
+        estimate = estimate_comparison(num_qubits, len(strategies), requested_workers)
+    max_workers = estimate['workers']
+
+    report_progress("building_circuit", 1, total_steps, "Building quantum circuit...")
+    circuit, parameters, _ = CircuitConverter.json_to_squander(circuit_data, gate_ids=simulator.gate_ids)
+    simulator.circuit = circuit
+    simulator.parameters = parameters
+
+    with SharedArrayPool() as pool, StageWorker() as worker:
+        report_progress("simulating_original", 2, total_steps, "Simulating original circuit...")
+        state_original_handle = pool.allocate((simulator.matrix_size, 1), np.complex128)
+        original_start = time.time()
+        try:
+            worker.run(
+                on_shared,
+                args=(simulator.simulate_statevector, circuit, parameters),
+                kwargs={'out': state_original_handle},
+                timeout_seconds=simulation_timeout
+            )
+        except TimeoutError as e:
+            # without a reference state no strategy can be scored
+            errors.append({'stage': 'simulating_original', 'error': str(e), 'timeout': True})
+            return serialize_results({'num_qubits': num_qubits, 'max_partition_size': max_partition_size, 'errors': errors, 'strategies': []})
+        original_seconds = time.time() - original_start
+
+        report_progress("comparing_strategies", 3, total_steps, f"Partitioning and simulating {len(strategies)} strategies...")
+        outcomes = run_concurrently(
+            [
+                (compare_strategy, (simulator, circuit, parameters, max_partition_size, strategy, state_original_handle, partition_cache_dir, partition_cache_bytes), {})
+                for strategy in strategies
+            ],
+            timeout_seconds=simulation_timeout,
+            max_workers=max_workers
+        )
+
+    rows = []
+    for strategy, (status, value) in zip(strategies, outcomes):
+        if status == 'success':
+            rows.append(value)
+            continue
+        error = {'error': str(value), **({'timeout': True} if status == 'timeout' else {})}
+        errors.append({'stage': f'strategy_{strategy}', **error})
+        rows.append({'strategy': strategy, **error})
+
+    report_progress("finalizing", 4, total_steps, "Finalizing results...")
+    return serialize_results({
+        'timestamp': int(time.time() * 1000),
+        'num_qubits': num_qubits,
+        'max_partition_size': max_partition_size,
+        'original_simulation_seconds': original_seconds,
+        'resource_estimate': {'peak_bytes': estimate['peak_bytes'], 'memory_budget': memory_budget, 'workers': max_workers},
+        'errors': errors,
+        'strategies': rows,
+        'elapsed_seconds': time.time() - start_time
+    })
 
 def run_simulation(
     circuit_data: Dict,
@@ -234,7 +1566,29 @@ def run_simulation(
     progress_callback: Optional[Callable[[str, int, int, str], None]] = None,
     simulation_timeout: Optional[int] = None,
     compute_density_matrix: bool = False,
-    compute_entropy: bool = False
+    compute_entropy: bool = False,
+    seed: Optional[int] = None,
+    density_qubits: Optional[List[int]] = None,
+    max_density_qubits: int = MAX_DENSITY_QUBITS,
+    raw_arrays: bool = False,
+    output_mode: str = 'dense',
+    top_k: Optional[int] = None,
+    probability_threshold: float = 0.0,
+    output_precision: str = 'double',
+    memory_budget: Optional[int] = None,
+    simulation_precision: str = 'double',
+    precision_check: bool = False,
+    checkpoint_every: int = 0,
+    checkpoint_dir: str = CHECKPOINT_DIR,
+    partition_cache_dir: Optional[str] = None,
+    partition_cache_bytes: int = PARTITION_CACHE_BYTES,
+    noise_trajectories: int = NOISE_TRAJECTORIES,
+    noise_workers: Optional[int] = None,
+    shard_qubits: int = 0,
+    shard_workers: Optional[int] = None,
+    original_cache_dir: Optional[str] = None,
+    original_cache_bytes: int = ORIGINAL_CACHE_BYTES,
+    on_section: Optional[Callable[[str, Any], None]] = None
 ) -> Dict:
     """
         run complete simulation pipeline and return all visualization data
@@ -245,30 +1599,86 @@ def run_simulation(
             strategy: Partitioning strategy ('kahn', 'depth', etc.)
             num_shots: Number of measurement samples
             progress_callback: Optional callback(stage, current, total, message) for progress updates
+            seed: Optional seed that makes the sampled counts reproducible
+            density_qubits: Qubits of the reduced density matrices (default: the measured qubits)
+            max_density_qubits: Cap on the density matrix size, larger subsets keep their lowest qubits
+            raw_arrays: Return numpy arrays (for write_result_archive) instead of JSON lists
+            output_mode: 'dense' for full vectors, 'sparse' for (index, value) probabilities of the
+                top_k / above probability_threshold outcomes without state vectors or difference vector
+            output_precision: 'double', or 'single' to return state vectors and probabilities as complex64 / float32
+            memory_budget: Peak memory in bytes the run must fit; noisy trajectories run in fewer processes,
+                then entropy, density matrices, output precision and dense output are given up in that
+                order when the estimate exceeds it
+            simulation_precision: 'double', or 'single' to simulate complex64 state vectors (half the memory)
+            precision_check: With single precision, compare the original state against one double
+                precision run and report fidelity and largest amplitude error (opt-in: it simulates
+                the original circuit a second time and holds a double precision state next to it)
+            checkpoint_every: Save the partitioned simulation state every this many partitions (0: never);
+                a rerun of the same circuit, parameters and partitioning resumes from the last one
+            checkpoint_dir: Directory of the checkpoints
+            partition_cache_dir: Directory caching partition assignments by circuit, parameters, strategy
+                and partition size, so repeated runs skip the partitioner (None: no cache)
+            partition_cache_bytes: Size of the partition cache, least recently used entries are evicted beyond it
+            noise_trajectories: Monte-Carlo trajectories of circuits with a noise section; every trajectory
+                is a state vector simulation, so memory grows with the noise_workers run at once
+            noise_workers: Processes running trajectory batches (default: one per CPU, fewer when
+                memory_budget does not fit them)
+            shard_qubits: Split the partitioned simulation's state into 2^shard_qubits shards evolved by
+                shard_workers processes (default: one per CPU), 0 keeping it in one worker; sharded runs
+                take no checkpoints
+            original_cache_dir: Directory storing the original circuit's state, probabilities and seeded counts
+                by gates and parameters, so runs that only change partitioning options reuse them (None: no store)
+            original_cache_bytes: Disk size of that store, least recently used entries are evicted beyond it
+            on_section: Optional callback(key, data) called with each top-level result section as soon as
+                it is ready; original, partitioned and comparison first arrive with their counts and
+                fidelity only and are sent again in full at the end, every other section is sent once
         
         Returns dictionary containing:
         - partition_info: partition details
         - state_vector: complex amplitudes
-        - probabilities: measurement probabilities
-        - counts: sampled measurement outcomes
-        - density_matrix: density matrix (real and imaginary)
+        - probabilities: measurement probabilities of the measured qubits
+        - counts: sampled measurement outcomes of the measured qubits
+        - density_matrix: reduced density matrix (real and imaginary, single precision) and its qubits
         - entropy_analysis: entanglement entropy data
-        - fidelity: comparison between original and partitioned
+        - observables: exact expectation values of the circuit's Pauli-string observables, if any
+        - comparison: fidelity and distribution distances (TVD, Hellinger, KL) between original and partitioned
+        - sharding: shards, workers, schedule steps and shard swaps of a sharded partitioned simulation
+        - noisy: counts, mean distribution and fidelity to the original state of the noisy trajectories, if the circuit has noise
+        - metrics: wall time, CPU time, peak RSS growth and array bytes of every stage
     """
-    def report_progress(stage: str, current: int, total: int, message: str = ""):
-        print(f"[{current}/{total}] {stage}: {message}", flush=True)
-        if progress_callback:
+    metrics = StageMetrics()
+    report_progress = partial(emit_progress, progress_callback=progress_callback, metrics=metrics)
+    streamed = set()
+    def report_section(section: str, data: Any, final: bool = True):
+        if final:
+            streamed.add(section)
+        if on_section:
             try:
-                progress_callback(stage, current, total, message)
-            except Exception as e:
+                on_section(section, data)
+            except Exception:
                 pass
     
     num_qubits = circuit_data['num_qubits']
     simulator = QuantumCircuitSimulator(num_qubits)
     errors = []
+    measured_qubits = get_measured_qubits(circuit_data)
+    observables = get_observables(circuit_data)
+    noise = get_noise_model(circuit_data)
+    if shard_qubits and not max_partition_size <= num_qubits - shard_qubits:
+        raise ValueError(f"2^{shard_qubits} shards of a {num_qubits}-qubit state leave fewer local qubits than partitions of size {max_partition_size} need")
+    num_outcomes = 1 << len(measured_qubits)
+    # independent streams for the original and partitioned sampling and the noisy trajectories, all fixed by the seed
+    seed_original, seed_partitioned, seed_noise = np.random.SeedSequence(seed).spawn(3)
+    rng_original, rng_partitioned = np.random.default_rng(seed_original), np.random.default_rng(seed_partitioned)
+
+    kept_qubits = sorted(set(q for q in (density_qubits if density_qubits is not None else measured_qubits) if 0 <= q < num_qubits))
+    density_note = None
+    if len(kept_qubits) > max_density_qubits:
+        density_note = f"density matrix limited to qubits {kept_qubits[:max_density_qubits]} of the requested {kept_qubits} (max {max_density_qubits})"
+        kept_qubits = kept_qubits[:max_density_qubits]
 
     # Calculate dynamic step count
-    total_steps = 7 + sum([compute_density_matrix, compute_entropy])
+    total_steps = 8 + sum([compute_density_matrix, compute_entropy, bool(observables), bool(noise)])
     step = 0
 
     # Build circuit with gate ID tracking
@@ -278,222 +1688,527 @@ def run_simulation(
     simulator.circuit = circuit
     simulator.parameters = parameters
 
-    # Simulate original circuit
-    step += 1
-    report_progress("simulating_original", step, total_steps, "Simulating original circuit...")
-    try:
-        state_original = run_with_timeout(
-            simulator.simulate_statevector,
-            args=(circuit, parameters),
-            timeout_seconds=simulation_timeout
-        )
-    except TimeoutError as e:
-        report_progress("simulating_original", step, total_steps, f"Skipping original circuit simulation - timed out after {simulation_timeout}s")
-        errors.append({'stage': 'simulating_original', 'error': str(e), 'timeout': True})
-        state_original = np.zeros((simulator.matrix_size, 1), dtype=np.complex128)
-        state_original[0] = 1.0 + 0j
-
-    step += 1
-    report_progress("calculating_probabilities", step, total_steps, "Calculating probabilities...")
-    try:
-        probs_original = run_with_timeout(
-            simulator.get_probabilities,
-            args=(state_original,),
-            timeout_seconds=simulation_timeout
-        )
-    except TimeoutError as e:
-        report_progress("calculating_probabilities", step, total_steps, f"Skipping probability calculation - timed out after {simulation_timeout}s")
-        errors.append({'stage': 'calculating_probabilities', 'error': str(e), 'timeout': True})
-        probs_original = np.zeros(simulator.matrix_size)
-
-    step += 1
-    report_progress("sampling_measurements", step, total_steps, f"Sampling {num_shots} measurements...")
-    try:
-        counts_original = run_with_timeout(
-            simulator.sample_measurements,
-            args=(state_original, num_shots),
-            timeout_seconds=simulation_timeout
-        )
-    except TimeoutError as e:
-        report_progress("sampling_measurements", step, total_steps, f"Skipping measurement sampling - timed out after {simulation_timeout}s")
-        errors.append({'stage': 'sampling_measurements', 'error': str(e), 'timeout': True})
-        counts_original = {}
+    # pre-flight estimate, downgrading optional stages before anything large is allocated
+    settings = {
+        'compute_density_matrix': compute_density_matrix,
+        'compute_entropy': compute_entropy,
+        'output_mode': output_mode,
+        'output_precision': output_precision,
+        'noise_workers': max(1, noise_workers or os.cpu_count() or 1)
+    }
+    sizes = {
+        'num_qubits': num_qubits,
+        'num_gates': len(circuit.get_Gates()),
+        'num_outcomes': num_outcomes,
+        'density_qubits': len(kept_qubits),
+        'num_observable_terms': sum(len(observable['terms']) for observable in observables),
+        'raw_arrays': raw_arrays,
+        'simulation_precision': simulation_precision,
+        'precision_check': precision_check,
+        'noise_trajectories': noise_trajectories if noise else 0
+    }
+    if memory_budget:
+        settings, downgrades, estimate = fit_memory_budget(memory_budget, **sizes, **settings)
+        for downgrade in downgrades:
+            errors.append({'stage': 'memory_budget', 'error': f"{downgrade} applied to fit the memory budget of {memory_budget / 2**30:.2f} GiB"})
+    else:
+        estimate, downgrades = estimate_resources(**sizes, **settings), []
+    compute_density_matrix = settings['compute_density_matrix']
+    compute_entropy = settings['compute_entropy']
+    output_mode = settings['output_mode']
+    output_precision = settings['output_precision']
+    noise_workers = settings['noise_workers']
+    resource_estimate = {
+        'peak_bytes': estimate['peak_bytes'],
+        'estimated_seconds': estimate['estimated_seconds'],
+        'memory_budget': memory_budget,
+        'downgrades': downgrades
+    }
+    check_precision = precision_check and simulation_precision != 'double'
+    total_steps = 8 + sum([compute_density_matrix, compute_entropy, bool(observables), bool(noise), check_precision])
+    report_progress("building_circuit", step, total_steps, f"Estimated peak memory {estimate['peak_bytes'] / 2**30:.2f} GiB, about {estimate['estimated_seconds']:.0f}s")
+    report_section('num_qubits', num_qubits)
+    report_section('num_shots', num_shots)
+    report_section('measured_qubits', measured_qubits)
+    report_section('resource_estimate', resource_estimate)
 
-    # partition circuit
-    step += 1
-    report_progress("partitioning", step, total_steps, f"Partitioning circuit (strategy: {strategy})...")
+    # statevectors and probabilities stay in shared memory, stages only exchange handles with the worker
+    with SharedArrayPool() as pool, StageWorker() as worker:
+        metrics.track(worker=worker, pool=pool)
 
-    # Create QASM file for qiskit/bqskit strategies
-    qasm_strategies = ["qiskit", "qiskit-fusion", "bqskit-Quick", "bqskit-Scan", "bqskit-Greedy", "bqskit-Cluster"]
-    qasm_file = None
-    if strategy in qasm_strategies:
-        fd, qasm_file = tempfile.mkstemp(suffix='.qasm', text=True)
-        try:
-            os.close(fd)
-            CircuitConverter.squander_to_qasm(circuit, parameters, qasm_file)
-        except Exception as e:
-            if qasm_file and os.path.exists(qasm_file):
-                os.unlink(qasm_file)
-            raise RuntimeError(f"Failed to create QASM file for {strategy}: {str(e)}")
+        # Simulate original circuit
+        step += 1
+        report_progress("simulating_original", step, total_steps, "Simulating original circuit...")
+        state_dtype = STATE_DTYPES[simulation_precision]
+        state_original_handle = pool.allocate((simulator.matrix_size, 1), state_dtype)
+        state_partitioned_handle = pool.allocate((simulator.matrix_size, 1), state_dtype)
+        probs_original_handle = pool.allocate((num_outcomes,), np.float64)
+        probs_partitioned_handle = pool.allocate((num_outcomes,), np.float64)
+        state_original = attach(state_original_handle)
+        state_partitioned = attach(state_partitioned_handle)
+        probs_original = attach(probs_original_handle)
+        probs_partitioned = attach(probs_partitioned_handle)
+        # the original outputs depend on the gates and parameters only, so runs changing partitioning options share them
+        original_fingerprint = None
+        original_failed = False
+        cached_original: Dict = {}
+        counts_key = json.dumps([measured_qubits, num_shots, seed]) if seed is not None else None
+        if original_cache_dir:
+            original_fingerprint = circuit_fingerprint(circuit, parameters, 'original', simulation_precision)
+            cached_original = load_original_outputs(original_cache_dir, original_fingerprint, state_original, probs_original, measured_qubits, counts_key)
+        if cached_original.get('state_vector'):
+            report_progress("simulating_original", step, total_steps, "Reusing the original circuit state from the cache")
+        else:
+            try:
+                worker.run(
+                    on_shared,
+                    args=(simulator.simulate_statevector, circuit, parameters),
+                    kwargs={'out': state_original_handle},
+                    timeout_seconds=simulation_timeout
+                )
+            except TimeoutError as e:
+                report_progress("simulating_original", step, total_steps, f"Skipping original circuit simulation - timed out after {simulation_timeout}s")
+                errors.append({'stage': 'simulating_original', 'error': str(e), 'timeout': True})
+                state_original.fill(0)
+                state_original[0] = 1.0 + 0j
+                original_failed = True
 
-    try:
-        partition_result = run_with_timeout(
-            simulator.partition_circuit,
-            args=(circuit, parameters, max_partition_size, strategy, qasm_file),
-            timeout_seconds=simulation_timeout
-        )
-        partitioned_circ = partition_result['partitioned_circuit']
-        partitioned_params = partition_result['partitioned_params']
-    except TimeoutError as e:
-        report_progress("partitioning", step, total_steps, f"Skipping circuit partitioning - timed out after {simulation_timeout}s")
-        errors.append({'stage': 'partitioning', 'error': str(e), 'timeout': True})
-        partition_result = {
-            'partitioned_circuit': circuit,
-            'partitioned_params': parameters,
-            'partition_info': {
-                'strategy': strategy,
-                'max_partition_size': max_partition_size,
-                'total_partitions': 0,
-                'partitions': []
-            }
+        # double precision spot-check while only the original state is resident
+        precision = {
+            'simulation': simulation_precision,
+            'backend': 'squander' if simulation_precision == 'double' or squander_single_precision() else 'numpy'
         }
-        partitioned_circ = circuit
-        partitioned_params = parameters
-    except Exception as e:
-        if qasm_file and os.path.exists(qasm_file):
-            os.unlink(qasm_file)
-        raise
-    finally:
-        if qasm_file and os.path.exists(qasm_file):
-            os.unlink(qasm_file)
+        if check_precision:
+            step += 1
+            report_progress("checking_precision", step, total_steps, "Comparing against a double precision simulation...")
+            try:
+                precision['check'] = cached_original.get('precision_check') or worker.run(
+                    on_shared,
+                    args=(simulator.precision_check, circuit, parameters, state_original_handle),
+                    timeout_seconds=simulation_timeout
+                )
+            except TimeoutError as e:
+                report_progress("checking_precision", step, total_steps, f"Skipping precision check - timed out after {simulation_timeout}s")
+                errors.append({'stage': 'checking_precision', 'error': str(e), 'timeout': True})
+        report_section('precision', precision)
 
-    # simulate partitioned circuit
-    step += 1
-    report_progress("simulating_partitioned", step, total_steps, "Simulating partitioned circuit...")
+        step += 1
+        report_progress("calculating_probabilities", step, total_steps, "Calculating probabilities...")
+        if not cached_original.get('probabilities'):
+            try:
+                worker.run(
+                    on_shared,
+                    args=(simulator.get_probabilities, state_original_handle),
+                    kwargs={'out': probs_original_handle, 'qubits': measured_qubits},
+                    timeout_seconds=simulation_timeout
+                )
+            except TimeoutError as e:
+                report_progress("calculating_probabilities", step, total_steps, f"Skipping probability calculation - timed out after {simulation_timeout}s")
+                errors.append({'stage': 'calculating_probabilities', 'error': str(e), 'timeout': True})
+                probs_original.fill(0)
+                original_failed = True
 
-    def simulate_partitioned_circuit():
-        state = simulator.simulate_statevector(partitioned_circ, partitioned_params)
-        probs = simulator.get_probabilities(state)
-        counts = simulator.sample_measurements(state, num_shots)
-        return state, probs, counts
+        step += 1
+        report_progress("sampling_measurements", step, total_steps, f"Sampling {num_shots} measurements...")
+        try:
+            counts_original = cached_original.get('counts') or worker.run(
+                on_shared,
+                args=(simulator.sample_counts, probs_original_handle, num_shots, rng_original),
+                timeout_seconds=simulation_timeout
+            )
+        except TimeoutError as e:
+            report_progress("sampling_measurements", step, total_steps, f"Skipping measurement sampling - timed out after {simulation_timeout}s")
+            errors.append({'stage': 'sampling_measurements', 'error': str(e), 'timeout': True})
+            counts_original = {}
+            original_failed = True
+        if original_fingerprint and not original_failed:
+            try:
+                store_original_outputs(
+                    original_cache_dir, original_fingerprint, state_original, probs_original, measured_qubits,
+                    counts_key, counts_original, precision.get('check'), original_cache_bytes
+                )
+            except OSError:
+                # the store only saves time, a full or read-only directory must not fail the run
+                pass
+        report_section('original', {'counts': counts_original}, final=False)
 
-    try:
-        state_partitioned, probs_partitioned, counts_partitioned = run_with_timeout(
-            simulate_partitioned_circuit,
-            timeout_seconds=simulation_timeout
-        )
-    except TimeoutError as e:
-        report_progress("simulating_partitioned", step, total_steps, f"Skipping partitioned circuit simulation - timed out after {simulation_timeout}s")
-        errors.append({'stage': 'simulating_partitioned', 'error': str(e), 'timeout': True})
-        state_partitioned = state_original.copy()
-        probs_partitioned = probs_original.copy()
-        counts_partitioned = counts_original.copy()
-
-    # calculate fidelity
-    step += 1
-    report_progress("calculating_fidelity", step, total_steps, "Calculating fidelity...")
-    try:
-        fidelity = run_with_timeout(
-            simulator.calculate_fidelity,
-            args=(state_original, state_partitioned),
-            timeout_seconds=simulation_timeout
-        )
-    except TimeoutError as e:
-        report_progress("calculating_fidelity", step, total_steps, f"Skipping fidelity calculation - timed out after {simulation_timeout}s")
-        errors.append({'stage': 'calculating_fidelity', 'error': str(e), 'timeout': True})
-        fidelity = 0.0
-
-    # density matrices
-    density_original = None
-    density_partitioned = None
-    if compute_density_matrix:
+        # partition circuit
         step += 1
-        report_progress("computing_density_matrix", step, total_steps, "Computing density matrices...")
+        report_progress("partitioning", step, total_steps, f"Partitioning circuit (strategy: {strategy})...")
 
-        def compute_density_matrices():
-            dens_orig = simulator.get_density_matrix(state_original)
-            dens_part = simulator.get_density_matrix(state_partitioned)
-            return dens_orig, dens_part
+        try:
+            partition_result = partition_in_worker(
+                worker, simulator, circuit, parameters, max_partition_size, strategy, simulation_timeout,
+                cache_dir=partition_cache_dir, cache_bytes=partition_cache_bytes
+            )
+        except TimeoutError as e:
+            report_progress("partitioning", step, total_steps, f"Skipping circuit partitioning - timed out after {simulation_timeout}s")
+            errors.append({'stage': 'partitioning', 'error': str(e), 'timeout': True})
+            partition_result = unpartitioned_result(circuit, parameters, max_partition_size, strategy)
+        partitioned_circ = partition_result['partitioned_circuit']
+        partitioned_params = partition_result['partitioned_params']
+        report_section('partition_info', partition_result['partition_info'])
 
+        # simulate partitioned circuit, one batch of partitions per worker call
+        step += 1
+        report_progress("simulating_partitioned", step, total_steps, "Simulating partitioned circuit...")
+        fingerprint = None
+        sharding = None
+        if checkpoint_every and not shard_qubits:
+            assignment = [partition['original_gate_indices'] for partition in partition_result['partition_info']['partitions']]
+            fingerprint = circuit_fingerprint(circuit, parameters, strategy, max_partition_size, simulation_precision, assignment)
+        def partition_progress(done: int, total: int):
+            report_progress("simulating_partitioned", step, total_steps, f"Simulated partition {done} of {total}")
         try:
-            density_original, density_partitioned = run_with_timeout(
-                compute_density_matrices,
+            resumed = 0
+            if shard_qubits:
+                sharding = simulate_partitions_sharded(
+                    simulator, partitioned_circ, partitioned_params, state_partitioned_handle, shard_qubits,
+                    num_workers=shard_workers,
+                    on_progress=partition_progress,
+                    timeout_seconds=simulation_timeout
+                )
+            else:
+                resumed = simulate_partitions_in_worker(
+                    worker, simulator, partitioned_circ, partitioned_params, state_partitioned_handle,
+                    on_progress=partition_progress,
+                    timeout_seconds=simulation_timeout,
+                    checkpoint_every=checkpoint_every,
+                    checkpoint_dir=checkpoint_dir,
+                    fingerprint=fingerprint
+                )
+            if resumed:
+                errors.append({'stage': 'simulating_partitioned', 'error': f"resumed from the checkpoint after partition {resumed}", 'resumed': resumed})
+            counts_partitioned = worker.run(
+                on_shared,
+                args=(simulator.sample_measurements, state_partitioned_handle, num_shots, rng_partitioned, measured_qubits),
+                kwargs={'probs_out': probs_partitioned_handle},
                 timeout_seconds=simulation_timeout
             )
         except TimeoutError as e:
-            report_progress("computing_density_matrix", step, total_steps, f"Skipping density matrix computation - timed out after {simulation_timeout}s")
-            errors.append({'stage': 'density_matrix', 'error': str(e), 'timeout': True})
-        except Exception as e:
-            errors.append({'stage': 'density_matrix', 'error': str(e)})
-    
-    # entropy analysis
-    entropy_original = []
-    entropy_partitioned = []
-    if compute_entropy:
+            report_progress("simulating_partitioned", step, total_steps, f"Skipping partitioned circuit simulation - timed out after {simulation_timeout}s")
+            error = {'stage': 'simulating_partitioned', 'error': str(e), 'timeout': True}
+            if fingerprint:
+                # rerunning the same job picks the simulation up at the last checkpoint
+                error['checkpoint'] = fingerprint
+            errors.append(error)
+            state_partitioned[:] = state_original
+            probs_partitioned[:] = probs_original
+            counts_partitioned = counts_original.copy()
+        report_section('partitioned', {'counts': counts_partitioned}, final=False)
+        if sharding is not None:
+            report_section('sharding', sharding)
+
+        # calculate fidelity
         step += 1
-        report_progress("analyzing_entropy", step, total_steps, "Analyzing entanglement entropy...")
+        report_progress("calculating_fidelity", step, total_steps, "Calculating fidelity...")
         try:
-            entropy_original = run_with_timeout(
-                simulator.analyze_entanglement_scaling,
-                args=(circuit, parameters),
+            fidelity = worker.run(
+                on_shared,
+                args=(simulator.calculate_fidelity, state_original_handle, state_partitioned_handle),
                 timeout_seconds=simulation_timeout
             )
         except TimeoutError as e:
-            report_progress("analyzing_entropy", step, total_steps, f"Skipping entropy analysis (original) - timed out after {simulation_timeout}s")
-            errors.append({'stage': 'entropy_original', 'error': str(e), 'timeout': True})
-        except Exception as e:
-            errors.append({'stage': 'entropy_original', 'error': str(e)})
-
+            report_progress("calculating_fidelity", step, total_steps, f"Skipping fidelity calculation - timed out after {simulation_timeout}s")
+            errors.append({'stage': 'calculating_fidelity', 'error': str(e), 'timeout': True})
+            fidelity = 0.0
         try:
-            entropy_partitioned = run_with_timeout(
-                simulator.analyze_entanglement_scaling,
-                args=(partitioned_circ, partitioned_params),
+            distances = worker.run(
+                on_shared,
+                args=(simulator.compare_distributions, probs_original_handle, probs_partitioned_handle),
                 timeout_seconds=simulation_timeout
             )
         except TimeoutError as e:
-            report_progress("analyzing_entropy", step, total_steps, f"Skipping entropy analysis (partitioned) - timed out after {simulation_timeout}s")
-            errors.append({'stage': 'entropy_partitioned', 'error': str(e), 'timeout': True})
-        except Exception as e:
-            errors.append({'stage': 'entropy_partitioned', 'error': str(e)})
+            errors.append({'stage': 'comparing_distributions', 'error': str(e), 'timeout': True})
+            distances = {}
+        report_section('comparison', {'fidelity': fidelity, **distances}, final=False)
 
-    # finalizing results
-    step += 1
-    report_progress("finalizing", step, total_steps, "Finalizing results...")
+        # reduced density matrices, 4^k entries for k kept qubits
+        density_original = None
+        density_partitioned = None
+        if compute_density_matrix:
+            step += 1
+            report_progress("computing_density_matrix", step, total_steps, "Computing density matrices...")
+            if density_note:
+                errors.append({'stage': 'density_matrix', 'error': density_note})
+            density_size = 1 << len(kept_qubits)
+            try:
+                for state_handle, density_key in ((state_original_handle, 'original'), (state_partitioned_handle, 'partitioned')):
+                    density_handle = pool.allocate((density_size, density_size), DENSITY_DTYPE)
+                    worker.run(
+                        on_shared,
+                        args=(simulator.get_density_matrix, state_handle),
+                        kwargs={'out': density_handle, 'qubits': kept_qubits},
+                        timeout_seconds=simulation_timeout
+                    )
+                    if density_key == 'original':
+                        density_original = attach(density_handle)
+                    else:
+                        density_partitioned = attach(density_handle)
+            except TimeoutError as e:
+                report_progress("computing_density_matrix", step, total_steps, f"Skipping density matrix computation - timed out after {simulation_timeout}s")
+                errors.append({'stage': 'density_matrix', 'error': str(e), 'timeout': True})
+                density_original = density_partitioned = None
+            except Exception as e:
+                errors.append({'stage': 'density_matrix', 'error': str(e)})
+                density_original = density_partitioned = None
+
+        # entropy analysis
+        entropy_original = []
+        entropy_partitioned = []
+        if compute_entropy:
+            step += 1
+            report_progress("analyzing_entropy", step, total_steps, "Analyzing entanglement entropy...")
+            try:
+                entropy_original = worker.run(
+                    on_shared,
+                    args=(simulator.analyze_entanglement_scaling, state_original_handle),
+                    timeout_seconds=simulation_timeout
+                )
+            except TimeoutError as e:
+                report_progress("analyzing_entropy", step, total_steps, f"Skipping entropy analysis (original) - timed out after {simulation_timeout}s")
+                errors.append({'stage': 'entropy_original', 'error': str(e), 'timeout': True})
+            except Exception as e:
+                errors.append({'stage': 'entropy_original', 'error': str(e)})
 
-    original_data = {'state_vector': state_original, 'probabilities': probs_original, 'counts': counts_original}
-    if density_original is not None:
-        original_data['density_matrix'] = {'real': density_original.real, 'imag': density_original.imag}
-    if entropy_original:
-        original_data['entropy_scaling'] = entropy_original
+            try:
+                entropy_partitioned = worker.run(
+                    on_shared,
+                    args=(simulator.analyze_entanglement_scaling, state_partitioned_handle),
+                    timeout_seconds=simulation_timeout
+                )
+            except TimeoutError as e:
+                report_progress("analyzing_entropy", step, total_steps, f"Skipping entropy analysis (partitioned) - timed out after {simulation_timeout}s")
+                errors.append({'stage': 'entropy_partitioned', 'error': str(e), 'timeout': True})
+            except Exception as e:
+                errors.append({'stage': 'entropy_partitioned', 'error': str(e)})
 
-    partitioned_data = {'state_vector': state_partitioned, 'probabilities': probs_partitioned, 'counts': counts_partitioned}
-    if density_partitioned is not None:
-        partitioned_data['density_matrix'] = {'real': density_partitioned.real, 'imag': density_partitioned.imag}
-    if entropy_partitioned:
-        partitioned_data['entropy_scaling'] = entropy_partitioned
+        expectations = {}
+        if observables:
+            step += 1
+            report_progress("calculating_observables", step, total_steps, f"Calculating {len(observables)} observable expectation values...")
+            for label, handle in (('original', state_original_handle), ('partitioned', state_partitioned_handle)):
+                try:
+                    expectations[label] = worker.run(
+                        on_shared,
+                        args=(simulator.expectation_values, handle, observables),
+                        timeout_seconds=simulation_timeout
+                    )
+                except TimeoutError as e:
+                    report_progress("calculating_observables", step, total_steps, f"Skipping observables ({label}) - timed out after {simulation_timeout}s")
+                    errors.append({'stage': f'observables_{label}', 'error': str(e), 'timeout': True})
 
-    results = {
-        'timestamp': int(time.time() * 1000),
-        'num_qubits': num_qubits,
-        'num_shots': num_shots,
-        'errors': errors,
-        'partition_info': partition_result['partition_info'],
-        'original': original_data,
-        'partitioned': partitioned_data,
-        'comparison': {
-            'fidelity': fidelity,
-            'probability_difference': np.abs(probs_original - probs_partitioned).tolist(),
-            'max_difference': float(np.max(np.abs(probs_original - probs_partitioned)))
+        # noisy trajectories, each process simulating whole batches of them against the original state
+        noisy = None
+        if noise:
+            step += 1
+            report_progress("simulating_noise", step, total_steps, f"Simulating {noise_trajectories} noisy trajectories...")
+            noisy, noise_errors = simulate_noise(
+                simulator, circuit, parameters, noise, noise_trajectories, num_shots, measured_qubits,
+                reference=state_original_handle,
+                seed_sequence=seed_noise,
+                timeout_seconds=simulation_timeout,
+                max_workers=noise_workers
+            )
+            errors.extend(noise_errors)
+            if noisy is not None:
+                noisy['comparison'] = simulator.compare_distributions(probs_original, noisy['probabilities'])
+
+        # finalizing results
+        step += 1
+        report_progress("finalizing", step, total_steps, "Finalizing results...")
+
+        comparison = {'fidelity': fidelity, **distances}
+        if output_mode == 'sparse':
+            try:
+                sparse_original, sparse_partitioned = worker.run(
+                    on_shared,
+                    args=(simulator.sparsify, probs_original_handle, probs_partitioned_handle, top_k, probability_threshold),
+                    timeout_seconds=simulation_timeout
+                )
+            except TimeoutError as e:
+                errors.append({'stage': 'sparsifying', 'error': str(e), 'timeout': True})
+                sparse_original = sparse_partitioned = None
+            original_data = {'sparse_probabilities': sparse_original, 'counts': counts_original}
+            partitioned_data = {'sparse_probabilities': sparse_partitioned, 'counts': counts_partitioned}
+        else:
+            comparison['probability_difference'] = np.abs(probs_original - probs_partitioned)
+            if output_precision == 'single':
+                state_original, state_partitioned = state_original.astype(np.complex64), state_partitioned.astype(np.complex64)
+                probs_original, probs_partitioned = probs_original.astype(np.float32), probs_partitioned.astype(np.float32)
+                comparison['probability_difference'] = comparison['probability_difference'].astype(np.float32)
+            original_data = {'state_vector': state_original, 'probabilities': probs_original, 'counts': counts_original}
+            partitioned_data = {'state_vector': state_partitioned, 'probabilities': probs_partitioned, 'counts': counts_partitioned}
+
+        if cached_original:
+            original_data['cached'] = sorted(cached_original)
+        if density_original is not None:
+            original_data['density_matrix'] = {'real': density_original.real, 'imag': density_original.imag, 'qubits': kept_qubits}
+        if entropy_original:
+            original_data['entropy_scaling'] = entropy_original
+        if 'original' in expectations:
+            original_data['observables'] = expectations['original']
+
+        if density_partitioned is not None:
+            partitioned_data['density_matrix'] = {'real': density_partitioned.real, 'imag': density_partitioned.imag, 'qubits': kept_qubits}
+        if entropy_partitioned:
+            partitioned_data['entropy_scaling'] = entropy_partitioned
+        if 'partitioned' in expectations:
+            partitioned_data['observables'] = expectations['partitioned']
+
+        if noisy is not None:
+            if output_mode == 'sparse':
+                probs_noisy = noisy.pop('probabilities')
+                noisy['sparse_probabilities'] = simulator.sparse_probabilities(probs_noisy, simulator.select_outcomes([probs_noisy], top_k, probability_threshold))
+            elif output_precision == 'single':
+                noisy['probabilities'] = noisy['probabilities'].astype(np.float32)
+
+        results = {
+            'timestamp': int(time.time() * 1000),
+            'num_qubits': num_qubits,
+            'num_shots': num_shots,
+            'measured_qubits': measured_qubits,
+            'errors': errors,
+            'partition_info': partition_result['partition_info'],
+            'original': original_data,
+            'partitioned': partitioned_data,
+            'comparison': comparison,
+            'precision': precision,
+            'resource_estimate': resource_estimate
         }
-    }
+        if sharding is not None:
+            results['sharding'] = sharding
+        if noisy is not None:
+            results['noisy'] = noisy
+        # sections not sent in full yet go out while the shared blocks are still mapped
+        for section, data in results.items():
+            if section not in streamed:
+                report_section(section, data)
 
-    return serialize_results(results)
+        # serialise or copy out while the shared blocks are still mapped
+        if raw_arrays:
+            results = copy_arrays(results)
+            metrics.add_array_bytes(array_bytes(results))
+        else:
+            results = serialize_results(results)
 
+    metrics.finish()
+    results['metrics'] = metrics.stages
+    report_section('metrics', metrics.stages)
+    return results
 
-def main():
+
+def run_parameter_sweep(
+    circuit_data: Dict,
+    parameter_sets: List[List[float]],
+    max_partition_size: int = 4,
+    strategy: str = 'kahn',
+    num_shots: int = 10000,
+    progress_callback: Optional[Callable[[str, int, int, str], None]] = None,
+    simulation_timeout: Optional[int] = None,
+    seed: Optional[int] = None,
+    on_record: Optional[Callable[[Dict], None]] = None,
+    partition_cache_dir: Optional[str] = None,
+    partition_cache_bytes: int = PARTITION_CACHE_BYTES
+) -> List[Dict]:
+    """
+        simulate one circuit structure for many parameter sets, building and partitioning it once
+
+        Args:
+            circuit_data: Circuit data in JSON format, its own parameters are used for partitioning
+            parameter_sets: Parameter vectors in the circuit's parameter order (gate order, as built by json_to_squander)
+            simulation_timeout: Per-point timeout in seconds
+            on_record: Optional callback receiving each record as soon as it is ready
+            partition_cache_dir: Directory caching partition assignments (None: no cache), see run_simulation
+
+        Returns the records, in order: a 'sweep' header with the partition info, one 'point' per
+        parameter set (counts and per-qubit <Z> of the measured qubits, observable expectation
+        values, or its error) and a 'summary'
+    """
+    metrics = StageMetrics()
+    report_progress = partial(emit_progress, progress_callback=progress_callback, metrics=metrics)
+
+    records = []
+    def emit(record: Dict):
+        record = serialize_results(record)
+        records.append(record)
+        if on_record:
+            on_record(record)
+
+    start_time = time.time()
+    num_qubits = circuit_data['num_qubits']
+    simulator = QuantumCircuitSimulator(num_qubits)
+    errors = []
+    measured_qubits = get_measured_qubits(circuit_data)
+    observables = get_observables(circuit_data)
+    total_steps = 2 + len(parameter_sets)
+    point_rngs = [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(len(parameter_sets))]
+
+    report_progress("building_circuit", 1, total_steps, "Building quantum circuit...")
+    circuit, parameters, _ = CircuitConverter.json_to_squander(circuit_data, gate_ids=simulator.gate_ids)
+    simulator.circuit = circuit
+    simulator.parameters = parameters
+
+    with SharedArrayPool() as pool, StageWorker() as worker:
+        metrics.track(worker=worker, pool=pool)
+        report_progress("partitioning", 2, total_steps, f"Partitioning circuit (strategy: {strategy})...")
+        try:
+            partition_result = partition_in_worker(
+                worker, simulator, circuit, parameters, max_partition_size, strategy, simulation_timeout,
+                cache_dir=partition_cache_dir, cache_bytes=partition_cache_bytes
+            )
+        except TimeoutError as e:
+            errors.append({'stage': 'partitioning', 'error': str(e), 'timeout': True})
+            partition_result = unpartitioned_result(circuit, parameters, max_partition_size, strategy)
+        sweep_circuit = partition_result['partitioned_circuit']
+        parameter_order = simulator.partitioned_parameter_order(circuit, partition_result['partition_info'])
+        if not np.array_equal(parameters[parameter_order], partition_result['partitioned_params']):
+            # the partitioner rewrote the parameters, so the original circuit is swept instead
+            errors.append({'stage': 'partitioning', 'error': "partitioned parameter order could not be reconstructed, sweeping the original circuit"})
+            sweep_circuit = circuit
+            parameter_order = np.arange(parameters.size)
+        emit({
+            'type': 'sweep',
+            'num_qubits': num_qubits,
+            'num_points': len(parameter_sets),
+            'num_shots': num_shots,
+            'measured_qubits': measured_qubits,
+            'partition_info': partition_result['partition_info'],
+            'errors': list(errors)
+        })
+
+        state_handle = pool.allocate((simulator.matrix_size, 1), np.complex128)
+        probs_handle = pool.allocate((1 << len(measured_qubits),), np.float64)
+        for index, point_parameters in enumerate(parameter_sets):
+            report_progress("simulating_point", 3 + index, total_steps, f"Simulating parameter set {index + 1}/{len(parameter_sets)}...")
+            point_parameters = np.asarray(point_parameters, dtype=np.float64)
+            if point_parameters.size != parameters.size:
+                errors.append({'stage': f'point_{index}', 'error': f"expected {parameters.size} parameters, got {point_parameters.size}"})
+                emit({'type': 'point', 'index': index, 'error': errors[-1]['error']})
+                continue
+            try:
+                point = worker.run(
+                    on_shared,
+                    args=(simulator.sweep_point, sweep_circuit, point_parameters[parameter_order], num_shots),
+                    kwargs={'state_out': state_handle, 'probs_out': probs_handle, 'rng': point_rngs[index], 'qubits': measured_qubits, 'observables': observables},
+                    timeout_seconds=simulation_timeout
+                )
+            except TimeoutError as e:
+                errors.append({'stage': f'point_{index}', 'error': str(e), 'timeout': True})
+                emit({'type': 'point', 'index': index, 'error': str(e), 'timeout': True})
+                continue
+            emit({'type': 'point', 'index': index, **point})
+
+    metrics.finish()
+    emit({'type': 'summary', 'num_points': len(parameter_sets), 'errors': errors, 'elapsed_seconds': time.time() - start_time, 'metrics': metrics.stages})
+    return records
+
+
+def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description='SQUANDER Quantum Circuit Simulator')
-    parser.add_argument('input', help='input circuit JSON file')
-    parser.add_argument('--output', '-o', default='simulation_results.json', help='output results JSON file')
+    parser.add_argument('input', nargs='?', help='input circuit JSON file')
+    parser.add_argument('--output', '-o', default='simulation_results.json', help='output results file')
+    parser.add_argument('--format', '-f', default='json', choices=['json', 'npz'], help='json (nested lists) or npz (binary arrays with a JSON manifest, default: json)')
     parser.add_argument('--partition-size', '-p', type=int, default=4, help='maximum partition size (default: 4)')
     parser.add_argument(
         '--strategy', '-s',
@@ -505,35 +2220,206 @@ def main():
     parser.add_argument('--timeout', '-t', type=int, default=None, help='simulation timeout in seconds (skips entropy analysis if set, default: None)')
     parser.add_argument('--skip-density-matrix', action='store_true', help='skip density matrix computation')
     parser.add_argument('--skip-entropy', action='store_true', help='skip entropy analysis')
+    parser.add_argument('--density-qubits', type=lambda value: [int(q) for q in value.split(',') if q], default=None, help='comma-separated qubits of the reduced density matrices (default: measured qubits)')
+    parser.add_argument('--max-density-qubits', type=int, default=MAX_DENSITY_QUBITS, help=f'largest density matrix in qubits (default: {MAX_DENSITY_QUBITS})')
+    parser.add_argument('--output-mode', default='dense', choices=['dense', 'sparse'], help='dense vectors or sparse top-k probabilities (default: dense)')
+    parser.add_argument('--top-k', type=int, default=None, help='sparse mode: keep the k most probable outcomes (default: all)')
+    parser.add_argument('--probability-threshold', type=float, default=0.0, help='sparse mode: keep outcomes above this probability (default: 0, i.e. nonzero)')
+    parser.add_argument('--output-precision', default='double', choices=['double', 'single'], help='precision of returned state vectors and probabilities (default: double)')
+    parser.add_argument('--memory-budget', default=None, help="peak memory budget in GiB, or 'auto' for the available memory; optional stages are downgraded, and fewer strategies compared at once, to fit (default: no budget)")
+    parser.add_argument('--precision', default='double', choices=['double', 'single'], help='state vector precision of the simulation, single halves its memory (default: double)')
+    parser.add_argument('--precision-check', action='store_true', help='single precision: spot-check fidelity against a second, double precision simulation of the original circuit (default: off)')
+    parser.add_argument('--checkpoint-every', type=int, default=0, help='save the partitioned simulation every N partitions, a rerun of the same job resumes from it (default: 0, off)')
+    parser.add_argument('--checkpoint-dir', default=CHECKPOINT_DIR, help=f'directory of the partitioned simulation checkpoints (default: {CHECKPOINT_DIR})')
+    parser.add_argument('--partition-cache-dir', default=PARTITION_CACHE_DIR, help=f'directory caching partition assignments of earlier runs (default: {PARTITION_CACHE_DIR})')
+    parser.add_argument('--partition-cache-size', type=float, default=PARTITION_CACHE_BYTES / 2**20, help=f'partition cache size in MiB, 0 disables it (default: {PARTITION_CACHE_BYTES >> 20})')
+    parser.add_argument('--original-cache-dir', default=ORIGINAL_CACHE_DIR, help=f'directory storing original circuit states, probabilities and seeded counts for runs that only change partitioning options (default: {ORIGINAL_CACHE_DIR})')
+    parser.add_argument('--original-cache-size', type=float, default=ORIGINAL_CACHE_BYTES / 2**20, help=f'original output store size in MiB, 0 disables it (default: {ORIGINAL_CACHE_BYTES >> 20})')
+    parser.add_argument('--trajectories', type=int, default=NOISE_TRAJECTORIES, help=f'Monte-Carlo trajectories of circuits with a noise section (default: {NOISE_TRAJECTORIES})')
+    parser.add_argument('--noise-workers', type=int, default=None, help='processes running noisy trajectories at once (default: one per CPU, fewer under --memory-budget)')
+    parser.add_argument('--shard-qubits', type=int, default=0, help='split the partitioned simulation into 2^K state shards across processes, swapping qubits between shards as partitions need them (default: 0, off)')
+    parser.add_argument('--shard-workers', type=int, default=None, help='processes evolving the shards (default: one per CPU)')
+    parser.add_argument('--stream', default=None, help='also append each result section to this NDJSON file as soon as it is ready, announced by "[result] <section>" lines (default: off)')
+    parser.add_argument('--stream-arrays', action='store_true', help='include state vectors, probabilities and density matrices in the --stream file, not only in --output')
+    parser.add_argument('--sweep', default=None, help='JSON file with a list of parameter vectors: run a parameter sweep and write NDJSON records to --output')
+    parser.add_argument('--compare-strategies', type=lambda value: [s for s in value.split(',') if s], default=None, help='comma-separated strategies to compare side by side instead of running one simulation')
+    parser.add_argument('--compare-workers', type=int, default=None, help='strategies simulated at once in comparison mode (default: one per CPU, fewer under --memory-budget)')
+    parser.add_argument('--seed', type=int, default=None, help='seed for reproducible measurement sampling (default: None)')
+    parser.add_argument('--serve', action='store_true', help='stay resident and accept jobs as JSON-RPC requests instead of running one job')
+    parser.add_argument('--socket', default=None, help='server mode: Unix socket to listen on (default: stdin/stdout)')
+    parser.add_argument('--max-jobs', type=int, default=1, help='server mode: jobs run at once (default: 1)')
+    parser.add_argument('--job-timeout', type=float, default=None, help='server mode: default per-job timeout in seconds (default: None)')
+    return parser
 
-    args = parser.parse_args()
+def stream_section(stream: ResultStreamWriter, section: str, data: Any):
+    """append a result section to the stream and announce it on stdout for the reader tailing the file"""
+    stream.write_section(section, data)
+    print(f"{STREAM_MARKER} {section}", flush=True)
 
+def run_job(args: argparse.Namespace) -> Dict:
+    """run the job described by parsed command line arguments, returning a short summary of it"""
     # load circuit data
     with open(args.input, 'r') as f:
         circuit_data = json.load(f)
 
     print(f"Running simulation for {circuit_data['num_qubits']}-qubit circuit...")
     print(f"Partition strategy: {args.strategy}, max size: {args.partition_size}")
+    partition_cache = {
+        'partition_cache_dir': args.partition_cache_dir if args.partition_cache_size > 0 else None,
+        'partition_cache_bytes': int(args.partition_cache_size * 2**20)
+    }
 
-    # run simulation
-    results = run_simulation(
-        circuit_data,
-        max_partition_size=args.partition_size,
-        strategy=args.strategy,
-        num_shots=args.shots,
-        simulation_timeout=args.timeout,
-        compute_density_matrix=not args.skip_density_matrix,
-        compute_entropy=not args.skip_entropy
-    )
-    
-    # save results
-    with open(args.output, 'w') as f:
-        json.dump(results, f, indent=2)
+    if args.memory_budget == 'auto':
+        memory_budget = available_memory()
+    else:
+        memory_budget = int(float(args.memory_budget) * 2**30) if args.memory_budget else None
+
+    if args.compare_strategies:
+        comparison = run_strategy_comparison(
+            circuit_data,
+            args.compare_strategies,
+            max_partition_size=args.partition_size,
+            simulation_timeout=args.timeout,
+            max_workers=args.compare_workers,
+            memory_budget=memory_budget,
+            **partition_cache
+        )
+        with open(args.output, 'w') as f:
+            json.dump(comparison, f, indent=2)
+        print("\nStrategy comparison complete!")
+        print(f"Results saved to: {args.output}")
+        for row in comparison['strategies']:
+            if 'error' in row:
+                print(f"{row['strategy']:>16}: {'timed out' if row.get('timeout') else 'failed'} - {row['error']}")
+            else:
+                print(f"{row['strategy']:>16}: {row['total_partitions']} partitions, fidelity {row['fidelity']:.10f}, {row['wall_seconds']:.2f}s")
+        return {'mode': 'comparison', 'output': args.output, 'strategies': len(comparison['strategies'])}
+
+    if args.sweep:
+        with open(args.sweep, 'r') as f:
+            parameter_sets = json.load(f)
+        if isinstance(parameter_sets, dict):
+            parameter_sets = parameter_sets['parameter_sets']
+        # one JSON record per line, flushed as soon as each point finishes
+        with open(args.output, 'w') as out:
+            def write_record(record: Dict):
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+            records = run_parameter_sweep(
+                circuit_data,
+                parameter_sets,
+                max_partition_size=args.partition_size,
+                strategy=args.strategy,
+                num_shots=args.shots,
+                simulation_timeout=args.timeout,
+                seed=args.seed,
+                on_record=write_record,
+                **partition_cache
+            )
+        print("\nParameter sweep complete!")
+        print(f"Results saved to: {args.output}")
+        print(f"Points: {len(parameter_sets)}, errors: {len(records[-1]['errors'])}")
+        return {'mode': 'sweep', 'output': args.output, 'points': len(parameter_sets), 'errors': len(records[-1]['errors'])}
+
+    # run simulation, streaming sections while it runs; a failed run leaves the stream without its complete record
+    with ExitStack() as stack:
+        if args.stream:
+            stream = stack.enter_context(ResultStreamWriter(args.stream, include_arrays=args.stream_arrays))
+            on_section = partial(stream_section, stream)
+        else:
+            on_section = None
+        results = run_simulation(
+            circuit_data,
+            max_partition_size=args.partition_size,
+            strategy=args.strategy,
+            num_shots=args.shots,
+            simulation_timeout=args.timeout,
+            compute_density_matrix=not args.skip_density_matrix,
+            compute_entropy=not args.skip_entropy,
+            seed=args.seed,
+            density_qubits=args.density_qubits,
+            max_density_qubits=args.max_density_qubits,
+            raw_arrays=args.format == 'npz',
+            output_mode=args.output_mode,
+            top_k=args.top_k,
+            probability_threshold=args.probability_threshold,
+            output_precision=args.output_precision,
+            memory_budget=memory_budget,
+            simulation_precision=args.precision,
+            precision_check=args.precision_check,
+            checkpoint_every=args.checkpoint_every,
+            checkpoint_dir=args.checkpoint_dir,
+            noise_trajectories=args.trajectories,
+            noise_workers=args.noise_workers,
+            shard_qubits=args.shard_qubits,
+            shard_workers=args.shard_workers,
+            original_cache_dir=args.original_cache_dir if args.original_cache_size > 0 else None,
+            original_cache_bytes=int(args.original_cache_size * 2**20),
+            on_section=on_section,
+            **partition_cache
+        )
+
+        # save results while the stream is open, its last metrics section then includes the write
+        metrics = StageMetrics()
+        metrics.enter("writing_results")
+        if args.format == 'npz':
+            write_result_archive(results, args.output)
+        else:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+        metrics.finish()
+        if on_section:
+            on_section('metrics', list(results.get('metrics', [])) + metrics.stages)
     
-    print(f"\nSimulation complete!")
+    print("\nSimulation complete!")
     print(f"Results saved to: {args.output}")
     print(f"Fidelity: {results['comparison']['fidelity']:.10f}")
-    print(f"Total partitions: {results['partition_info']['total_partitions']}")
+    print(f"Total partitions: {results['partition_info']['total_partitions']}{' (from the partition cache)' if results['partition_info'].get('cached') else ''}")
+    return {
+        'mode': 'simulation',
+        'output': args.output,
+        'fidelity': float(results['comparison']['fidelity']),
+        'total_partitions': results['partition_info']['total_partitions']
+    }
+
+def simulate_job(params: Dict) -> Dict:
+    """
+    server job: params['argv'] holds the simulate.py arguments, run from params['cwd'] when given
+    executes in a forked child of the server, so changing directory does not leak into other jobs
+    """
+    if params.get('cwd'):
+        os.chdir(params['cwd'])
+    try:
+        args = build_parser().parse_args([str(arg) for arg in params.get('argv', [])])
+    except SystemExit:
+        raise ValueError(f"invalid simulate.py arguments: {params.get('argv')}")
+    if args.serve or not args.input:
+        raise ValueError("a job needs an input circuit and cannot start another server")
+    return run_job(args)
+
+def serve(args: argparse.Namespace):
+    """keep the simulator resident, serving simulate jobs over stdin/stdout or a Unix socket"""
+    from server import SimulationServer, preload
+    server = SimulationServer(
+        {'simulate': simulate_job},
+        job_timeout=args.job_timeout,
+        max_jobs=args.max_jobs,
+        preloaded=preload(PRELOAD_MODULES)
+    )
+    if args.socket:
+        server.serve_socket(args.socket)
+    else:
+        server.serve_stdio()
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.serve:
+        serve(args)
+    elif not args.input:
+        parser.error("the following arguments are required: input")
+    else:
+        run_job(args)
 
 if __name__ == "__main__":
     main()
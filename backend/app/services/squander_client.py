@@ -7,6 +7,8 @@ from concurrent.futures import ThreadPoolExecutor
 import asyncio
 import paramiko
 from app.core.config import settings
+from app.services.result_format import STREAM_MARKER, parse_stream_records, read_result_archive, to_json_compatible
+from app.services.server import EXIT_UNAVAILABLE as SIMULATION_SERVER_UNAVAILABLE
 
 logger = logging.getLogger(__name__)
 
@@ -305,6 +307,17 @@ class SquanderClient:
                     break
         raise SquanderExecutionError(f"Download failed: {last_error}") from last_error
 
+    async def read_file_from(self, remote_path: str, offset: int) -> bytes:
+        """read a remote file from offset to its current end, for files still being appended to"""
+        if not self.is_connected:
+            raise SSHConnectionError("Not connected")
+        def _read():
+            with self.sftp_client.open(remote_path, "rb") as f:
+                f.seek(offset)
+                return f.read()
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(_io_pool, _read)
+
     async def run_partition(
         self,
         job_id: str,
@@ -314,11 +327,13 @@ class SquanderClient:
         options: Dict[str, Any],
         strategy: str = "kahn",
         circuit_name: Optional[str] = None,
+        observables: Optional[list] = None,
+        noise: Optional[dict] = None,
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """Execute circuit partitioning on remote SQUANDER server"""
         remote_job_dir = f"/tmp/squander_jobs/{job_id}"
         local_circuit_file = f"/tmp/{job_id}_input.json"
-        local_result_file = f"/tmp/{job_id}_output.json"
+        local_result_file = f"/tmp/{job_id}_output.npz"
         
         try:
             yield {"type": "phase", "phase": "preparing", "message": "Preparing job...", "progress": 2}
@@ -335,6 +350,10 @@ class SquanderClient:
                 "options": options,
                 "strategy": strategy,
             }
+            if observables:
+                circuit_data["observables"] = observables
+            if noise:
+                circuit_data["noise"] = noise
 
             # Write and upload circuit file
             Path(local_circuit_file).write_text(json.dumps(circuit_data, indent=2))
@@ -346,6 +365,11 @@ class SquanderClient:
             modules_to_upload = [
                 ("convert.py", Path(__file__).parent / "convert.py"),
                 ("simulate.py", Path(__file__).parent / "simulate.py"),
+                ("worker.py", Path(__file__).parent / "worker.py"),
+                ("result_format.py", Path(__file__).parent / "result_format.py"),
+                ("metrics.py", Path(__file__).parent / "metrics.py"),
+                ("server.py", Path(__file__).parent / "server.py"),
+                ("sharding.py", Path(__file__).parent / "sharding.py"),
             ]
             for module_name, module_path in modules_to_upload:
                 if module_path.exists():
@@ -358,38 +382,116 @@ class SquanderClient:
             simulation_timeout = options.get("simulation_timeout")
             compute_density_matrix = options.get("compute_density_matrix", False)
             compute_entropy = options.get("compute_entropy", False)
+            seed = options.get("seed")
+            density_qubits = options.get("density_qubits")
+            max_density_qubits = options.get("max_density_qubits")
+            output_mode = options.get("output_mode")
+            top_k = options.get("top_k")
+            probability_threshold = options.get("probability_threshold")
+            output_precision = options.get("output_precision")
+            memory_budget = options.get("memory_budget")
+            simulation_precision = options.get("simulation_precision")
+            precision_check = options.get("precision_check", False)
+            checkpoint_every = options.get("checkpoint_every")
+            noise_trajectories = options.get("noise_trajectories")
+            shard_qubits = options.get("shard_qubits")
+            stream_results = options.get("stream_results", True)
 
             logger.info(f"[run_partition] Received simulation_timeout: {simulation_timeout} (type: {type(simulation_timeout)})")
 
-            partition_cmd = (
-                f"cd {remote_job_dir} && "
-                f"python3 -u simulate.py circuit.json "
+            simulate_args = (
+                f"circuit.json "
                 f"--partition-size {max_partition_size} "
                 f"--strategy {strategy} "
-                f"--output result.json"
+                f"--format npz "
+                f"--output result.npz"
             )
 
             # Add timeout parameter if provided
             if simulation_timeout and simulation_timeout > 0:
-                partition_cmd += f" --timeout {simulation_timeout}"
-                logger.info(f"[run_partition] Command with timeout: {partition_cmd}")
+                simulate_args += f" --timeout {simulation_timeout}"
+                logger.info(f"[run_partition] Command with timeout: {simulate_args}")
 
             # Add simulation options
             if not compute_density_matrix:
-                partition_cmd += " --skip-density-matrix"
+                simulate_args += " --skip-density-matrix"
             if not compute_entropy:
-                partition_cmd += " --skip-entropy"
+                simulate_args += " --skip-entropy"
+            if seed is not None:
+                simulate_args += f" --seed {int(seed)}"
+            if compute_density_matrix and density_qubits:
+                simulate_args += f" --density-qubits {','.join(str(int(q)) for q in density_qubits)}"
+            if compute_density_matrix and max_density_qubits:
+                simulate_args += f" --max-density-qubits {int(max_density_qubits)}"
+            if output_mode == "sparse":
+                simulate_args += " --output-mode sparse"
+                if top_k:
+                    simulate_args += f" --top-k {int(top_k)}"
+                if probability_threshold:
+                    simulate_args += f" --probability-threshold {float(probability_threshold)}"
+            if output_precision == "single":
+                simulate_args += " --output-precision single"
+            if memory_budget == "auto":
+                simulate_args += " --memory-budget auto"
+            elif memory_budget:
+                simulate_args += f" --memory-budget {float(memory_budget)}"
+            if simulation_precision == "single":
+                simulate_args += " --precision single"
+                if precision_check:
+                    simulate_args += " --precision-check"
+            if checkpoint_every:
+                simulate_args += f" --checkpoint-every {int(checkpoint_every)}"
+            if noise and noise_trajectories:
+                simulate_args += f" --trajectories {int(noise_trajectories)}"
+            if shard_qubits:
+                simulate_args += f" --shard-qubits {int(shard_qubits)}"
+            if stream_results:
+                simulate_args += " --stream result.ndjson"
+
+            partition_cmd = f"cd {remote_job_dir} && python3 -u simulate.py {simulate_args}"
+            if settings.SQUANDER_SIMULATION_SOCKET:
+                # a resident simulate.py server skips interpreter start-up and imports, fall back when none is listening
+                partition_cmd = (
+                    f"cd {remote_job_dir} && "
+                    f"python3 -u server.py --connect {settings.SQUANDER_SIMULATION_SOCKET} --cwd {remote_job_dir} -- {simulate_args}; "
+                    f"status=$?; "
+                    f"if [ $status -eq {SIMULATION_SERVER_UNAVAILABLE} ]; then python3 -u simulate.py {simulate_args}; else exit $status; fi"
+                )
 
+            # result sections announced on stdout are read from the stream file and forwarded before the run ends
+            remote_stream_file = f"{remote_job_dir}/result.ndjson"
+            stream_offset = 0
+            streamed_metrics = None
             async for update in self.stream_command_output(partition_cmd):
-                yield update
+                if not (stream_results and update.get("message", "").startswith(STREAM_MARKER)):
+                    yield update
+                    continue
+                try:
+                    records, consumed = parse_stream_records(await self.read_file_from(remote_stream_file, stream_offset))
+                except Exception as e:
+                    # partial results are a preview, the result archive still arrives at the end
+                    logger.warning(f"[run_partition] Could not read streamed results: {e}")
+                    continue
+                stream_offset += consumed
+                for record in records:
+                    if record.get("section") == "metrics":
+                        # sent again after the result file is written, with that stage included
+                        streamed_metrics = record["data"]
+                    if "section" in record:
+                        yield {"type": "partial", "section": record["section"], "data": record["data"], "message": f"Result ready: {record['section']}"}
 
             # Download results
             yield {"type": "phase", "phase": "downloading", "message": "Downloading results..."}
-            remote_result_file = f"{remote_job_dir}/result.json"
+            remote_result_file = f"{remote_job_dir}/result.npz"
             await self.download_file(remote_result_file, local_result_file)
 
             # Parse results
-            result_data = json.loads(Path(local_result_file).read_text())
+            # arrays stay NumPy buffers until they are flattened for the API response
+            result_data = to_json_compatible(read_result_archive(local_result_file))
+            job_metrics = streamed_metrics or result_data.get("metrics")
+            if job_metrics:
+                # one structured line per job, so hot stages can be aggregated from the logs
+                logger.info("[run_partition] Stage metrics for job %s: %s", job_id, json.dumps(job_metrics))
 
             # Add circuit name to results
             if circuit_name:
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+SQUANDER Simulation Worker
+
+Runs the stages of the simulation pipeline in one long-lived, timeout-supervised
+child process. Statevectors and other large arrays live in shared memory blocks
+owned by the parent; stages receive SharedArray handles and read or write the
+blocks in place, so only small results cross the pipe. A stage that exceeds its
+timeout gets the worker killed, and the next stage transparently respawns it.
+Independent tasks can also run side by side, one process each, under per-task
+timeouts with run_concurrently.
+
+Copyright 2024 SQUANDER
+Licensed under Apache License 2.0
+"""
+import os
+import time
+import multiprocessing
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from metrics import UsageMeter
+
+class TimeoutError(Exception):
+    """Raised when a step times out"""
+    pass
+
+class SharedArray(NamedTuple):
+    """picklable handle to a numpy array stored in a shared memory block"""
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+# shared memory blocks opened by this process, keyed by block name
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+
+def attach(handle: SharedArray) -> np.ndarray:
+    """numpy view of a shared array, opening its block on first use in this process"""
+    block = _attached.get(handle.name)
+    if block is None:
+        block = shared_memory.SharedMemory(name=handle.name)
+        _attached[handle.name] = block
+    return np.ndarray(handle.shape, dtype=np.dtype(handle.dtype), buffer=block.buf)
+
+def on_shared(func: Callable, *args, **kwargs) -> Any:
+    """
+    call func with SharedArray arguments swapped for their numpy views
+    array results are expected to live in shared `out` blocks and are not sent back
+    """
+    args = tuple(attach(arg) if isinstance(arg, SharedArray) else arg for arg in args)
+    kwargs = {key: attach(value) if isinstance(value, SharedArray) else value for key, value in kwargs.items()}
+    result = func(*args, **kwargs)
+    return None if isinstance(result, np.ndarray) else result
+
+class SharedArrayPool:
+    """shared memory blocks owned by the parent process, unlinked on close"""
+    def __init__(self):
+        self._blocks: Dict[str, shared_memory.SharedMemory] = {}
+        self.allocated_bytes = 0
+
+    def allocate(self, shape: Tuple[int, ...], dtype=np.complex128) -> SharedArray:
+        dtype = np.dtype(dtype)
+        size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+        block = shared_memory.SharedMemory(create=True, size=size)
+        self._blocks[block.name] = block
+        _attached[block.name] = block
+        self.allocated_bytes += size
+        return SharedArray(block.name, tuple(shape), dtype.str)
+
+    def close(self):
+        for name, block in self._blocks.items():
+            _attached.pop(name, None)
+            try:
+                block.unlink()
+                # views still referenced by the caller keep the mapping alive until they are released
+                block.close()
+            except (BufferError, FileNotFoundError):
+                pass
+        self._blocks.clear()
+
+    def __enter__(self) -> "SharedArrayPool":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _serve(conn):
+    """worker loop: execute (func, args, kwargs) tasks until a None task arrives, replying with their usage"""
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        func, args, kwargs = task
+        meter = UsageMeter().start()
+        try:
+            reply = ('success', func(*args, **kwargs), meter.stop())
+        except Exception as e:
+            reply = ('error', e, meter.stop())
+        try:
+            conn.send(reply)
+        except Exception as e:
+            # results or exceptions of extension types are not always picklable
+            conn.send(('error', RuntimeError(f"{type(e).__name__}: {e}"), reply[2]))
+    for block in _attached.values():
+        try:
+            block.close()
+        except BufferError:
+            pass
+
+class StageWorker:
+    """long-lived worker process that runs one stage at a time under a timeout"""
+    def __init__(self):
+        # fork so that stage functions defined in the __main__ script resolve in the child
+        self._context = multiprocessing.get_context('fork')
+        self._process = None
+        self._conn = None
+        # wall/CPU time and peak RSS growth of every stage completed in the child process
+        self.usage: List[Dict[str, Any]] = []
+
+    def _spawn(self):
+        parent_conn, child_conn = self._context.Pipe()
+        self._process = self._context.Process(target=_serve, args=(child_conn,), daemon=True)
+        self._process.start()
+        child_conn.close()
+        self._conn = parent_conn
+
+    def _kill(self):
+        if self._process is not None:
+            self._process.kill()
+            self._process.join(timeout=1)
+        if self._conn is not None:
+            self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def run(self, func: Callable, args: Tuple = (), kwargs: Optional[Dict[str, Any]] = None, timeout_seconds: Optional[int] = None) -> Any:
+        """run func(*args, **kwargs) in the worker, in-process when no timeout is set"""
+        if kwargs is None:
+            kwargs = {}
+        if timeout_seconds is None or timeout_seconds <= 0:
+            return func(*args, **kwargs)
+        if self._process is None or not self._process.is_alive():
+            self._kill()
+            self._spawn()
+        self._conn.send((func, args, kwargs))
+        if not self._conn.poll(timeout_seconds):
+            self._kill()
+            raise TimeoutError(f"Operation timed out after {timeout_seconds} seconds")
+        try:
+            status, result, usage = self._conn.recv()
+        except EOFError:
+            self._kill()
+            raise TimeoutError("Process ended without returning a result")
+        self.usage.append(usage)
+        if status == 'error':
+            raise result
+        return result
+
+    def close(self):
+        if self._process is not None and self._process.is_alive():
+            try:
+                self._conn.send(None)
+                self._process.join(timeout=1)
+            except (BrokenPipeError, OSError):
+                pass
+        self._kill()
+
+    def __enter__(self) -> "StageWorker":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _run_task(conn, func: Callable, args: Tuple, kwargs: Dict[str, Any]):
+    """child side of run_concurrently: run one task and send back its outcome"""
+    try:
+        reply = ('success', func(*args, **kwargs))
+    except Exception as e:
+        reply = ('error', e)
+    try:
+        conn.send(reply)
+    except Exception as e:
+        conn.send(('error', RuntimeError(f"{type(e).__name__}: {e}")))
+    conn.close()
+
+def run_concurrently(tasks: List[Tuple[Callable, Tuple, Dict[str, Any]]], timeout_seconds: Optional[int] = None, max_workers: Optional[int] = None) -> List[Tuple[str, Any]]:
+    """
+    run independent (func, args, kwargs) tasks in parallel processes, at most max_workers at once
+    every task gets its own timeout; a task that exceeds it is killed without affecting the others
+    returns one (status, value) per task in task order, status being 'success', 'error' or 'timeout'
+    """
+    context = multiprocessing.get_context('fork')
+    max_workers = max(1, max_workers or os.cpu_count() or 1)
+    has_timeout = timeout_seconds is not None and timeout_seconds > 0
+    results: List[Optional[Tuple[str, Any]]] = [None] * len(tasks)
+    pending = list(enumerate(tasks))
+    running = {}
+    while pending or running:
+        while pending and len(running) < max_workers:
+            index, (func, args, kwargs) = pending.pop(0)
+            reader, writer = context.Pipe(duplex=False)
+            # forked children inherit the task arguments, only the outcome is pickled
+            process = context.Process(target=_run_task, args=(writer, func, args, kwargs or {}), daemon=True)
+            process.start()
+            writer.close()
+            running[reader] = (index, process, time.monotonic() + timeout_seconds if has_timeout else None)
+        deadlines = [deadline for _, _, deadline in running.values() if deadline is not None]
+        for reader in wait(list(running), timeout=max(0.0, min(deadlines) - time.monotonic()) if deadlines else None):
+            index, process, _ = running.pop(reader)
+            try:
+                results[index] = reader.recv()
+            except EOFError:
+                results[index] = ('error', RuntimeError("Process ended without returning a result"))
+            reader.close()
+            process.join()
+        now = time.monotonic()
+        for reader, (index, process, deadline) in list(running.items()):
+            if deadline is not None and now >= deadline:
+                process.kill()
+                process.join()
+                reader.close()
+                del running[reader]
+                results[index] = ('timeout', TimeoutError(f"Operation timed out after {timeout_seconds} seconds"))
+    return results
@@ -0,0 +1,62 @@
+"""stage metrics unit tests - per-stage time, memory and array accounting"""
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# metrics.py runs on the SQUANDER host next to simulate.py and imports its sibling modules by name
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'app' / 'services'))
+
+from metrics import StageMetrics, UsageMeter, array_bytes
+from worker import SharedArrayPool, StageWorker
+
+
+def _touch(size: int) -> int:
+    block = np.ones(size, dtype=np.uint8)
+    return int(block[::4096].sum())
+
+
+@pytest.mark.unit
+class TestUsageMeter:
+    """test measurement of one code region"""
+    def test_peak_rss_covers_temporaries(self):
+        """test memory freed before the region ends still shows in the peak"""
+        with UsageMeter() as meter:
+            _touch(64 << 20)
+        if meter.usage['peak_rss_delta'] is None:
+            pytest.skip("peak RSS is not available on this platform")
+        assert meter.usage['peak_rss_delta'] >= 32 << 20
+        assert meter.usage['cpu_seconds'] >= 0
+
+
+@pytest.mark.unit
+class TestStageMetrics:
+    """test per-stage records"""
+    def test_stages_follow_progress_names(self, capsys):
+        """test a stage lasts until the next name and repeated names continue it"""
+        metrics = StageMetrics()
+        metrics.enter("building_circuit")
+        metrics.enter("simulating")
+        metrics.enter("simulating")
+        metrics.finish()
+        assert [record['stage'] for record in metrics.stages] == ["building_circuit", "simulating"]
+        assert "[metrics] simulating: wall" in capsys.readouterr().out
+
+    def test_worker_usage_and_pool_bytes_are_folded_in(self):
+        """test CPU time of worker stages and shared allocations count towards the stage"""
+        metrics = StageMetrics()
+        with SharedArrayPool() as pool, StageWorker() as worker:
+            metrics.track(worker=worker, pool=pool)
+            metrics.enter("simulating")
+            pool.allocate((1024,), np.complex128)
+            worker.run(_touch, args=(1 << 20,), timeout_seconds=5)
+            metrics.finish()
+        record = metrics.stages[0]
+        assert record['array_bytes'] == 1024 * 16
+        assert record['cpu_seconds'] >= worker.usage[0]['cpu_seconds']
+
+    def test_array_bytes_of_nested_results(self):
+        """test array bytes add up through dicts and lists"""
+        results = {'state': np.zeros(4, dtype=np.complex128), 'entries': [np.zeros(2), {'n': 3}]}
+        assert array_bytes(results) == 64 + 16
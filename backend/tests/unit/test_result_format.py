@@ -0,0 +1,108 @@
+"""binary simulation result container unit tests"""
+import numpy as np
+import pytest
+
+from app.services.result_format import (
+    ResultStreamWriter, parse_stream_records, read_result_archive, read_result_stream, to_json_compatible, write_result_archive
+)
+
+
+def _results():
+    state = np.zeros((4, 1), dtype=np.complex128)
+    state[0] = state[3] = 1 / np.sqrt(2)
+    return {
+        'num_qubits': 2,
+        'errors': [],
+        'partition_info': {'strategy': 'kahn', 'partitions': [{'index': 0, 'qubits': [0, 1]}]},
+        'original': {
+            'state_vector': state,
+            'probabilities': np.abs(state.reshape(-1)) ** 2,
+            'counts': {'00': 3, '11': 5},
+            'density_matrix': {'real': np.eye(2, dtype=np.float32) / 2, 'imag': np.zeros((2, 2), dtype=np.float32), 'qubits': [0]},
+        },
+        'comparison': {'fidelity': np.float64(1.0)},
+    }
+
+
+@pytest.mark.unit
+class TestResultArchive:
+    """test npz result archive round trips"""
+    def test_round_trip_keeps_numpy_arrays(self, tmp_path):
+        """test arrays come back as numpy arrays with their dtype and shape"""
+        path = tmp_path / "result.npz"
+        write_result_archive(_results(), path)
+        results = read_result_archive(path)
+        state = results['original']['state_vector']
+        assert isinstance(state, np.ndarray)
+        assert state.dtype == np.complex128
+        assert state.shape == (4, 1)
+        assert results['original']['density_matrix']['real'].dtype == np.float32
+        assert results['original']['counts'] == {'00': 3, '11': 5}
+        assert results['partition_info']['partitions'][0]['qubits'] == [0, 1]
+        assert results['comparison']['fidelity'] == 1.0
+
+    def test_rejects_foreign_archives(self, tmp_path):
+        """test an npz without manifest is not accepted"""
+        path = tmp_path / "other.npz"
+        np.savez(path, __manifest__=np.frombuffer(b'{"format": "other"}', dtype=np.uint8))
+        with pytest.raises(ValueError):
+            read_result_archive(path)
+
+
+@pytest.mark.unit
+class TestJsonLayout:
+    """test conversion to the result.json layout"""
+    def test_complex_arrays_become_real_imag_pairs(self):
+        """test complex amplitudes flatten to [[real, imag], ...]"""
+        converted = to_json_compatible(_results())
+        np.testing.assert_allclose(converted['original']['state_vector'], [[2 ** -0.5, 0], [0, 0], [0, 0], [2 ** -0.5, 0]])
+        assert isinstance(converted['original']['state_vector'][0][0], float)
+        assert converted['original']['probabilities'] == pytest.approx([0.5, 0, 0, 0.5])
+
+    def test_single_precision_is_rounded(self):
+        """test float32 values do not carry widening noise"""
+        converted = to_json_compatible({'value': np.array([0.1], dtype=np.float32)})
+        assert converted['value'] == [0.1]
+
+
+@pytest.mark.unit
+class TestResultStream:
+    """test incremental NDJSON result streams"""
+    def test_sections_merge_into_the_json_layout(self, tmp_path):
+        """test counts sent early and the full section sent later merge into the result.json layout"""
+        path = tmp_path / "result.ndjson"
+        results = _results()
+        with ResultStreamWriter(path, include_arrays=True) as stream:
+            stream.write_section('original', {'counts': results['original']['counts']})
+            partial, complete = read_result_stream(path)
+            assert partial == {'original': {'counts': {'00': 3, '11': 5}}}
+            assert not complete
+            for section, data in results.items():
+                stream.write_section(section, data)
+        streamed, complete = read_result_stream(path)
+        assert complete
+        assert streamed == to_json_compatible(results)
+
+    def test_arrays_are_left_to_the_result_file(self, tmp_path):
+        """test without include_arrays the stream carries everything but the arrays"""
+        path = tmp_path / "result.ndjson"
+        with ResultStreamWriter(path) as stream:
+            stream.write_section('original', _results()['original'])
+        streamed, _ = read_result_stream(path)
+        assert streamed['original'] == {'counts': {'00': 3, '11': 5}, 'density_matrix': {'qubits': [0]}}
+
+    def test_failed_run_is_not_complete(self, tmp_path):
+        """test a stream closed by an exception has no complete record"""
+        path = tmp_path / "result.ndjson"
+        with pytest.raises(RuntimeError):
+            with ResultStreamWriter(path) as stream:
+                stream.write_section('num_qubits', 2)
+                raise RuntimeError("simulation failed")
+        assert read_result_stream(path) == ({'num_qubits': 2}, False)
+
+    def test_partial_lines_wait_for_the_next_read(self):
+        """test only whole records are decoded and consumed"""
+        data = b'{"section": "num_qubits", "data": 2}\n{"section": "errors", "da'
+        records, consumed = parse_stream_records(data)
+        assert records == [{'section': 'num_qubits', 'data': 2}]
+        assert data[consumed:] == b'{"section": "errors", "da'
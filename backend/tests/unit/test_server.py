@@ -0,0 +1,115 @@
+"""simulation server unit tests - job isolation, streamed output and JSON-RPC dispatch"""
+import io
+import os
+import sys
+import json
+import time
+import threading
+from pathlib import Path
+
+import pytest
+
+# server.py runs on the SQUANDER host next to simulate.py and imports its sibling modules by name
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'app' / 'services'))
+
+from server import JOB_FAILED, JOB_TIMEOUT, METHOD_NOT_FOUND, PARSE_ERROR, SimulationServer, call, run_isolated
+
+
+def _echo(params):
+    print("[1/2] first: line")
+    print("[2/2] second: line")
+    return {'pid': os.getpid(), 'value': params.get('value')}
+
+
+def _sleep(params):
+    print("sleeping", flush=True)
+    time.sleep(params.get('seconds', 10))
+    return {}
+
+
+def _fail(params):
+    raise ValueError("job failed")
+
+
+def _crash(params):
+    os._exit(3)
+
+
+def _serve(server, *requests):
+    """run the requests through serve_stream and return the messages written back"""
+    out = io.BytesIO()
+    server.serve_stream(io.BytesIO(b"".join((r if isinstance(r, bytes) else json.dumps(r).encode()) + b"\n" for r in requests)), out)
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+@pytest.mark.unit
+class TestRunIsolated:
+    """test forked job execution"""
+    def test_output_lines_are_streamed_and_result_returned(self):
+        """test printed lines reach on_line in order and the job runs in another process"""
+        lines = []
+        status, result = run_isolated(_echo, {'value': 7}, on_line=lines.append)
+        assert status == 'success'
+        assert result['value'] == 7
+        assert result['pid'] != os.getpid()
+        assert lines == ["[1/2] first: line", "[2/2] second: line"]
+
+    def test_errors_and_crashes_stay_in_the_job(self):
+        """test exceptions and dying processes come back as errors"""
+        assert run_isolated(_fail, {}) == ('error', "ValueError: job failed")
+        status, message = run_isolated(_crash, {})
+        assert status == 'error'
+        assert "exit code 3" in message
+
+    def test_timeout_kills_the_job(self):
+        """test a job over its timeout is stopped and its output so far is kept"""
+        lines = []
+        start = time.monotonic()
+        status, _ = run_isolated(_sleep, {'seconds': 10}, timeout_seconds=0.5, on_line=lines.append)
+        assert status == 'timeout'
+        assert time.monotonic() - start < 5
+        assert lines == ["sleeping"]
+
+
+@pytest.mark.unit
+class TestSimulationServer:
+    """test JSON-RPC dispatch"""
+    def test_job_streams_progress_before_its_response(self):
+        """test progress notifications carry the request id and precede the result"""
+        messages = _serve(SimulationServer({'echo': _echo}), {'jsonrpc': '2.0', 'id': 5, 'method': 'echo', 'params': {'value': 1}})
+        assert [m['params']['line'] for m in messages[:-1]] == ["[1/2] first: line", "[2/2] second: line"]
+        assert all(m['method'] == 'progress' and m['params']['id'] == 5 for m in messages[:-1])
+        assert messages[-1]['id'] == 5
+        assert messages[-1]['result']['value'] == 1
+
+    def test_errors_use_jsonrpc_codes(self):
+        """test malformed requests, unknown methods, failures and timeouts map to error codes"""
+        server = SimulationServer({'fail': _fail, 'sleep': _sleep}, job_timeout=0.5)
+        messages = _serve(
+            server,
+            b"not json",
+            {'jsonrpc': '2.0', 'id': 1, 'method': 'missing'},
+            {'jsonrpc': '2.0', 'id': 2, 'method': 'fail'},
+            {'jsonrpc': '2.0', 'id': 3, 'method': 'sleep'}
+        )
+        errors = {m.get('id'): m['error']['code'] for m in messages if 'error' in m}
+        assert errors == {None: PARSE_ERROR, 1: METHOD_NOT_FOUND, 2: JOB_FAILED, 3: JOB_TIMEOUT}
+
+    def test_socket_client_round_trip(self, tmp_path):
+        """test call forwards progress and returns the result, and shutdown stops the server"""
+        path = str(tmp_path / "simulate.sock")
+        server = SimulationServer({'echo': _echo})
+        thread = threading.Thread(target=server.serve_socket, args=(path,), daemon=True)
+        thread.start()
+        for _ in range(100):
+            if os.path.exists(path):
+                break
+            time.sleep(0.05)
+        lines = []
+        assert call(path, 'echo', {'value': 3}, on_progress=lines.append)['value'] == 3
+        assert lines == ["[1/2] first: line", "[2/2] second: line"]
+        assert call(path, 'ping', {})['jobs_completed'] == 1
+        call(path, 'shutdown', {})
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+        assert not os.path.exists(path)
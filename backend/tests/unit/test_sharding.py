@@ -0,0 +1,124 @@
+"""sharded state vector unit tests - swap scheduling, shard swaps and parallel block application"""
+import sys
+import time
+from pathlib import Path
+
+import pytest
+import numpy as np
+
+# sharding.py runs on the SQUANDER host next to simulate.py and imports its sibling modules by name
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'app' / 'services'))
+
+from sharding import ShardedStateVector, schedule, swap_bits
+from worker import SharedArrayPool, TimeoutError, attach
+
+
+def _apply(state: np.ndarray, bits, unitary: np.ndarray):
+    """apply unitary to the given index bits of a flat or column state, bit i of the unitary index being bits[i]"""
+    n = state.size.bit_length() - 1
+    k = len(bits)
+    tensor = state.reshape((2,) * n)
+    axes = [n - 1 - bit for bit in reversed(bits)]
+    result = np.tensordot(unitary.reshape((2,) * (2 * k)), tensor, axes=(list(range(k, 2 * k)), axes))
+    tensor[...] = np.moveaxis(result, list(range(k)), axes)
+
+
+def _random_blocks(num_qubits: int, count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    blocks = []
+    for _ in range(count):
+        qubits = sorted(rng.choice(num_qubits, size=int(rng.integers(1, 3)), replace=False).tolist())
+        matrix = rng.normal(size=(1 << len(qubits),) * 2) + 1j * rng.normal(size=(1 << len(qubits),) * 2)
+        blocks.append((qubits, np.linalg.qr(matrix)[0]))
+    return blocks
+
+
+@pytest.mark.unit
+class TestSchedule:
+    """test the swap schedule"""
+    def test_blocks_run_on_local_qubits_and_layout_is_restored(self):
+        """test every block runs once, in order, on local bits, and the plan ends in the standard layout"""
+        num_qubits, shard_qubits = 7, 3
+        block_qubits = [qubits for qubits, _ in _random_blocks(num_qubits, 40)]
+        steps, shard_swaps = schedule(block_qubits, num_qubits, shard_qubits, batch=8)
+        positions = next(step[3] for step in steps if step[0] == 'apply')
+        done = 0
+        for step in steps:
+            if step[0] == 'swap':
+                a, b = step[1], step[2]
+                qa, qb = positions.index(a), positions.index(b)
+                positions[qa], positions[qb] = b, a
+                continue
+            _, start, stop, layout = step
+            assert start == done and stop - start <= 8
+            assert layout == positions
+            assert all(positions[q] < num_qubits - shard_qubits for qubits in block_qubits[start:stop] for q in qubits)
+            done = stop
+        assert done == len(block_qubits)
+        assert positions == list(range(num_qubits))
+        assert 0 < shard_swaps <= sum(1 for step in steps if step[0] == 'swap')
+
+    def test_qubits_needed_last_start_global(self):
+        """test a circuit that never touches its top qubits needs no shard swaps"""
+        steps, shard_swaps = schedule([[0, 1], [2, 3], [1, 2]], 6, 2)
+        assert shard_swaps == 0
+        assert [step[0] for step in steps] == ['apply']
+
+    def test_blocks_wider_than_a_shard_are_rejected(self):
+        """test blocks must fit the local qubits"""
+        with pytest.raises(ValueError):
+            schedule([[0, 1, 2]], 4, 2)
+
+
+@pytest.mark.unit
+class TestShardedStateVector:
+    """test shard swaps and parallel block application"""
+    @pytest.mark.parametrize('a,b', [(0, 2), (1, 3), (0, 4), (3, 4)])
+    def test_swap_bits_matches_a_transposition(self, a, b):
+        """test local, mixed and global bit swaps permute amplitudes like swapping tensor axes"""
+        num_qubits, shard_qubits = 5, 2
+        state = np.arange(1 << num_qubits, dtype=np.complex128).reshape(-1, 1)
+        expected = np.swapaxes(state.reshape((2,) * num_qubits), num_qubits - 1 - a, num_qubits - 1 - b).reshape(-1, 1)
+        size = state.shape[0] >> shard_qubits
+        shards = [state[i * size:(i + 1) * size] for i in range(1 << shard_qubits)]
+        for worker in range(3):
+            swap_bits(shards, num_qubits - shard_qubits, a, b, worker, 3)
+        assert np.array_equal(state, expected)
+
+    def test_sharded_run_matches_dense_simulation(self):
+        """test a scheduled run over worker processes gives the state of applying every block in one piece"""
+        num_qubits, shard_qubits = 6, 2
+        blocks = _random_blocks(num_qubits, 30, seed=1)
+        expected = np.zeros(1 << num_qubits, dtype=np.complex128)
+        expected[0] = 1
+        for qubits, unitary in blocks:
+            _apply(expected, qubits, unitary)
+
+        def apply_run(start, stop, positions, shards):
+            for qubits, unitary in blocks[start:stop]:
+                for shard in shards:
+                    _apply(shard, [positions[q] for q in qubits], unitary)
+
+        progress = []
+        steps, _ = schedule([qubits for qubits, _ in blocks], num_qubits, shard_qubits, batch=10)
+        with SharedArrayPool() as pool:
+            handle = pool.allocate((1 << num_qubits, 1), np.complex128)
+            attach(handle)[0] = 1
+            with ShardedStateVector(handle, shard_qubits, apply_run, num_workers=3) as sharded:
+                sharded.run(steps, on_progress=lambda done, total: progress.append((done, total)))
+            assert np.allclose(attach(handle).ravel(), expected)
+        assert progress[-1] == (30, 30)
+
+    def test_timeout_stops_the_workers(self):
+        """test a step over the timeout kills the shard workers"""
+        def apply_run(start, stop, positions, shards):
+            time.sleep(10)
+
+        with SharedArrayPool() as pool:
+            handle = pool.allocate((16, 1), np.complex128)
+            sharded = ShardedStateVector(handle, 1, apply_run, num_workers=2)
+            start = time.monotonic()
+            with pytest.raises(TimeoutError):
+                sharded.run([('apply', 0, 1, [0, 1, 2, 3])], timeout_seconds=0.5)
+            assert time.monotonic() - start < 5
+            assert not sharded._processes
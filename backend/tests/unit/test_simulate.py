@@ -0,0 +1,874 @@
+"""simulation pipeline unit tests - numerics without squander dependency"""
+import os
+import sys
+import time
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+# Mock squander modules before importing simulate.py
+for module in ('squander', 'squander.partitioning', 'squander.partitioning.partition', 'squander.partitioning.kahn', 'squander.partitioning.tools'):
+    sys.modules.setdefault(module, MagicMock())
+
+# simulate.py runs as a script on the SQUANDER host and imports its sibling modules by name
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'app' / 'services'))
+
+import simulate
+from simulate import (
+    BASELINE_BYTES, QuantumCircuitSimulator, estimate_comparison, estimate_resources, fit_comparison_workers,
+    fit_memory_budget, get_noise_model, get_observables
+)
+from result_format import read_result_stream
+
+
+def _ghz(num_qubits: int) -> np.ndarray:
+    state = np.zeros((1 << num_qubits, 1), dtype=np.complex128)
+    state[0] = state[-1] = 1 / np.sqrt(2)
+    return state
+
+
+@pytest.mark.unit
+class TestSampling:
+    """test measurement sampling"""
+    def test_counts_sum_to_shots(self):
+        """test sampled counts add up to the number of shots"""
+        simulator = QuantumCircuitSimulator(3)
+        counts = simulator.sample_measurements(_ghz(3), 1000, np.random.default_rng(0))
+        assert sum(counts.values()) == 1000
+        assert set(counts) <= {'000', '111'}
+
+    def test_seeded_generator_is_reproducible(self):
+        """test identical seeds give identical counts"""
+        simulator = QuantumCircuitSimulator(3)
+        first = simulator.sample_measurements(_ghz(3), 500, np.random.default_rng(42))
+        second = simulator.sample_measurements(_ghz(3), 500, np.random.default_rng(42))
+        assert first == second
+
+    def test_only_observed_outcomes_are_returned(self):
+        """test zero-probability outcomes are omitted from counts"""
+        simulator = QuantumCircuitSimulator(4)
+        probabilities = np.zeros(16)
+        probabilities[5] = 1.0
+        assert simulator.sample_counts(probabilities, 10) == {'0101': 10}
+
+    def test_empty_distribution_gives_no_counts(self):
+        """test an all-zero distribution (skipped stage) samples nothing"""
+        simulator = QuantumCircuitSimulator(2)
+        assert simulator.sample_counts(np.zeros(4), 100) == {}
+
+
+@pytest.mark.unit
+class TestMarginalProbabilities:
+    """test marginalisation onto the measured qubits"""
+    def test_marginal_keeps_measured_bits_in_order(self):
+        """test marginal outcome bits follow ascending measured qubits"""
+        simulator = QuantumCircuitSimulator(3)
+        state = np.zeros((8, 1), dtype=np.complex128)
+        state[0b101] = 1.0
+        assert simulator.get_probabilities(state, qubits=[0, 1]).tolist() == [0, 1, 0, 0]
+        assert simulator.get_probabilities(state, qubits=[0, 2]).tolist() == [0, 0, 0, 1]
+        assert simulator.get_probabilities(state, qubits=[1]).tolist() == [1, 0]
+
+    def test_marginal_sums_to_one(self):
+        """test marginal distribution of a random state is normalised"""
+        simulator = QuantumCircuitSimulator(5)
+        rng = np.random.default_rng(0)
+        state = rng.normal(size=(32, 1)) + 1j * rng.normal(size=(32, 1))
+        state /= np.linalg.norm(state)
+        marginal = simulator.get_probabilities(state, qubits=[1, 3])
+        assert marginal.shape == (4,)
+        assert marginal.sum() == pytest.approx(1.0)
+
+    def test_counts_use_measured_width(self):
+        """test sampled bitstrings have one bit per measured qubit"""
+        simulator = QuantumCircuitSimulator(4)
+        counts = simulator.sample_measurements(_ghz(4), 200, np.random.default_rng(1), qubits=[0, 3])
+        assert set(counts) <= {'00', '11'}
+        assert sum(counts.values()) == 200
+
+
+@pytest.mark.unit
+class TestEntanglementEntropy:
+    """test entropies computed from the final state vector"""
+    def test_product_state_has_no_entanglement(self):
+        """test every cut of a basis state has zero entropy"""
+        simulator = QuantumCircuitSimulator(4)
+        state = np.zeros((16, 1), dtype=np.complex128)
+        state[0b0110] = 1.0
+        for entry in simulator.analyze_entanglement_scaling(state):
+            assert entry['entropy'] == pytest.approx(0.0, abs=1e-12)
+            assert entry['von_neumann_entropy'] == pytest.approx(0.0, abs=1e-12)
+
+    def test_ghz_cuts_carry_one_bit(self):
+        """test every cut of a GHZ state has entropy ln 2"""
+        simulator = QuantumCircuitSimulator(5)
+        scaling = simulator.analyze_entanglement_scaling(_ghz(5))
+        assert [entry['subsystem_size'] for entry in scaling] == [1, 2, 3, 4]
+        for entry in scaling:
+            assert entry['entropy'] == pytest.approx(np.log(2))
+            assert entry['von_neumann_entropy'] == pytest.approx(np.log(2))
+
+    def test_arbitrary_subset_matches_complement(self):
+        """test a non-contiguous subset and its complement share the spectrum"""
+        simulator = QuantumCircuitSimulator(5)
+        rng = np.random.default_rng(3)
+        state = rng.normal(size=(32, 1)) + 1j * rng.normal(size=(32, 1))
+        state /= np.linalg.norm(state)
+        subset = simulator.calculate_entropy(state, [0, 3])
+        complement = simulator.calculate_entropy(state, [1, 2, 4])
+        assert subset['renyi_2'] == pytest.approx(complement['renyi_2'])
+        assert subset['von_neumann'] == pytest.approx(complement['von_neumann'])
+
+
+@pytest.mark.unit
+class TestDensityMatrix:
+    """test full and reduced density matrices"""
+    def test_full_density_matrix_is_outer_product(self):
+        """test the default density matrix covers the whole register"""
+        simulator = QuantumCircuitSimulator(3)
+        rng = np.random.default_rng(5)
+        state = rng.normal(size=(8, 1)) + 1j * rng.normal(size=(8, 1))
+        psi = state.reshape(-1)
+        np.testing.assert_allclose(simulator.get_density_matrix(state), np.outer(psi, psi.conj()))
+
+    def test_reduced_density_matrix_traces_out_other_qubits(self):
+        """test tracing a GHZ state down to two qubits leaves a classical mixture"""
+        simulator = QuantumCircuitSimulator(4)
+        rho = simulator.get_density_matrix(_ghz(4), qubits=[1, 2])
+        np.testing.assert_allclose(rho, np.diag([0.5, 0, 0, 0.5]), atol=1e-12)
+
+    def test_reduced_density_matrix_bit_order(self):
+        """test reduced basis index bits follow ascending kept qubits"""
+        simulator = QuantumCircuitSimulator(3)
+        state = np.zeros((8, 1), dtype=np.complex128)
+        state[0b100] = 1.0
+        rho = simulator.get_density_matrix(state, qubits=[0, 2])
+        assert rho[0b10, 0b10] == pytest.approx(1.0)
+
+    def test_single_precision_output(self):
+        """test the density matrix is written in the precision of the output buffer"""
+        simulator = QuantumCircuitSimulator(3)
+        out = np.empty((4, 4), dtype=np.complex64)
+        simulator.get_density_matrix(_ghz(3), out=out, qubits=[0, 1])
+        assert out.dtype == np.complex64
+        assert out[0, 0] == pytest.approx(0.5)
+        assert np.trace(out).real == pytest.approx(1.0)
+
+
+@pytest.mark.unit
+class TestSparseOutput:
+    """test sparse probability output and distribution distances"""
+    def test_top_k_keeps_heaviest_outcomes_of_either_distribution(self):
+        """test top-k selection ranks outcomes by their larger probability"""
+        simulator = QuantumCircuitSimulator(3)
+        p = np.array([0.5, 0.0, 0.3, 0.0, 0.1, 0.1, 0.0, 0.0])
+        q = np.array([0.1, 0.6, 0.1, 0.0, 0.1, 0.1, 0.0, 0.0])
+        sparse_p, sparse_q = simulator.sparsify(p, q, top_k=3)
+        assert sparse_p['indices'].tolist() == [0, 1, 2]
+        assert sparse_q['values'].tolist() == [0.1, 0.6, 0.1]
+        assert sparse_p['num_outcomes'] == 8
+        assert sparse_p['retained_probability'] == pytest.approx(0.8)
+
+    def test_threshold_drops_light_outcomes(self):
+        """test outcomes below the threshold in both distributions are dropped"""
+        simulator = QuantumCircuitSimulator(2)
+        p = np.array([0.7, 0.2, 0.05, 0.05])
+        indices = simulator.select_outcomes([p, p], threshold=0.1)
+        assert indices.tolist() == [0, 1]
+
+    def test_identical_distributions_have_zero_distance(self):
+        """test all distances vanish for equal distributions"""
+        simulator = QuantumCircuitSimulator(2)
+        p = np.array([0.25, 0.25, 0.5, 0.0])
+        distances = simulator.compare_distributions(p, p)
+        assert distances['total_variation_distance'] == pytest.approx(0.0)
+        assert distances['hellinger_distance'] == pytest.approx(0.0, abs=1e-7)
+        assert distances['kl_divergence'] == pytest.approx(0.0)
+
+    def test_disjoint_distributions(self):
+        """test distances of distributions with disjoint support"""
+        simulator = QuantumCircuitSimulator(1)
+        distances = simulator.compare_distributions(np.array([1.0, 0.0]), np.array([0.0, 1.0]))
+        assert distances['total_variation_distance'] == pytest.approx(1.0)
+        assert distances['hellinger_distance'] == pytest.approx(1.0)
+        assert distances['max_difference'] == pytest.approx(1.0)
+        assert np.isfinite(distances['kl_divergence'])
+
+
+@pytest.mark.unit
+class TestParameterSweep:
+    """test helpers that let a sweep reuse one partitioning"""
+    def test_partitioned_parameter_order_follows_partitions(self):
+        """test parameters are gathered in partition order from each gate's slice"""
+        simulator = QuantumCircuitSimulator(2)
+        gates = []
+        for start, count in ((0, 1), (1, 0), (1, 2)):
+            gate = MagicMock()
+            gate.get_Parameter_Start_Index.return_value = start
+            gate.get_Parameter_Num.return_value = count
+            gates.append(gate)
+        circuit = MagicMock()
+        circuit.get_Gates.return_value = gates
+        partition_info = {'partitions': [{'original_gate_indices': [2, 1]}, {'original_gate_indices': [0]}]}
+        order = simulator.partitioned_parameter_order(circuit, partition_info)
+        assert order.tolist() == [1, 2, 0]
+        assert np.array([0.1, 0.2, 0.3])[order].tolist() == [0.2, 0.3, 0.1]
+
+    def test_z_expectations_per_qubit(self):
+        """test <Z> is read off the marginal distribution, lowest qubit first"""
+        simulator = QuantumCircuitSimulator(2)
+        probabilities = np.array([0.0, 1.0, 0.0, 0.0])  # qubit 0 in |1>, qubit 1 in |0>
+        assert simulator.z_expectations(probabilities) == [-1.0, 1.0]
+        assert simulator.z_expectations(np.full(4, 0.25)) == [0.0, 0.0]
+
+
+PAULI_MATRICES = {
+    'I': np.eye(2),
+    'X': np.array([[0, 1], [1, 0]]),
+    'Y': np.array([[0, -1j], [1j, 0]]),
+    'Z': np.diag([1, -1]),
+}
+
+
+def _pauli_matrix(num_qubits: int, paulis: dict) -> np.ndarray:
+    # highest qubit is the leftmost kron factor, since qubit q is bit q of the basis index
+    matrix = np.eye(1)
+    for qubit in reversed(range(num_qubits)):
+        matrix = np.kron(matrix, PAULI_MATRICES[paulis.get(qubit, 'I')])
+    return matrix
+
+
+@pytest.mark.unit
+class TestObservables:
+    """test exact Pauli-string expectation values"""
+    def test_parse_pauli_strings(self):
+        """test the observables section becomes coefficient and per-qubit Paulis"""
+        observables = get_observables({'num_qubits': 3, 'observables': [
+            {'name': 'H', 'terms': [{'coefficient': -0.5, 'pauli': 'Z0 X2'}, {'coefficient': 2, 'pauli': ''}]}
+        ]})
+        assert observables == [{'name': 'H', 'terms': [(-0.5, {0: 'Z', 2: 'X'}), (2.0, {})]}]
+
+    def test_invalid_factors_are_rejected(self):
+        """test unknown Paulis and out-of-range qubits raise"""
+        for pauli in ('Q0', 'X3', 'Z0 Z0'):
+            with pytest.raises(ValueError):
+                get_observables({'num_qubits': 3, 'observables': [{'name': 'H', 'terms': [{'pauli': pauli}]}]})
+
+    def test_matches_dense_operator(self):
+        """test every Pauli mix agrees with <psi|P|psi> of the explicit matrix"""
+        simulator = QuantumCircuitSimulator(3)
+        rng = np.random.default_rng(7)
+        state = rng.normal(size=(8, 1)) + 1j * rng.normal(size=(8, 1))
+        state /= np.linalg.norm(state)
+        psi = state.reshape(-1)
+        for pauli in ('', 'Z1', 'X0', 'Y2', 'Z0 Z2', 'X0 Y2', 'Y0 Y1 Z2', 'X0 X1 X2'):
+            observables = get_observables({'num_qubits': 3, 'observables': [{'name': pauli, 'terms': [{'coefficient': 0.7, 'pauli': pauli}]}]})
+            expected = 0.7 * np.vdot(psi, _pauli_matrix(3, observables[0]['terms'][0][1]) @ psi).real
+            assert simulator.expectation_values(state, observables)[0]['expectation'] == pytest.approx(expected)
+
+    def test_groups_share_one_scratch_state(self):
+        """test observables in many rotated bases, evaluated in one call, each match the explicit matrix"""
+        simulator = QuantumCircuitSimulator(3)
+        rng = np.random.default_rng(11)
+        state = rng.normal(size=(8, 1)) + 1j * rng.normal(size=(8, 1))
+        state /= np.linalg.norm(state)
+        psi = state.reshape(-1).copy()
+        paulis = ('X0', 'X0 Y1', 'Y0 Y1', 'Y1 Z2', 'X0 X1 X2', 'Y0 X2', 'Z0 X1', 'Z0 Z1')
+        observables = get_observables({'num_qubits': 3, 'observables': [
+            {'name': pauli, 'terms': [{'coefficient': 1, 'pauli': pauli}]} for pauli in paulis
+        ]})
+        values = simulator.expectation_values(state, observables)
+        for observable, value in zip(observables, values):
+            expected = np.vdot(psi, _pauli_matrix(3, observable['terms'][0][1]) @ psi).real
+            assert value['expectation'] == pytest.approx(expected)
+        np.testing.assert_array_equal(state.reshape(-1), psi)
+
+    def test_sums_terms_and_leaves_state_untouched(self):
+        """test weighted terms add up and the input state is not rotated"""
+        simulator = QuantumCircuitSimulator(2)
+        state = np.array([[1], [0], [0], [1]], dtype=np.complex128) / np.sqrt(2)  # Bell state
+        observables = get_observables({'num_qubits': 2, 'observables': [
+            {'name': 'bell', 'terms': [{'coefficient': 1, 'pauli': 'X0 X1'}, {'coefficient': -1, 'pauli': 'Y0 Y1'}, {'coefficient': 1, 'pauli': 'Z0 Z1'}]}
+        ]})
+        assert simulator.expectation_values(state, observables) == [{'name': 'bell', 'expectation': pytest.approx(3.0)}]
+        np.testing.assert_allclose(state.reshape(-1), np.array([1, 0, 0, 1]) / np.sqrt(2))
+
+
+SIZES = {'num_qubits': 20, 'num_gates': 100, 'num_outcomes': 1 << 10, 'density_qubits': 10}
+
+
+@pytest.mark.unit
+class TestResourceEstimate:
+    """test the pre-flight memory estimate and budget downgrades"""
+    def test_states_dominate_resident_memory(self):
+        """test two double precision state vectors and distributions are always resident"""
+        estimate = estimate_resources(**SIZES)
+        assert estimate['resident_bytes'] == BASELINE_BYTES + 2 * (16 << 20) + 2 * (8 << 10)
+        assert estimate['peak_bytes'] > estimate['resident_bytes']
+        assert estimate['estimated_seconds'] > 0
+
+    def test_optional_stages_raise_the_estimate(self):
+        """test entropy and density matrices add to peak memory and runtime"""
+        plain = estimate_resources(**SIZES)
+        full = estimate_resources(**SIZES, compute_density_matrix=True, compute_entropy=True)
+        assert full['peak_bytes'] > plain['peak_bytes']
+        assert full['estimated_seconds'] > plain['estimated_seconds']
+
+    def test_precision_check_is_counted_only_when_requested(self):
+        """test the double precision reference is an opt-in stage of single precision runs"""
+        single = estimate_resources(**SIZES, simulation_precision='single')
+        checked = estimate_resources(**SIZES, simulation_precision='single', precision_check=True)
+        assert 'precision_check' not in single['stage_bytes']
+        assert checked['stage_bytes']['precision_check'] >= 16 << 20
+        assert checked['estimated_seconds'] > single['estimated_seconds']
+        assert 'precision_check' not in estimate_resources(**SIZES, precision_check=True)['stage_bytes']
+
+    def test_downgrades_apply_in_order_until_the_budget_fits(self):
+        """test only as many downgrades as needed are applied, cheapest loss first"""
+        settings = dict(SIZES, density_qubits=2, compute_density_matrix=True, compute_entropy=True)
+        budget = estimate_resources(**dict(settings, compute_entropy=False))['peak_bytes']
+        adjusted, downgrades, estimate = fit_memory_budget(budget, **settings)
+        assert downgrades == ['skip_entropy']
+        assert adjusted['compute_density_matrix'] is True
+        assert estimate['peak_bytes'] <= budget
+
+    def test_unneeded_earlier_downgrades_are_restored(self):
+        """test entropy is kept when dropping the larger density matrix alone fits"""
+        settings = dict(SIZES, density_qubits=12, compute_density_matrix=True, compute_entropy=True)
+        budget = estimate_resources(**dict(settings, compute_density_matrix=False))['peak_bytes']
+        adjusted, downgrades, _ = fit_memory_budget(budget, **settings)
+        assert downgrades == ['skip_density_matrix']
+        assert adjusted['compute_entropy'] is True
+
+    def test_budget_below_resident_memory_raises(self):
+        """test a budget no downgrade can meet fails before anything is allocated"""
+        with pytest.raises(MemoryError):
+            fit_memory_budget(BASELINE_BYTES, **SIZES, compute_entropy=True)
+
+    def test_json_output_costs_more_than_sparse(self):
+        """test the finalizing estimate follows the output format"""
+        json_output = estimate_resources(**SIZES, raw_arrays=False)
+        sparse_output = estimate_resources(**SIZES, raw_arrays=False, output_mode='sparse')
+        assert json_output['stage_bytes']['finalizing'] > sparse_output['stage_bytes']['finalizing']
+
+    def test_every_noise_worker_holds_a_state(self):
+        """test trajectory processes running at once each add a state vector, never more than there are trajectories"""
+        one = estimate_resources(**SIZES, noise_trajectories=100, noise_workers=1)
+        four = estimate_resources(**SIZES, noise_trajectories=100, noise_workers=4)
+        assert four['stage_bytes']['noise'] == 4 * one['stage_bytes']['noise'] >= 4 * (16 << 20)
+        assert four['peak_bytes'] > one['peak_bytes']
+        assert estimate_resources(**SIZES, noise_trajectories=2, noise_workers=4)['stage_bytes']['noise'] == 2 * one['stage_bytes']['noise']
+
+    def test_budget_caps_noise_workers_before_giving_up_stages(self):
+        """test a budget runs fewer trajectory processes instead of dropping entropy"""
+        settings = dict(SIZES, compute_entropy=True, noise_trajectories=100, noise_workers=8)
+        budget = estimate_resources(**dict(settings, noise_workers=3))['peak_bytes']
+        adjusted, downgrades, estimate = fit_memory_budget(budget, **settings)
+        assert adjusted['noise_workers'] == 3
+        assert adjusted['compute_entropy'] is True
+        assert downgrades == ['fewer_noise_workers']
+        assert estimate['peak_bytes'] <= budget
+
+    def test_noise_workers_that_fit_are_kept(self):
+        """test a budget with room for every requested process leaves them alone"""
+        settings = dict(SIZES, noise_trajectories=100, noise_workers=4)
+        adjusted, downgrades, _ = fit_memory_budget(estimate_resources(**settings)['peak_bytes'], **settings)
+        assert adjusted['noise_workers'] == 4
+        assert downgrades == []
+
+    def test_every_strategy_process_holds_a_state(self):
+        """test comparing strategies adds one partitioned state per process, never more than there are strategies"""
+        one = estimate_comparison(20, 6, 1)
+        assert one['peak_bytes'] == BASELINE_BYTES + 2 * (16 << 20)
+        assert estimate_comparison(20, 6, 4)['peak_bytes'] == one['peak_bytes'] + 3 * (16 << 20)
+        assert estimate_comparison(20, 2, 4)['workers'] == 2
+
+    def test_budget_caps_comparison_workers(self):
+        """test a budget runs as many strategies at once as fit it, and fails when one does not"""
+        budget = estimate_comparison(20, 6, 3)['peak_bytes'] + (8 << 20)
+        estimate = fit_comparison_workers(budget, 20, 6, 8)
+        assert estimate['workers'] == 3
+        assert estimate['peak_bytes'] <= budget
+        assert fit_comparison_workers(budget, 20, 6, 2)['workers'] == 2
+        with pytest.raises(MemoryError):
+            fit_comparison_workers(BASELINE_BYTES + (16 << 20), 20, 6, 8)
+
+
+class _UniformCircuit:
+    """stand-in circuit preparing the uniform superposition"""
+    def apply_to(self, parameters, state):
+        state[:] = 1 / np.sqrt(state.size)
+
+
+class _LocalCircuit:
+    """stand-in for a gate remapped onto its own qubits"""
+    def __init__(self, qubit_map, matrix):
+        self.qubit_map = qubit_map
+        self.matrix = matrix
+
+    def get_Matrix(self, parameters):
+        self.parameters = parameters
+        return self.matrix
+
+
+@pytest.mark.unit
+class TestReducedPrecision:
+    """test complex64 simulation helpers"""
+    def test_kernel_matches_dense_operator(self, monkeypatch):
+        """test a two-qubit kernel on non-adjacent qubits, applied chunk by chunk"""
+        monkeypatch.setattr(simulate, 'CHUNK_AMPLITUDES', 4)
+        simulator = QuantumCircuitSimulator(4)
+        rng = np.random.default_rng(11)
+        kernel = np.linalg.qr(rng.normal(size=(4, 4)) + 1j * rng.normal(size=(4, 4)))[0]
+        state = (rng.normal(size=(16, 1)) + 1j * rng.normal(size=(16, 1))).astype(np.complex64)
+        # tensor axes are qubits 3..0; kernel bit 1 is qubit 3 and bit 0 is qubit 1
+        tensor = state.reshape(2, 2, 2, 2).astype(np.complex128)
+        expected = np.einsum('acef,ebfd->abcd', kernel.reshape(2, 2, 2, 2), tensor).reshape(-1)
+        result = simulator.apply_kernel(state, [1, 3], kernel)
+        assert result.dtype == np.complex64
+        np.testing.assert_allclose(result.reshape(-1), expected, atol=1e-6)
+
+    def test_fidelity_accumulates_in_double_precision(self):
+        """test mixed precision states are compared without precision loss in the sum"""
+        simulator = QuantumCircuitSimulator(12)
+        state = np.full((4096, 1), 1 / 64, dtype=np.complex128)
+        assert simulator.calculate_fidelity(state, state.astype(np.complex64)) == pytest.approx(1.0, abs=1e-7)
+
+    def test_precision_check_reports_single_precision_error(self, monkeypatch):
+        """test the spot-check compares against a double precision simulation"""
+        monkeypatch.setattr(simulate, '_single_precision_support', True)
+        simulator = QuantumCircuitSimulator(5)
+        single = simulator.simulate_statevector(_UniformCircuit(), np.zeros(0), out=np.empty((32, 1), dtype=np.complex64))
+        check = simulator.precision_check(_UniformCircuit(), np.zeros(0), single)
+        assert check['fidelity'] == pytest.approx(1.0, abs=1e-6)
+        assert 0 <= check['max_amplitude_error'] < 1e-7
+
+    def test_gate_kernels_remap_each_gate(self, monkeypatch):
+        """test kernels come from the gate remapped onto its qubits with its parameter slice"""
+        locals_ = []
+        class Wrapper:
+            def __init__(self, num_qubits):
+                pass
+            def add_Gate(self, gate):
+                self.gate = gate
+            def Remap_Qbits(self, qubit_map, num_qubits):
+                locals_.append(_LocalCircuit(qubit_map, np.eye(1 << num_qubits)))
+                return locals_[-1]
+        monkeypatch.setattr(simulate, 'Circuit', Wrapper)
+        gate = MagicMock()
+        gate.get_Involved_Qbits.return_value = [4, 2]
+        gate.get_Parameter_Start_Index.return_value = 1
+        gate.get_Parameter_Num.return_value = 2
+        circuit = MagicMock()
+        circuit.get_Gates.return_value = [gate]
+        [(qubits, kernel)] = QuantumCircuitSimulator(5).gate_kernels(circuit, np.array([0.1, 0.2, 0.3, 0.4]))
+        assert qubits == [2, 4]
+        assert kernel.dtype == np.complex64 and kernel.shape == (4, 4)
+        assert locals_[0].qubit_map == {2: 0, 4: 1}
+        assert locals_[0].parameters.tolist() == [0.2, 0.3]
+
+    def test_gate_kernels_remap_partition_blocks_directly(self, monkeypatch):
+        """test partition blocks are remapped themselves instead of being wrapped like single gates"""
+        class Block:
+            def __init__(self, num_qubits):
+                pass
+            def get_Qbits(self):
+                return [3, 0]
+            def get_Parameter_Start_Index(self):
+                return 0
+            def get_Parameter_Num(self):
+                return 1
+            def Remap_Qbits(self, qubit_map, num_qubits):
+                self.local = _LocalCircuit(qubit_map, np.eye(1 << num_qubits))
+                return self.local
+        monkeypatch.setattr(simulate, 'Circuit', Block)
+        block = Block(4)
+        circuit = MagicMock()
+        circuit.get_Gates.return_value = [block]
+        [(qubits, kernel)] = QuantumCircuitSimulator(4).gate_kernels(circuit, np.array([0.5]))
+        assert qubits == [0, 3]
+        assert block.local.qubit_map == {0: 0, 3: 1}
+        assert block.local.parameters.tolist() == [0.5]
+
+
+class _ShiftBlock:
+    """stand-in partition block: cyclic shift of the amplitudes, recording the parameters it was given"""
+    def __init__(self, start, num_parameters):
+        self.start = start
+        self.num_parameters = num_parameters
+        self.calls = []
+
+    def get_Parameter_Start_Index(self):
+        return self.start
+
+    def get_Parameter_Num(self):
+        return self.num_parameters
+
+    def apply_to(self, parameters, state):
+        self.calls.append(parameters.tolist())
+        state[:] = np.roll(state, 1, axis=0)
+
+
+def _block_circuit(num_blocks):
+    circuit = MagicMock()
+    circuit.get_Gates.return_value = [_ShiftBlock(i, 1) for i in range(num_blocks)]
+    return circuit
+
+
+@pytest.mark.unit
+class TestPartitionedSimulation:
+    """test partition-by-partition simulation and its checkpoints"""
+    def test_blocks_get_their_parameter_slices(self, monkeypatch):
+        """test apply_partitions runs only the requested blocks, each with its own parameters"""
+        monkeypatch.setattr(simulate, 'Circuit', _ShiftBlock)
+        circuit = _block_circuit(4)
+        state = np.zeros((8, 1), dtype=np.complex128)
+        state[0] = 1
+        QuantumCircuitSimulator(3).apply_partitions(circuit, np.array([0.1, 0.2, 0.3, 0.4]), state, 1, 3)
+        assert [block.calls for block in circuit.get_Gates.return_value] == [[], [[0.2]], [[0.3]], []]
+        assert state[2, 0] == 1
+
+    def test_progress_is_reported_per_partition(self, monkeypatch):
+        """test every partition reports progress when there are few of them"""
+        monkeypatch.setattr(simulate, 'Circuit', _ShiftBlock)
+        simulator = QuantumCircuitSimulator(3)
+        progress = []
+        with simulate.SharedArrayPool() as pool, simulate.StageWorker() as worker:
+            handle = pool.allocate((8, 1), np.complex128)
+            simulate.simulate_partitions_in_worker(worker, simulator, _block_circuit(5), np.zeros(5), handle, on_progress=lambda done, total: progress.append((done, total)))
+            assert simulate.attach(handle)[5, 0] == 1
+        assert progress == [(i, 5) for i in range(1, 6)]
+
+    def test_interrupted_run_resumes_from_checkpoint(self, monkeypatch, tmp_path):
+        """test a rerun continues after the last checkpoint and removes it once complete"""
+        monkeypatch.setattr(simulate, 'Circuit', _ShiftBlock)
+        simulator = QuantumCircuitSimulator(3)
+        def interrupt(done, total):
+            if done == 5:
+                raise KeyboardInterrupt
+        with simulate.SharedArrayPool() as pool, simulate.StageWorker() as worker:
+            handle = pool.allocate((8, 1), np.complex128)
+            with pytest.raises(KeyboardInterrupt):
+                simulate.simulate_partitions_in_worker(worker, simulator, _block_circuit(7), np.zeros(7), handle, on_progress=interrupt, checkpoint_every=2, checkpoint_dir=str(tmp_path), fingerprint='run')
+            assert sorted(path.name for path in tmp_path.iterdir()) == ['run.4.npy', 'run.json']
+            circuit = _block_circuit(7)
+            resumed = simulate.simulate_partitions_in_worker(worker, simulator, circuit, np.zeros(7), handle, checkpoint_every=2, checkpoint_dir=str(tmp_path), fingerprint='run')
+            assert resumed == 4
+            assert [len(block.calls) for block in circuit.get_Gates.return_value] == [0, 0, 0, 0, 1, 1, 1]
+            assert simulate.attach(handle)[7, 0] == 1
+        assert list(tmp_path.iterdir()) == []
+
+    def test_fingerprint_covers_parameters_and_keys(self):
+        """test the fingerprint is stable and changes with parameters or partitioning keys"""
+        gate = MagicMock()
+        gate.get_Name.return_value = 'RZ'
+        gate.get_Target_Qbit.return_value = 0
+        gate.get_Control_Qbit.return_value = -1
+        gate.get_Involved_Qbits.return_value = [0]
+        circuit = MagicMock()
+        circuit.get_Qbit_Num.return_value = 2
+        circuit.get_Gates.return_value = [gate]
+        base = simulate.circuit_fingerprint(circuit, np.array([0.5]), 'kahn', 4)
+        assert base == simulate.circuit_fingerprint(circuit, np.array([0.5]), 'kahn', 4)
+        assert base != simulate.circuit_fingerprint(circuit, np.array([0.5 + 1e-12]), 'kahn', 4)
+        assert base != simulate.circuit_fingerprint(circuit, np.array([0.5]), 'kahn', 3)
+
+
+def _cached_circuit(num_gates):
+    circuit = MagicMock()
+    circuit.get_Qbit_Num.return_value = 3
+    circuit.get_Gates.return_value = [MagicMock() for _ in range(num_gates)]
+    return circuit
+
+
+@pytest.mark.unit
+class TestPartitionCache:
+    """test the disk cache of partition assignments"""
+    def test_round_trip_and_coverage_check(self, tmp_path):
+        """test stored assignments come back, and ones not covering every gate are neither stored nor loaded"""
+        simulate.store_partition_assignments(str(tmp_path), 'a', [[0, 2], [1]], 3)
+        assert simulate.load_partition_assignments(str(tmp_path), 'a', 3) == [[0, 2], [1]]
+        assert simulate.load_partition_assignments(str(tmp_path), 'a', 4) is None
+        assert simulate.load_partition_assignments(str(tmp_path), 'b', 3) is None
+        simulate.store_partition_assignments(str(tmp_path), 'c', [[0, 0], [1]], 3)
+        assert not (tmp_path / 'c.json').exists()
+
+    def test_qubit_sets_of_the_same_size_keep_their_own_arrays(self, tmp_path):
+        """test jobs measuring different qubits of one circuit store separate files and merge into one metadata"""
+        state = _ghz(2)
+        simulate.store_original_outputs(str(tmp_path), 'a', state, np.array([0.25, 0.75]), [0], 'seeded', {'1': 3})
+        simulate.store_original_outputs(str(tmp_path), 'a', state, np.array([0.6, 0.4]), [1])
+        first, second = np.zeros(2), np.zeros(2)
+        assert simulate.load_original_outputs(str(tmp_path), 'a', np.zeros_like(state), first, [0], 'seeded')['counts'] == {'1': 3}
+        assert simulate.load_original_outputs(str(tmp_path), 'a', np.zeros_like(state), second, [1])['probabilities']
+        assert np.array_equal(first, [0.25, 0.75]) and np.array_equal(second, [0.6, 0.4])
+        names = sorted(path.name for path in (tmp_path / 'a').iterdir())
+        assert len([name for name in names if name.startswith('probabilities.')]) == 2
+        assert not [name for name in names if name.endswith('.tmp')]
+
+    def test_least_recently_used_entries_are_evicted(self, tmp_path):
+        """test the cache is trimmed to its size, oldest use first, keeping entries that were just read"""
+        for i, name in enumerate(['a', 'b', 'c']):
+            simulate.store_partition_assignments(str(tmp_path), name, [[0], [1]], 2)
+            os.utime(tmp_path / f'{name}.json', (1000 + i, 1000 + i))
+        simulate.load_partition_assignments(str(tmp_path), 'a', 2)
+        entry_bytes = (tmp_path / 'a.json').stat().st_size
+        simulate.store_partition_assignments(str(tmp_path), 'd', [[0], [1]], 2, max_bytes=2 * entry_bytes)
+        assert sorted(path.name for path in tmp_path.iterdir()) == ['a.json', 'd.json']
+
+    def test_cached_partitioning_skips_the_partitioner(self, monkeypatch, tmp_path):
+        """test a repeated partitioning rebuilds from the cached assignments instead of solving again"""
+        calls = []
+        def partition_circuit(circuit, parameters, max_partition_size, strategy, qasm_file, assignments):
+            calls.append(assignments)
+            partitions = [{'original_gate_indices': [1, 0]}, {'original_gate_indices': [2]}]
+            return {'partition_info': {'partitions': partitions, 'cached': assignments is not None}}
+        simulator = QuantumCircuitSimulator(3)
+        monkeypatch.setattr(simulator, 'partition_circuit', partition_circuit)
+        monkeypatch.setattr(simulate, 'circuit_fingerprint', lambda circuit, parameters, *keys: '-'.join(map(str, keys)))
+        circuit = _cached_circuit(3)
+        first = simulate.partition_in_worker(None, simulator, circuit, np.zeros(0), 2, 'ilp', cache_dir=str(tmp_path))
+        second = simulate.partition_in_worker(None, simulator, circuit, np.zeros(0), 2, 'ilp', cache_dir=str(tmp_path))
+        simulate.partition_in_worker(None, simulator, circuit, np.zeros(0), 3, 'ilp', cache_dir=str(tmp_path))
+        assert calls == [None, [[1, 0], [2]], None]
+        assert not first['partition_info']['cached'] and second['partition_info']['cached']
+
+
+@pytest.mark.unit
+class TestOriginalCache:
+    """test the disk store of original-circuit outputs"""
+    def test_outputs_are_restored_by_qubits_and_counts_key(self, tmp_path):
+        """test the state, the probabilities of the same qubits and the counts of the same key come back"""
+        state = _ghz(2)
+        probabilities = np.array([0.5, 0.0, 0.0, 0.5])
+        simulate.store_original_outputs(str(tmp_path), 'a', state, probabilities, [0, 1], 'seeded', {'00': 3, '11': 5})
+        state_out, probabilities_out = np.zeros_like(state), np.zeros(4)
+        found = simulate.load_original_outputs(str(tmp_path), 'a', state_out, probabilities_out, [0, 1], 'seeded')
+        assert found == {'state_vector': True, 'probabilities': True, 'counts': {'00': 3, '11': 5}}
+        assert np.array_equal(state_out, state) and np.array_equal(probabilities_out, probabilities)
+        assert simulate.load_original_outputs(str(tmp_path), 'a', state_out, np.zeros(2), [1], 'seeded') == {'state_vector': True}
+        assert simulate.load_original_outputs(str(tmp_path), 'a', state_out, probabilities_out, [0, 1], None) == {'state_vector': True, 'probabilities': True}
+        assert simulate.load_original_outputs(str(tmp_path), 'a', np.zeros((4, 1), dtype=np.complex64), probabilities_out, [0, 1]) == {}
+        assert simulate.load_original_outputs(str(tmp_path), 'b', state_out, probabilities_out, [0, 1]) == {}
+
+    def test_least_recently_used_entries_are_evicted(self, tmp_path):
+        """test the store is trimmed to its size, oldest use first, and states larger than it are not stored"""
+        for i, name in enumerate(['a', 'b', 'c']):
+            simulate.store_original_outputs(str(tmp_path), name, _ghz(3))
+            os.utime(tmp_path / name / 'meta.json', (1000 + i, 1000 + i))
+        simulate.load_original_outputs(str(tmp_path), 'a', np.zeros((8, 1), dtype=np.complex128), np.zeros(1), [0])
+        entry_bytes = sum(path.stat().st_size for path in (tmp_path / 'a').iterdir())
+        simulate.store_original_outputs(str(tmp_path), 'd', _ghz(3), max_bytes=2 * entry_bytes)
+        assert sorted(path.name for path in tmp_path.iterdir()) == ['a', 'd']
+        simulate.store_original_outputs(str(tmp_path), 'e', _ghz(3), max_bytes=_ghz(3).nbytes - 1)
+        assert not (tmp_path / 'e').exists()
+
+
+class _XGate:
+    """stand-in gate: X on one qubit"""
+    def __init__(self, qubit):
+        self.qubit = qubit
+
+    def get_Parameter_Start_Index(self):
+        return 0
+
+    def get_Parameter_Num(self):
+        return 0
+
+    def get_Involved_Qbits(self):
+        return [self.qubit]
+
+
+class _GateList:
+    """stand-in segment circuit applying its X gates"""
+    def __init__(self, num_qubits):
+        self.gates = []
+
+    def add_Gate(self, gate):
+        self.gates.append(gate)
+
+    def apply_to(self, parameters, state):
+        simulator = QuantumCircuitSimulator(state.size.bit_length() - 1)
+        for gate in self.gates:
+            simulator.apply_kernel(state, [gate.qubit], simulate.PAULI_KERNELS[1])
+
+
+@pytest.mark.unit
+class TestNoise:
+    """test the trajectory noise model"""
+    def test_noise_model_per_gate(self):
+        """test channels attach to every gate of their type, aliases and nested circuits included"""
+        circuit_data = {
+            'num_qubits': 2,
+            'placed_gates': [
+                {'gate': {'name': 'H'}, 'target_qubits': [0], 'control_qubits': []},
+                {'circuit': {'gates': [{'gate': {'name': 'cx'}, 'target_qubits': [1], 'control_qubits': [0]}]}},
+                {'gate': {'name': 'CNOT'}, 'target_qubits': [0], 'control_qubits': [1]}
+            ],
+            'noise': {'gates': {'CNOT': [{'type': 'depolarizing', 'probability': 0.1}]}, 'readout': {'probability': 0.02, 'p10': 0.05}}
+        }
+        noise = get_noise_model(circuit_data)
+        assert noise['gates'] == [[], [('depolarizing', 0.1)], [('depolarizing', 0.1)]]
+        assert noise['readout'] == (0.02, 0.05)
+        assert get_noise_model({'num_qubits': 1, 'placed_gates': []}) is None
+        circuit_data['noise'] = {'gates': {'H': [{'type': 'bit_flip', 'probability': 0.1}]}}
+        with pytest.raises(ValueError):
+            get_noise_model(circuit_data)
+
+    def test_channel_branches(self):
+        """test damping decays an excited qubit, and depolarizing always applies a Pauli at probability one"""
+        simulator = QuantumCircuitSimulator(2)
+        state = np.zeros((4, 1), dtype=np.complex128)
+        state[3] = 1
+        rng = np.random.default_rng(0)
+        assert simulator.apply_noise(state, [1], [('amplitude_damping', 1.0)], rng) == 1
+        assert state[1, 0] == 1
+        assert simulator.apply_noise(state, [0], [('amplitude_damping', 0.0)], rng) == 0
+        assert simulator.apply_noise(state, [0, 1], [('depolarizing', 1.0)], rng) == 1
+        assert np.isclose(np.vdot(state, state).real, 1)
+
+    def test_no_decay_branch_stays_normalised(self):
+        """test the no-decay branch shifts weight towards |0> and keeps the norm"""
+        simulator = QuantumCircuitSimulator(1)
+        state = np.full((2, 1), np.sqrt(0.5), dtype=np.complex128)
+        rng = MagicMock()
+        rng.random.return_value = 0.99
+        simulator.apply_noise(state, [0], [('amplitude_damping', 0.5)], rng)
+        assert np.allclose(np.abs(state.ravel()) ** 2, [2 / 3, 1 / 3])
+
+    def test_readout_error_flips_bits(self):
+        """test readout errors move probability between outcomes bit by bit"""
+        simulator = QuantumCircuitSimulator(2)
+        assert simulator.apply_readout_error(np.array([1.0, 0.0, 0.0, 0.0]), p01=1.0).tolist() == [0.0, 0.0, 0.0, 1.0]
+        assert np.allclose(simulator.apply_readout_error(np.array([0.0, 1.0]), p10=0.25), [0.25, 0.75])
+
+    def test_trajectories_are_batched_and_combined(self, monkeypatch):
+        """test batches across processes add up to every trajectory and shot, reproducibly"""
+        monkeypatch.setattr(simulate, 'Circuit', _GateList)
+        simulator = QuantumCircuitSimulator(2)
+        circuit = MagicMock()
+        circuit.get_Gates.return_value = [_XGate(0), _XGate(1)]
+        noise = {'gates': [[('amplitude_damping', 1.0)], []], 'readout': (0.0, 0.0)}
+        with simulate.SharedArrayPool() as pool:
+            reference = pool.allocate((4, 1), np.complex128)
+            simulate.attach(reference)[2] = 1
+            noisy, errors = simulate.simulate_noise(simulator, circuit, np.zeros(0), noise, 7, 100, [0, 1], reference=reference, seed_sequence=np.random.SeedSequence(1), max_workers=2)
+        assert errors == []
+        assert noisy['trajectories'] == 7 and noisy['error_branches'] == 7
+        assert noisy['counts'] == {'10': 100}
+        assert noisy['fidelity'] == pytest.approx(1.0)
+
+
+@pytest.mark.unit
+class TestProgress:
+    """test the shared progress reporter"""
+    def test_stages_are_measured_and_callback_errors_ignored(self, capsys):
+        """test each reported stage opens a metrics record and a failing callback does not stop the run"""
+        def callback(stage, current, total, message):
+            raise RuntimeError("closed connection")
+        metrics = simulate.StageMetrics()
+        simulate.emit_progress("partitioning", 1, 2, "Partitioning...", progress_callback=callback, metrics=metrics)
+        simulate.emit_progress("simulating", 2, 2, progress_callback=callback, metrics=metrics)
+        metrics.finish()
+        assert [record['stage'] for record in metrics.stages] == ['partitioning', 'simulating']
+        assert "[1/2] partitioning: Partitioning..." in capsys.readouterr().out
+
+
+@pytest.mark.unit
+class TestResultStream:
+    """test the NDJSON stream written next to the result file"""
+    def test_write_metrics_are_streamed_before_completion(self, monkeypatch, tmp_path):
+        """test the result file write is measured and sent as the last metrics section of a complete stream"""
+        def run_simulation(circuit_data, on_section=None, **options):
+            on_section('num_qubits', circuit_data['num_qubits'])
+            return {'comparison': {'fidelity': 1.0}, 'partition_info': {'total_partitions': 1}, 'metrics': [{'stage': 'finalizing'}]}
+        monkeypatch.setattr(simulate, 'run_simulation', run_simulation)
+        (tmp_path / 'circuit.json').write_text('{"num_qubits": 2}')
+        stream_path = tmp_path / 'result.ndjson'
+        args = simulate.build_parser().parse_args([
+            str(tmp_path / 'circuit.json'), '--output', str(tmp_path / 'result.json'), '--stream', str(stream_path)
+        ])
+        simulate.run_job(args)
+        streamed, complete = read_result_stream(stream_path)
+        assert complete and streamed['num_qubits'] == 2
+        assert [record['stage'] for record in streamed['metrics']] == ['finalizing', 'writing_results']
+
+
+class _LoggedCircuit:
+    """stand-in circuit preparing |1...1>, logging its name to a file on every simulation (also from worker processes)"""
+    def __init__(self, log_path, name):
+        self.log_path = log_path
+        self.name = name
+
+    def apply_to(self, parameters, state):
+        with open(self.log_path, 'a') as log:
+            log.write(f"{self.name}\n")
+        state.fill(0)
+        state[-1] = 1
+
+
+def _fake_partitioning(log_path):
+    """partition_in_worker stand-in: 'slow' outlives any timeout, 'broken' raises, others give two partitions"""
+    def partition_in_worker(worker, simulator, circuit, parameters, max_partition_size, strategy, cache_dir=None, cache_bytes=0):
+        if strategy == 'slow':
+            time.sleep(60)
+        if strategy == 'broken':
+            raise ValueError("partitioner failed")
+        return {
+            'partitioned_circuit': _LoggedCircuit(log_path, strategy),
+            'partitioned_params': parameters,
+            'partition_info': {'partitions': [{'num_qubits': 2, 'num_gates': 3}, {'num_qubits': 1, 'num_gates': 1}], 'cached': False}
+        }
+    return partition_in_worker
+
+
+@pytest.mark.unit
+class TestStrategyComparison:
+    """test side-by-side strategy comparison against one original simulation"""
+    @pytest.fixture
+    def log_path(self, monkeypatch, tmp_path):
+        log_path = str(tmp_path / 'simulations.log')
+        original = _LoggedCircuit(log_path, 'original')
+        monkeypatch.setattr(simulate.CircuitConverter, 'json_to_squander', staticmethod(lambda circuit_data, gate_ids=None: (original, np.zeros(0), 0)))
+        monkeypatch.setattr(simulate, 'partition_in_worker', _fake_partitioning(log_path))
+        return log_path
+
+    def test_row_summarises_the_partitioning(self, log_path):
+        """test a strategy row scores the partitioned state against the original and sizes its partitions"""
+        simulator = QuantumCircuitSimulator(2)
+        with simulate.SharedArrayPool() as pool:
+            original = pool.allocate((4, 1), np.complex128)
+            simulate.attach(original)[3] = 1
+            row = simulate.compare_strategy(simulator, _LoggedCircuit(log_path, 'original'), np.zeros(0), 2, 'kahn', original)
+        assert row['strategy'] == 'kahn' and row['fidelity'] == pytest.approx(1.0)
+        assert row['total_partitions'] == 2 and row['partition_sizes'] == [2, 1] and row['max_partition_qubits'] == 2
+        assert row['mean_partition_gates'] == pytest.approx(2.0)
+
+    def test_rows_come_back_in_the_requested_order(self, log_path):
+        """test rows follow the requested strategies, whichever process finishes first"""
+        strategies = ['tdag', 'kahn', 'gtqcp']
+        results = simulate.run_strategy_comparison({'num_qubits': 2}, strategies, max_workers=3)
+        assert [row['strategy'] for row in results['strategies']] == strategies
+        assert all(row['fidelity'] == pytest.approx(1.0) for row in results['strategies'])
+        assert results['errors'] == []
+
+    def test_failed_strategies_give_error_rows_without_stopping_the_others(self, log_path):
+        """test a timed out and a raising strategy each get an error row while the rest still succeed"""
+        strategies = ['kahn', 'slow', 'broken', 'tdag']
+        results = simulate.run_strategy_comparison({'num_qubits': 2}, strategies, simulation_timeout=2, max_workers=4)
+        rows = results['strategies']
+        assert [row['strategy'] for row in rows] == strategies
+        assert rows[1]['timeout'] is True and 'error' in rows[1]
+        assert 'partitioner failed' in rows[2]['error'] and 'timeout' not in rows[2]
+        assert rows[0]['fidelity'] == pytest.approx(1.0) and rows[3]['fidelity'] == pytest.approx(1.0)
+        assert [error['stage'] for error in results['errors']] == ['strategy_slow', 'strategy_broken']
+
+    def test_original_is_simulated_once(self, log_path):
+        """test every strategy is scored against the same original state, simulated a single time"""
+        simulate.run_strategy_comparison({'num_qubits': 2}, ['kahn', 'tdag', 'gtqcp'], simulation_timeout=30, max_workers=2)
+        with open(log_path) as log:
+            simulations = log.read().split()
+        assert simulations.count('original') == 1
+        assert sorted(simulations) == ['gtqcp', 'kahn', 'original', 'tdag']
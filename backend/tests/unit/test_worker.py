@@ -0,0 +1,130 @@
+"""simulation worker unit tests - shared memory handles and timeout supervision"""
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+import numpy as np
+
+# worker.py runs on the SQUANDER host next to simulate.py and imports its sibling modules by name
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'app' / 'services'))
+
+from worker import SharedArrayPool, StageWorker, TimeoutError, attach, on_shared, run_concurrently
+
+
+def _fill(out: np.ndarray, value: float) -> np.ndarray:
+    out[:] = value
+    return out
+
+
+def _total(values: np.ndarray) -> float:
+    return float(values.sum())
+
+
+def _sleep(seconds: float) -> int:
+    time.sleep(seconds)
+    return os.getpid()
+
+
+def _fail():
+    raise ValueError("stage failed")
+
+
+@pytest.mark.unit
+class TestSharedArrays:
+    """test shared array handles"""
+    def test_allocate_returns_view_with_shape_and_dtype(self):
+        """test allocated handle attaches to an array of the requested layout"""
+        with SharedArrayPool() as pool:
+            handle = pool.allocate((8, 1), np.complex128)
+            view = attach(handle)
+            assert view.shape == (8, 1)
+            assert view.dtype == np.complex128
+
+    def test_on_shared_writes_in_place_and_drops_array_result(self):
+        """test on_shared swaps handles for views and keeps array results in shared memory"""
+        with SharedArrayPool() as pool:
+            handle = pool.allocate((4,), np.float64)
+            assert on_shared(_fill, handle, 2.5) is None
+            assert attach(handle).tolist() == [2.5] * 4
+            assert on_shared(_total, handle) == 10.0
+
+
+@pytest.mark.unit
+class TestStageWorker:
+    """test the persistent timeout-supervised worker"""
+    def test_without_timeout_runs_in_process(self):
+        """test stages without timeout run inline"""
+        with StageWorker() as worker:
+            assert worker.run(_sleep, args=(0,)) == os.getpid()
+
+    def test_worker_is_reused_between_stages(self):
+        """test consecutive stages run in the same child process"""
+        with StageWorker() as worker:
+            first = worker.run(_sleep, args=(0,), timeout_seconds=5)
+            second = worker.run(_sleep, args=(0,), timeout_seconds=5)
+            assert first == second
+            assert first != os.getpid()
+
+    def test_stage_writes_shared_memory_in_worker(self):
+        """test the worker writes results into parent-owned shared blocks"""
+        with SharedArrayPool() as pool, StageWorker() as worker:
+            handle = pool.allocate((16,), np.float64)
+            worker.run(on_shared, args=(_fill, handle, 1.0), timeout_seconds=5)
+            assert attach(handle).sum() == 16.0
+
+    def test_timeout_kills_and_respawns_worker(self):
+        """test a timed-out worker is replaced by a fresh process"""
+        with StageWorker() as worker:
+            first = worker.run(_sleep, args=(0,), timeout_seconds=5)
+            with pytest.raises(TimeoutError):
+                worker.run(_sleep, args=(5,), timeout_seconds=1)
+            second = worker.run(_sleep, args=(0,), timeout_seconds=5)
+            assert second != first
+
+    def test_stage_errors_are_reraised(self):
+        """test exceptions raised in the worker propagate to the caller"""
+        with StageWorker() as worker:
+            with pytest.raises(ValueError, match="stage failed"):
+                worker.run(_fail, timeout_seconds=5)
+
+    def test_worker_usage_is_recorded(self):
+        """test every stage run in the child reports its CPU time and peak RSS growth"""
+        with StageWorker() as worker:
+            worker.run(_sleep, args=(0,), timeout_seconds=5)
+            with pytest.raises(ValueError):
+                worker.run(_fail, timeout_seconds=5)
+            assert len(worker.usage) == 2
+            assert worker.usage[0]['wall_seconds'] >= 0
+            assert set(worker.usage[1]) == {'wall_seconds', 'cpu_seconds', 'peak_rss_delta'}
+
+
+@pytest.mark.unit
+class TestRunConcurrently:
+    """test independent tasks running side by side"""
+    def test_results_come_back_in_task_order(self):
+        """test every task runs in its own process and results keep task order"""
+        outcomes = run_concurrently([(_sleep, (0.2,), {}), (_sleep, (0,), {})], timeout_seconds=5)
+        assert [status for status, _ in outcomes] == ['success', 'success']
+        assert os.getpid() not in [pid for _, pid in outcomes]
+        assert outcomes[0][1] != outcomes[1][1]
+
+    def test_timeout_and_error_stay_per_task(self):
+        """test a slow or failing task does not affect the others"""
+        start = time.monotonic()
+        outcomes = run_concurrently([(_sleep, (5,), {}), (_fail, (), {}), (_sleep, (0,), {})], timeout_seconds=1, max_workers=3)
+        assert time.monotonic() - start < 4
+        assert outcomes[0][0] == 'timeout'
+        assert outcomes[1][0] == 'error'
+        assert str(outcomes[1][1]) == "stage failed"
+        assert outcomes[2][0] == 'success'
+
+    def test_tasks_read_shared_memory(self):
+        """test concurrent tasks see parent-owned shared blocks"""
+        with SharedArrayPool() as pool:
+            handle = pool.allocate((8,), np.float64)
+            attach(handle)[:] = 1.0
+            outcomes = run_concurrently([(on_shared, (_total, handle), {})] * 2, max_workers=1)
+            assert outcomes == [('success', 8.0), ('success', 8.0)]
+
@@ -42,8 +42,8 @@ export function ResultsPanel({ circuitId, partitionResult, simulationResults }:
     const fidelity = results?.comparison?.fidelity;
     const originalCounts = results?.original?.counts;
     const partitionedCounts = results?.partitioned?.counts;
-    const originalProbs = results?.original?.probabilities;
-    const partitionedProbs = results?.partitioned?.probabilities;
+    const originalProbs = results?.original?.probabilities ?? results?.original?.sparse_probabilities;
+    const partitionedProbs = results?.partitioned?.probabilities ?? results?.partitioned?.sparse_probabilities;
     const originalDensity = results?.original?.density_matrix;
     const partitionedDensity = results?.partitioned?.density_matrix;
     const originalEntropy = results?.original?.entropy_scaling;
@@ -2,16 +2,20 @@ import { useMemo, memo } from 'react';
 import Plot from 'react-plotly.js';
 import { Card, CardContent } from '@/components/ui/card';
 import { useTheme } from 'next-themes';
+import type { SparseProbabilities } from '@/types';
 
 interface ProbabilityComparisonProps {
-    probabilitiesOriginal: number[];
-    probabilitiesPartitioned: number[];
+    probabilitiesOriginal: number[] | SparseProbabilities;
+    probabilitiesPartitioned: number[] | SparseProbabilities;
     maxStates?: number;
     plotId?: string;
     maxPartitionSize?: number;
     strategy?: string;
 }
 
+const isSparse = (probabilities: number[] | SparseProbabilities): probabilities is SparseProbabilities =>
+    !Array.isArray(probabilities) && probabilities !== null && typeof probabilities === 'object' && Array.isArray(probabilities.indices);
+
 export const ProbabilityComparison = memo(function ProbabilityComparison({
     probabilitiesOriginal,
     probabilitiesPartitioned,
@@ -24,45 +28,58 @@ export const ProbabilityComparison = memo(function ProbabilityComparison({
     const isDark = theme === 'dark';
 
     const data = useMemo(() => {
-        // Ensure probability arrays are arrays
-        let originalArray: number[];
-        if (Array.isArray(probabilitiesOriginal)) {
-            originalArray = probabilitiesOriginal;
-        } else if (typeof probabilitiesOriginal === 'object' && probabilitiesOriginal !== null) {
-            console.warn('[ProbabilityComparison] probabilitiesOriginal is not an array, attempting conversion:', probabilitiesOriginal);
-            originalArray = Object.values(probabilitiesOriginal);
+        let combined: { idx: number; original: number; partitioned: number; max: number }[];
+        let numOutcomes: number;
+        if (isSparse(probabilitiesOriginal) && isSparse(probabilitiesPartitioned)) {
+            // sparse results list the same outcome indices for both circuits
+            numOutcomes = probabilitiesOriginal.num_outcomes;
+            combined = probabilitiesOriginal.indices.map((idx, i) => {
+                const original = probabilitiesOriginal.values[i] ?? 0;
+                const partitioned = probabilitiesPartitioned.values[i] ?? 0;
+                return { idx, original, partitioned, max: Math.max(original, partitioned) };
+            });
         } else {
-            console.error('[ProbabilityComparison] Invalid probabilitiesOriginal format:', probabilitiesOriginal);
-            return [];
-        }
+            // Ensure probability arrays are arrays
+            let originalArray: number[];
+            if (Array.isArray(probabilitiesOriginal)) {
+                originalArray = probabilitiesOriginal;
+            } else if (typeof probabilitiesOriginal === 'object' && probabilitiesOriginal !== null) {
+                console.warn('[ProbabilityComparison] probabilitiesOriginal is not an array, attempting conversion:', probabilitiesOriginal);
+                originalArray = Object.values(probabilitiesOriginal);
+            } else {
+                console.error('[ProbabilityComparison] Invalid probabilitiesOriginal format:', probabilitiesOriginal);
+                return [];
+            }
 
-        let partitionedArray: number[];
-        if (Array.isArray(probabilitiesPartitioned)) {
-            partitionedArray = probabilitiesPartitioned;
-        } else if (typeof probabilitiesPartitioned === 'object' && probabilitiesPartitioned !== null) {
-            console.warn('[ProbabilityComparison] probabilitiesPartitioned is not an array, attempting conversion:', probabilitiesPartitioned);
-            partitionedArray = Object.values(probabilitiesPartitioned);
-        } else {
-            console.error('[ProbabilityComparison] Invalid probabilitiesPartitioned format:', probabilitiesPartitioned);
-            return [];
-        }
+            let partitionedArray: number[];
+            if (Array.isArray(probabilitiesPartitioned)) {
+                partitionedArray = probabilitiesPartitioned;
+            } else if (typeof probabilitiesPartitioned === 'object' && probabilitiesPartitioned !== null) {
+                console.warn('[ProbabilityComparison] probabilitiesPartitioned is not an array, attempting conversion:', probabilitiesPartitioned);
+                partitionedArray = Object.values(probabilitiesPartitioned);
+            } else {
+                console.error('[ProbabilityComparison] Invalid probabilitiesPartitioned format:', probabilitiesPartitioned);
+                return [];
+            }
 
-        // Find top N states by probability (from either circuit)
-        const combined = originalArray.map((prob, idx) => ({
-            idx,
-            original: prob,
-            partitioned: typeof partitionedArray[idx] === 'number' ? partitionedArray[idx] : Number(partitionedArray[idx] || 0),
-            max: Math.max(
-                prob,
-                typeof partitionedArray[idx] === 'number' ? partitionedArray[idx] : Number(partitionedArray[idx] || 0)
-            )
-        }));
+            // Find top N states by probability (from either circuit)
+            numOutcomes = originalArray.length;
+            combined = originalArray.map((prob, idx) => ({
+                idx,
+                original: prob,
+                partitioned: typeof partitionedArray[idx] === 'number' ? partitionedArray[idx] : Number(partitionedArray[idx] || 0),
+                max: Math.max(
+                    prob,
+                    typeof partitionedArray[idx] === 'number' ? partitionedArray[idx] : Number(partitionedArray[idx] || 0)
+                )
+            }));
+        }
 
         const topStates = combined
             .sort((a, b) => b.max - a.max)
             .slice(0, maxStates);
 
-        const stateLabels = topStates.map(s => `|${s.idx.toString(2).padStart(Math.ceil(Math.log2(originalArray.length)), '0')}⟩`);
+        const stateLabels = topStates.map(s => `|${s.idx.toString(2).padStart(Math.ceil(Math.log2(numOutcomes)), '0')}⟩`);
 
         return [
             {
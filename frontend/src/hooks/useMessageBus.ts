@@ -33,13 +33,15 @@ export function broadcastMessage(message: Message) {
         store.setJobError(jobId, message.message || 'Unknown error');
     } else if (type === 'cancelled') {
         store.dequeueJob(jobId);
-    } else if (['phase', 'log', 'complete'].includes(type)) {
+    } else if (['phase', 'log', 'partial', 'complete'].includes(type)) {
         const update = {
-            type: type as 'phase' | 'log' | 'complete',
+            type: type as 'phase' | 'log' | 'partial' | 'complete',
             phase: message.phase,
             message: message.message,
             progress: message.progress,
             result: message.result,
+            section: message.section as string | undefined,
+            data: message.data,
             timestamp: Date.now()
         };
         store.addUpdate(jobId, update);
@@ -1,7 +1,7 @@
 import { api } from './client';
 import type { Gate } from '@/features/gates/types';
 import type { Circuit } from '@/features/circuit/types';
-import type { SerializedGate, PartitionResponse, ImportQasmResponse } from '@/types';
+import type { SerializedGate, PartitionResponse, ImportQasmResponse, Observable, NoiseModel } from '@/types';
 import { GATE_DEFINITIONS } from '@/features/gates/constants';
 
 const GATE_LOOKUP = new Map(
@@ -105,9 +105,25 @@ export const circuitsApi = {
             simulation_timeout?: number;
             compute_density_matrix?: boolean;
             compute_entropy?: boolean;
+            seed?: number;
+            density_qubits?: number[];
+            max_density_qubits?: number;
+            output_mode?: 'dense' | 'sparse';
+            top_k?: number;
+            probability_threshold?: number;
+            output_precision?: 'double' | 'single';
+            memory_budget?: number | 'auto';
+            simulation_precision?: 'double' | 'single';
+            precision_check?: boolean;
+            checkpoint_every?: number;
+            noise_trajectories?: number;
+            shard_qubits?: number;
+            stream_results?: boolean;
         },
         strategy?: string,
-        sessionId?: string
+        sessionId?: string,
+        observables?: Observable[],
+        noise?: NoiseModel
     ): Promise<PartitionResponse> => {
         const serializedGates = placedGates
             .slice()
@@ -120,6 +136,8 @@ export const circuitsApi = {
                 num_qubits: numQubits,
                 placed_gates: serializedGates,
                 measurements,
+                observables,
+                noise,
                 options,
                 strategy: strategy || 'kahn',
                 session_id: sessionId,
@@ -63,11 +63,14 @@ export interface ImportQasmResponse {
 
 // incremental update from a running job
 export interface JobUpdate {
-  type: 'phase' | 'log' | 'complete' | 'error';
+  type: 'phase' | 'log' | 'partial' | 'complete' | 'error';
   phase?: string;
   message?: string;
   progress?: number;
   result?: Record<string, unknown>;
+  // partial: a top-level SimulationResults key that is ready before the job completes, and its value
+  section?: string;
+  data?: unknown;
   timestamp?: number;
 }
 
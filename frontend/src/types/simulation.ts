@@ -21,28 +21,61 @@ export interface PartitionInfo {
   max_partition_size: number;
   total_partitions: number;
   partitions: Partition[];
+  cached?: boolean;
 }
 
 // complex matrix representation with real and imaginary components
 export interface DensityMatrix {
   real: number[][] | null;
   imag: number[][] | null;
+  qubits?: number[];
 }
 
 // entropy data for subsystem size analysis
 export interface EntropyScaling {
   subsystem_size: number;
   entropy: number;
+  von_neumann_entropy?: number;
+}
+
+// probabilities of selected outcomes in (index, value) form
+export interface SparseProbabilities {
+  indices: number[];
+  values: number[];
+  num_outcomes: number;
+  retained_probability?: number;
+}
+
+// weighted Pauli string, e.g. { coefficient: 0.5, pauli: "X0 Z2" }; "" is the identity
+export interface PauliTerm {
+  coefficient: number;
+  pauli: string;
+}
+
+// observable given as a sum of weighted Pauli strings
+export interface Observable {
+  name: string;
+  terms: PauliTerm[];
+}
+
+// exact expectation value of an observable on the final state
+export interface ObservableValue {
+  name: string;
+  expectation: number;
 }
 
 // quantum state representation with various measurement outputs
 export interface QuantumState {
   state_vector?: number[][];
   probabilities?: number[];
+  sparse_probabilities?: SparseProbabilities;
   counts?: Record<string, number>;
   density_matrix?: DensityMatrix;
   entropy_scaling?: EntropyScaling[];
+  observables?: ObservableValue[];
   unitary?: number[][] | null;
+  // original state only: outputs reused from an earlier run of the same gates and parameters
+  cached?: Array<'state_vector' | 'probabilities' | 'counts' | 'precision_check'>;
 }
 
 // comparison metrics between original and partitioned simulations
@@ -50,6 +83,38 @@ export interface SimulationComparison {
   fidelity?: number;
   probability_difference?: number[];
   max_difference?: number;
+  total_variation_distance?: number;
+  hellinger_distance?: number;
+  kl_divergence?: number;
+}
+
+// noise channel attached to a gate type; depolarizing takes a probability, amplitude damping a gamma
+export interface NoiseChannel {
+  type: 'depolarizing' | 'amplitude_damping';
+  probability?: number;
+  gamma?: number;
+}
+
+// channels per gate name applied after every such gate, and readout bit-flip probabilities
+export interface NoiseModel {
+  gates?: Record<string, NoiseChannel[]>;
+  readout?: {
+    probability?: number;
+    p01?: number;
+    p10?: number;
+  };
+}
+
+// Monte-Carlo trajectory results of the noise model
+export interface NoisyResults {
+  trajectories: number;
+  num_shots: number;
+  counts: Record<string, number>;
+  probabilities?: number[];
+  sparse_probabilities?: SparseProbabilities;
+  fidelity?: number;
+  error_branches: number;
+  comparison?: SimulationComparison;
 }
 
 // error information from simulation execution
@@ -57,17 +122,61 @@ export interface SimulationError {
   stage: string;
   error: string;
   timeout?: boolean;
+  // partitioned simulation: checkpoint a rerun resumes from, or the partitions it resumed after
+  checkpoint?: string;
+  resumed?: number;
+}
+
+// pre-flight memory and runtime estimate, with the stages downgraded to fit the memory budget
+export interface ResourceEstimate {
+  peak_bytes: number;
+  estimated_seconds: number;
+  memory_budget?: number | null;
+  downgrades: string[];
+}
+
+// state vector precision, with the double precision spot-check of single precision runs
+export interface SimulationPrecision {
+  simulation: 'double' | 'single';
+  backend?: 'squander' | 'numpy';
+  check?: {
+    fidelity: number;
+    max_amplitude_error: number;
+  };
+}
+
+// resource usage of one pipeline stage
+export interface StageMetric {
+  stage: string;
+  wall_seconds: number;
+  cpu_seconds: number;
+  peak_rss_delta?: number | null;
+  array_bytes: number;
+}
+
+// state vector shards of the partitioned simulation and the qubit swaps between them
+export interface ShardingInfo {
+  shards: number;
+  workers: number;
+  steps: number;
+  shard_swaps: number;
 }
 
 // complete simulation results including states and comparison data
 export interface SimulationResults {
   num_qubits?: number;
   num_shots?: number;
+  measured_qubits?: number[];
   circuit_name?: string;
   errors?: SimulationError[];
   partition_info?: PartitionInfo;
   original?: QuantumState;
   partitioned?: QuantumState;
   comparison?: SimulationComparison;
+  noisy?: NoisyResults;
+  sharding?: ShardingInfo;
+  precision?: SimulationPrecision;
+  resource_estimate?: ResourceEstimate;
+  metrics?: StageMetric[];
   timestamp?: number;
 }
\ No newline at end of file
@@ -1,6 +1,8 @@
 from .gate import Gate
 from .circuit import Circuit
 from .interfaces import Operation
+from .commutation import CommutationTable
+from . import codec
 
 try:
     from importlib.metadata import version
@@ -8,7 +10,7 @@ try:
 except Exception:
     __version__ = "unknown"
 
-__all__ = ['Gate', 'Circuit', 'Operation']
+__all__ = ['Gate', 'Circuit', 'Operation', 'CommutationTable', 'codec']
 
 def hello():
     print(f"Hello from QubitKit {__version__}!")
\ No newline at end of file
@@ -0,0 +1,177 @@
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+# positional chunks are split in two once an insert grows them past this size
+MAX_CHUNK = 512
+# key-indexed chunks hold 1 << KEY_SHIFT consecutive keys
+KEY_SHIFT = 9
+KEY_MASK = (1 << KEY_SHIFT) - 1
+
+class ChunkedList:
+    """
+    List stored as a spine of chunks, with copy-on-write forks.
+    fork() is O(1): both lists share the spine until one of them writes, which copies the spine
+    (one reference per chunk) and from then on only the chunks it writes to.
+    """
+    __slots__ = ('_chunks', '_owned', '_starts', '_len', '_shared')
+
+    def __init__(self, items: Iterable[Any] = ()):
+        items = list(items)
+        self._chunks: List[List[Any]] = [items[i:i + MAX_CHUNK] for i in range(0, len(items), MAX_CHUNK)]
+        self._owned: List[bool] = [True] * len(self._chunks)
+        # position of the first item of each chunk, rebuilt lazily and never changed in place
+        self._starts: Optional[List[int]] = None
+        self._len: int = len(items)
+        self._shared: bool = False
+
+    def fork(self) -> 'ChunkedList':
+        new_list = ChunkedList.__new__(ChunkedList)
+        new_list._chunks, new_list._owned, new_list._starts, new_list._len = self._chunks, self._owned, self._starts, self._len
+        new_list._shared = self._shared = True
+        return new_list
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[Any]:
+        for chunk in self._chunks:
+            yield from chunk
+
+    def __getitem__(self, index: int) -> Any:
+        chunk_idx, offset = self._locate(index)
+        return self._chunks[chunk_idx][offset]
+
+    def last(self) -> Any:
+        return self._chunks[-1][-1]
+
+    def append(self, item: Any):
+        if self._shared:
+            self._detach()
+        chunks = self._chunks
+        if chunks and len(chunks[-1]) < MAX_CHUNK:
+            self._writable(len(chunks) - 1).append(item)
+        else:
+            chunks.append([item])
+            self._owned.append(True)
+            self._starts = None
+        self._len += 1
+
+    def insert(self, index: int, item: Any):
+        if index >= self._len:
+            self.append(item)
+            return
+        if self._shared:
+            self._detach()
+        chunk_idx, offset = self._locate(index)
+        chunk = self._writable(chunk_idx)
+        chunk.insert(offset, item)
+        if len(chunk) > MAX_CHUNK:
+            half = len(chunk) // 2
+            self._chunks.insert(chunk_idx + 1, chunk[half:])
+            self._owned.insert(chunk_idx + 1, True)
+            del chunk[half:]
+        self._len += 1
+        self._starts = None
+
+    def pop(self, index: int) -> Any:
+        if self._shared:
+            self._detach()
+        chunk_idx, offset = self._locate(index)
+        chunk = self._writable(chunk_idx)
+        item = chunk.pop(offset)
+        if not chunk:
+            del self._chunks[chunk_idx], self._owned[chunk_idx]
+        self._len -= 1
+        self._starts = None
+        return item
+
+    def bisect_by(self, value: Any, key: Callable[[Any], Any]) -> int:
+        """:return: position of the first item with key(item) >= value, for items sorted by key"""
+        chunks = self._chunks
+        low, high = 0, len(chunks)
+        while low < high:
+            mid = (low + high) // 2
+            if key(chunks[mid][-1]) < value:
+                low = mid + 1
+            else:
+                high = mid
+        if low == len(chunks):
+            return self._len
+        chunk_idx, chunk = low, chunks[low]
+        low, high = 0, len(chunk)
+        while low < high:
+            mid = (low + high) // 2
+            if key(chunk[mid]) < value:
+                low = mid + 1
+            else:
+                high = mid
+        return self._chunk_starts()[chunk_idx] + low
+
+    def _locate(self, index: int):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("index out of range")
+        starts = self._chunk_starts()
+        chunk_idx = bisect_right(starts, index) - 1
+        return chunk_idx, index - starts[chunk_idx]
+
+    def _chunk_starts(self) -> List[int]:
+        if self._starts is None:
+            self._starts = list(accumulate((len(chunk) for chunk in self._chunks[:-1]), initial=0))
+        return self._starts
+
+    def _writable(self, chunk_idx: int) -> List[Any]:
+        if not self._owned[chunk_idx]:
+            self._chunks[chunk_idx] = list(self._chunks[chunk_idx])
+            self._owned[chunk_idx] = True
+        return self._chunks[chunk_idx]
+
+    def _detach(self):
+        self._chunks, self._owned, self._shared = list(self._chunks), [False] * len(self._chunks), False
+
+class KeyArray:
+    """
+    Values indexed by small non-negative integer keys, unset keys read as None.
+    Stored in fixed-size chunks with the same copy-on-write forks as ChunkedList
+    """
+    __slots__ = ('_chunks', '_owned', '_shared')
+
+    def __init__(self):
+        self._chunks: List[List[Any]] = []
+        self._owned: List[bool] = []
+        self._shared: bool = False
+
+    def fork(self) -> 'KeyArray':
+        new_array = KeyArray.__new__(KeyArray)
+        new_array._chunks, new_array._owned = self._chunks, self._owned
+        new_array._shared = self._shared = True
+        return new_array
+
+    def __getitem__(self, key: int) -> Any:
+        chunks, chunk_idx = self._chunks, key >> KEY_SHIFT
+        if chunk_idx < len(chunks):
+            chunk, offset = chunks[chunk_idx], key & KEY_MASK
+            if offset < len(chunk):
+                return chunk[offset]
+        return None
+
+    def __setitem__(self, key: int, value: Any):
+        if self._shared:
+            self._chunks, self._owned, self._shared = list(self._chunks), [False] * len(self._chunks), False
+        chunks, chunk_idx, offset = self._chunks, key >> KEY_SHIFT, key & KEY_MASK
+        while len(chunks) <= chunk_idx:
+            chunks.append([])
+            self._owned.append(True)
+        if not self._owned[chunk_idx]:
+            chunks[chunk_idx] = list(chunks[chunk_idx])
+            self._owned[chunk_idx] = True
+        chunk = chunks[chunk_idx]
+        if offset < len(chunk):
+            chunk[offset] = value
+            return
+        # keys are handed out in order, so this is nearly always a plain append
+        if offset > len(chunk):
+            chunk.extend([None] * (offset - len(chunk)))
+        chunk.append(value)
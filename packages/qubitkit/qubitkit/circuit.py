@@ -1,9 +1,15 @@
-from typing import List, Set, Dict, Union, Any, Optional
+from typing import List, Set, Dict, Union, Any, Optional, Iterable, Iterator, Tuple
+from collections.abc import Sequence
 from enum import IntEnum
 import copy
 
 from .gate import Gate
 from .interfaces import Operation
+from .commutation import CommutationTable
+from .chunked import ChunkedList, KeyArray
+
+# spacing of the order labels given to appended gates, inserts take the midpoint of their neighbours' labels
+ORDER_GAP = 1 << 32
 
 class DepthResolution(IntEnum):
     # sub-circuit as single units (1 time unit)
@@ -15,16 +21,50 @@ class DepthResolution(IntEnum):
     # sub-circuit can start as soon as it has enough "depth budget" from its internal complexity
     FRAGMENTED = 2
 
+class GateView(Sequence):
+    """
+    Read-only view of a circuit's gates in order.
+    A sub-circuit read through it stops being shared with clones first, since the caller may edit it in place
+    """
+    __slots__ = ('_circuit',)
+
+    def __init__(self, circuit: 'Circuit'):
+        self._circuit = circuit
+
+    def __len__(self) -> int:
+        return len(self._circuit._keys)
+
+    def __getitem__(self, index):
+        circuit = self._circuit
+        if isinstance(index, slice):
+            return [circuit._read_gate(gate_key) for gate_key in list(circuit._keys)[index]]
+        return circuit._read_gate(circuit._keys[index])
+
+    def __iter__(self) -> Iterator[Union[Gate, 'Circuit']]:
+        circuit = self._circuit
+        for gate_key in circuit._keys:
+            yield circuit._read_gate(gate_key)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, tuple, GateView)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
 class Circuit(Operation):
     def __init__(
         self,
         num_qubits: int,
         name: str = "Circuit",
-        source_library: str = ""
+        source_library: str = "",
+        commutation_table: Optional[CommutationTable] = None
     ):
         super().__init__()
         self.name: str = name
-        self.gates: List[Union[Gate, Circuit]] = []
         self.metadata: Dict[str, Any] = {}
         self.source_library = source_library
         # private
@@ -39,14 +79,39 @@ class Circuit(Operation):
         self._g: Dict[int, Set[int]] = {}
         self._rg: Dict[int, Set[int]] = {}
         self._s: Set[int] = set()
-        # Depth cache separate by lists for each resolution
-        self._gate_depths: List[List[Optional[int]]] = [[], [], []]
+        # Gates are stored under stable keys and edges (gate._parent_keys / gate._child_keys) hold keys, so an edit
+        # does not renumber the gates after it. The gate order is the key list, sorted by the keys' order labels.
+        # Everything per gate is chunked copy-on-write storage, a clone shares it until either side writes
+        self._keys: ChunkedList = ChunkedList()
+        self._gate_of: KeyArray = KeyArray()
+        self._label_of: KeyArray = KeyArray()
+        self._next_key: int = 0
+        self._gates_view: GateView = GateView(self)
+        # keys of the gates on each wire, in gate order, so an edit finds its wire neighbours by bisection
+        self._wires: Dict[int, ChunkedList] = {}
+        # wires each gate is indexed on, a sub-circuit edited in place may span other qubits by now
+        self._wires_of: KeyArray = KeyArray()
+        # Dependency rule: gates sharing a wire are ordered, unless the table proves they commute
+        self._commutation_table: Optional[CommutationTable] = commutation_table
+        # per-wire state after the last gate, wires changed by an edit are recomputed from their index on the next append
+        self._wire_state_cache: Dict[int, Any] = {}
+        self._stale_wires: Set[int] = set()
+        # Depth cache separate by arrays for each resolution, indexed by gate key
+        self._gate_depths: List[KeyArray] = [KeyArray(), KeyArray(), KeyArray()]
+        # gate positions grouped by depth, rebuilt from the depth cache when drawing
         self._depth_gates: List[Dict[int, List[int]]] = [{}, {}, {}]
+        self._depth_gates_dirty: bool = False
         self._num_circuits: int = 0
+        # Copy-on-write: keys of the gate objects this circuit may edit in place, None while no clone shares any
+        self._cow_owned: Optional[Set[int]] = None
+
+    @property
+    def gates(self) -> GateView:
+        return self._gates_view
 
     @property
     def num_gates_flat(self) -> int:
-        return len(self.gates)
+        return len(self._keys)
 
     @property
     def depth(self) -> int:
@@ -62,16 +127,29 @@ class Circuit(Operation):
 
     @num_qubits.setter
     def num_qubits(self, value):
+        if value == self._num_qubits:
+            return
         self._num_qubits = value
-        for gate in self.gates:
-            gate.num_qubits = value
+        for gate_key in self._keys:
+            self._cow_touch(gate_key)
+            self._gate_of[gate_key].num_qubits = value
+
+    @property
+    def commutation_table(self) -> Optional[CommutationTable]:
+        return self._commutation_table
+
+    @commutation_table.setter
+    def commutation_table(self, value: Optional[CommutationTable]):
+        """Switch the dependency rule and rebuild the DAG"""
+        self._commutation_table = value
+        self._rebuild_dag()
 
     @property
     def qubits(self) -> Set[int]:
         if not self._qubits_dirty:
             return self._qubits
         self._qubits.clear()
-        for gate in self.gates:
+        for gate in self._iter_gates():
             if isinstance(gate, Circuit):
                 inner_qubits = gate.qubits
                 self._qubits.update(inner_qubits)
@@ -81,71 +159,146 @@ class Circuit(Operation):
         return self._qubits
 
     def add_gate(self, gate: Union[Gate, 'Circuit']):
-        involved_qubits = gate.qubits
-        if involved_qubits:
-            max_qubit = max(involved_qubits)
-            if max_qubit >= self.num_qubits:
-                raise IndexError(f"Qubit index {max_qubit} out of bounds for {self.num_qubits}-qubit Circuit")
+        self.extend([gate])
+
+    def extend(self, gates: Iterable[Union[Gate, 'Circuit']], clone: bool = True):
+        """
+        Append gates in a single pass, linking each gate to the last gates on each of its wires
+        :param gates: gates to append, consumed lazily so a generator can be streamed in
+        :param clone: clone every gate before appending (as add_gate does), otherwise take ownership
+        """
+        wire_state = self._wire_state()
+        keys, gate_of, label_of, wires = self._keys, self._gate_of, self._label_of, self._wires
+        for gate in gates:
+            self._check_qubits(gate)
+            gate.num_qubits = self.num_qubits
+            if clone:
+                gate = gate.clone()
+            gate_key = self._next_key
+            self._next_key += 1
+            gate_of[gate_key] = gate
+            self._wires_of[gate_key] = gate_wires = tuple(gate.qubits)
+            gate._parent_keys = list(self._advance_wires(wire_state, gate_key))
+            gate._child_keys = []
+            if gate._parent_keys:
+                self._cow_touch(*gate._parent_keys)
+                for parent_key in gate._parent_keys:
+                    gate_of[parent_key]._child_keys.append(gate_key)
+            label_of[gate_key] = label_of[keys.last()] + ORDER_GAP if len(keys) else 0
+            keys.append(gate_key)
+            for qubit in gate_wires:
+                if qubit not in wires:
+                    wires[qubit] = ChunkedList()
+                wires[qubit].append(gate_key)
+            self._cow_own(gate_key)
+            if isinstance(gate, Circuit):
+                self._num_circuits += 1
+        self._qubits_dirty, self._dependencies_dirty, self._depth_dirty = True, True, True
+
+    def insert_gate(self, gate_idx: int, gate: Union[Gate, 'Circuit']):
+        """
+        Insert a gate before position gate_idx. Its wire neighbours are found by bisection in the per-wire indexes,
+        then only the dependencies next to it on its wires are recomputed (see _repair) and the depth cache
+        of its downstream cone is invalidated; the gates after it keep their keys, so they are neither
+        renumbered nor copied out of a copy-on-write clone
+        :param gate_idx: position of the new gate, num_gates_flat appends
+        :param gate: gate to insert (cloned, as in add_gate)
+        """
+        if gate_idx > self.num_gates_flat or gate_idx < 0:
+            raise IndexError(f"gate index {gate_idx} out of bounds")
+        self._check_qubits(gate)
         gate.num_qubits = self.num_qubits
-        self.gates.append(gate.clone())
-        self._determine_parents(self.num_gates_flat - 1)
-        if isinstance(gate, Circuit):
+        new_gate = gate.clone()
+        gate_key = self._insert_slot(gate_idx, new_gate)
+        self._repair(self._add_to_wires(gate_key), [gate_key])
+        if isinstance(new_gate, Circuit):
             self._num_circuits += 1
         self._qubits_dirty, self._dependencies_dirty, self._depth_dirty = True, True, True
 
-    def get_depth(self, gate_idx: int, depth_resolution: DepthResolution = DepthResolution.ATOMIC) -> int:
+    def remove_gate(self, gate_idx: int) -> Union[Gate, 'Circuit']:
+        """
+        Remove the gate at position gate_idx, recomputing only the dependencies next to it on its wires
+        and invalidating the depth cache of its downstream cone; only the gate and its neighbours are touched
+        :return: the removed gate, detached from the DAG
+        """
         if gate_idx >= self.num_gates_flat or gate_idx < 0:
             raise IndexError(f"gate index {gate_idx} out of bounds")
-
-        cache = self._gate_depths[depth_resolution]
-        num_cache = len(cache)
-        while num_cache <= gate_idx:
-            cache.append(None)
-            num_cache += 1
-
-        if self._gate_depths[depth_resolution][gate_idx] is not None:
-            return self._gate_depths[depth_resolution][gate_idx]
-
-        gate = self.gates[gate_idx]
-        gate_depth = 1 + max(self.get_depth(p_idx, depth_resolution) for p_idx in gate.parents) if gate.parents else 1
-
+        gate_key = self._keys[gate_idx]
+        self._cow_touch(gate_key)
+        gate = self._gate_of[gate_key]
+        self._invalidate_depths([gate_key])
+        for parent_key in gate._parent_keys.copy():
+            self._remove_edge(parent_key, gate_key)
+        for child_key in gate._child_keys.copy():
+            self._remove_edge(gate_key, child_key)
+        edits = self._remove_from_wires(gate_key)
+        self._remove_slot(gate_idx)
+        self._repair(edits)
         if isinstance(gate, Circuit):
-            if depth_resolution == DepthResolution.EXPANDED or depth_resolution == DepthResolution.FRAGMENTED: # TODO: Remove extra condition
-                gate_depth = gate_depth - 1 + gate.get_circ_depth(DepthResolution.EXPANDED)
-            elif depth_resolution == DepthResolution.FRAGMENTED:
-                # TODO: Fragment sub-circuit
-                pass
-
-        self._gate_depths[depth_resolution][gate_idx] = gate_depth
+            self._num_circuits -= 1
+        self._qubits_dirty, self._dependencies_dirty, self._depth_dirty = True, True, True
+        return gate
 
-        depth_gates = self._depth_gates[depth_resolution]
-        if gate_depth not in depth_gates:
-            depth_gates[gate_depth] = []
-        depth_gates[gate_depth].append(gate_idx)
+    def replace_gate(self, gate_idx: int, gate: Union[Gate, 'Circuit']) -> Union[Gate, 'Circuit']:
+        """
+        Replace the gate at position gate_idx. A gate on the same wires takes over the existing edges,
+        which are then repaired locally in case it commutes differently,
+        otherwise the old gate is removed and the new one inserted in its place
+        :return: the replaced gate
+        """
+        if gate_idx >= self.num_gates_flat or gate_idx < 0:
+            raise IndexError(f"gate index {gate_idx} out of bounds")
+        self._check_qubits(gate)
+        gate_key = self._keys[gate_idx]
+        old_gate = self._gate_of[gate_key]
+        if set(gate.qubits) != set(old_gate.qubits):
+            old_gate = self.remove_gate(gate_idx)
+            self.insert_gate(gate_idx, gate)
+            return old_gate
+        gate.num_qubits = self.num_qubits
+        new_gate = gate.clone()
+        new_gate._parent_keys, new_gate._child_keys = old_gate._parent_keys.copy(), old_gate._child_keys.copy()
+        self._gate_of[gate_key] = new_gate
+        self._cow_own(gate_key)
+        self._repair({qubit: self._wire_position(qubit, gate_key) for qubit in self._wires_of[gate_key]}, [gate_key])
+        self._num_circuits += isinstance(new_gate, Circuit) - isinstance(old_gate, Circuit)
+        self._qubits_dirty, self._dependencies_dirty, self._depth_dirty = True, True, True
+        return old_gate
 
-        return gate_depth
+    def get_depth(self, gate_idx: int, depth_resolution: DepthResolution = DepthResolution.ATOMIC) -> int:
+        if gate_idx >= self.num_gates_flat or gate_idx < 0:
+            raise IndexError(f"gate index {gate_idx} out of bounds")
+        return self._key_depth(self._keys[gate_idx], depth_resolution)
 
     def get_circ_depth(self, depth_resolution: DepthResolution = DepthResolution.ATOMIC) -> int:
-        if not self.gates:
+        if not self.num_gates_flat:
             return 0
-        return max(self.get_depth(i, depth_resolution) for i in range(len(self.gates)))
+        return max(self._key_depth(gate_key, depth_resolution) for gate_key in self._keys)
 
     def get_parents(self, gate_idx: int) -> List[int]:
-        return self.gates[gate_idx].parents if 0 <= gate_idx < self.num_gates_flat else []
+        """:return: positions of the gates this gate depends on, latest first"""
+        if not 0 <= gate_idx < self.num_gates_flat:
+            return []
+        return sorted(self._positions(self._gate_of[self._keys[gate_idx]]._parent_keys), reverse=True)
 
     def get_children(self, gate_idx: int) -> List[int]:
-        return self.gates[gate_idx].children if 0 <= gate_idx < self.num_gates_flat else []
+        """:return: positions of the gates depending on this gate, earliest first"""
+        if not 0 <= gate_idx < self.num_gates_flat:
+            return []
+        return sorted(self._positions(self._gate_of[self._keys[gate_idx]]._child_keys))
 
     def build_dependencies(self, use_cache: bool = True):
         if use_cache and not self._dependencies_dirty:
             return
 
-        self._gate_dict = {i: gate for i, gate in enumerate(self.gates)}
-        self._gate_qubit = {i: gate.qubits for i, gate in enumerate(self.gates)}
+        position = self._position_map()
+        self._gate_dict = {i: gate for i, gate in enumerate(self._iter_gates())}
+        self._gate_qubit = {i: gate.qubits for i, gate in self._gate_dict.items()}
         self._g, self._rg = {i: set() for i in self._gate_dict}, {i: set() for i in self._gate_dict}
 
-        for gate_idx in self._gate_dict:
-            for child_idx in self.gates[gate_idx].children:
+        for gate_idx, gate in self._gate_dict.items():
+            for child_key in gate._child_keys:
+                child_idx = position[child_key]
                 self._g[gate_idx].add(child_idx)
                 self._rg[child_idx].add(gate_idx)
 
@@ -156,39 +309,69 @@ class Circuit(Operation):
         flat_circuit = Circuit(
             self.num_qubits,
             self.name,
-            self.source_library
+            self.source_library,
+            self._commutation_table
         )
-        for gate in self.gates:
+        for gate in self._iter_gates():
             if isinstance(gate, Circuit) and repeat != 0:
                 flat_circuit_inner = gate.flatten(-1 if repeat < 0 else repeat - 1)
-                for inner_gate in flat_circuit_inner.gates:
+                for inner_gate in flat_circuit_inner._iter_gates():
                     flat_circuit.add_gate(inner_gate.clone())
             else:
                 flat_circuit.add_gate(gate.clone())
         flat_circuit.metadata = self.metadata.copy()
+        flat_circuit.id = self.id
         return flat_circuit
 
     def clone(self):
+        """
+        Copy-on-write clone in O(1): gate storage, DAG and depth caches are shared with this circuit
+        until either side writes, then only the chunks and gates being written are copied.
+        A shared sub-circuit is cloned the same way when either side reads it through gates. Metadata is deep-copied.
+        """
         new_circuit = Circuit(
             self.num_qubits,
             self.name,
-            self.source_library
+            self.source_library,
+            self._commutation_table
         )
-        for gate in self.gates:
-            new_gate = gate.clone()
-            new_circuit.add_gate(new_gate)
+        new_circuit._keys, new_circuit._gate_of, new_circuit._label_of = self._keys.fork(), self._gate_of.fork(), self._label_of.fork()
+        new_circuit._next_key = self._next_key
+        new_circuit._gate_depths = [cache.fork() for cache in self._gate_depths]
+        new_circuit._depth_gates_dirty = True
+        new_circuit._wires = {qubit: wire.fork() for qubit, wire in self._wires.items()}
+        new_circuit._wires_of = self._wires_of.fork()
+        new_circuit._wire_state_cache = self._copy_wire_state()
         new_circuit.metadata = copy.deepcopy(self.metadata)
+        new_circuit.id = self.id
+        new_circuit._num_circuits = self._num_circuits
+        new_circuit._qubits = set(self._qubits)
+        new_circuit._qubits_dirty = self._qubits_dirty
+        # dependency maps are rebuilt rather than mutated, so sharing them is safe
+        new_circuit._gate_dict, new_circuit._gate_qubit = self._gate_dict, self._gate_qubit
+        new_circuit._g, new_circuit._rg, new_circuit._s = self._g, self._rg, self._s
+        new_circuit._dependencies_dirty = self._dependencies_dirty
+        # gate objects owned by this circuit so far are now visible to the clone as well
+        self._cow_owned, new_circuit._cow_owned = set(), set()
         return new_circuit
 
     def draw(self, show_depth: bool = True, depth_resolution: DepthResolution = DepthResolution.ATOMIC) -> str:
+        keys = list(self._keys)
+        gates = [self._gate_of[gate_key] for gate_key in keys]
+        position = {gate_key: i for i, gate_key in enumerate(keys)}
+        if show_depth:
+            for gate_key in keys:
+                self._key_depth(gate_key, depth_resolution)
+            depths = [self._gate_depths[depth_resolution][gate_key] for gate_key in keys]
+
         def get_position_and_width(gate_idx, gate):
             if show_depth:
-                depth = self._gate_depths[depth_resolution][gate_idx]
+                depth = depths[gate_idx]
                 start_col = sum(max_col_widths.get(d, 0) + 1 for d in range(1, depth)) if depth > 1 else 0
                 if isinstance(gate, Circuit):
                     start_depth = (
-                        max(self._gate_depths[depth_resolution][p] for p in gate.parents) + 1
-                    ) if gate.parents else 1
+                        max(depths[position[p]] for p in gate._parent_keys) + 1
+                    ) if gate._parent_keys else 1
 
                     if depth_resolution == DepthResolution.ATOMIC:
                         start_col = sum(max_col_widths[d] + 1 for d in range(1, depth)) if depth > 1 else 0
@@ -200,7 +383,7 @@ class Circuit(Operation):
                 else:
                     width = max_col_widths[depth]
             else:
-                start_col = sum(len(self.gates[i].name) + 1 for i in range(gate_idx))
+                start_col = sum(len(gates[i].name) + 1 for i in range(gate_idx))
                 width = len(gate.name) + (2 if isinstance(gate, Circuit) else 0)
             return start_col, width
         def draw_gate(gate_idx, gate):
@@ -233,25 +416,24 @@ class Circuit(Operation):
                         lines[qubit][start_col + k] = char
 
         if show_depth:
-            for i in range(len(self.gates)):
-                if i >= len(self._gate_depths[depth_resolution]) or self._gate_depths[depth_resolution][i] is None:
-                    self.get_depth(i, depth_resolution)
+            if self._depth_gates_dirty:
+                self._rebuild_depth_gates()
             max_col_widths = {
                 depth: max(
-                    len(self.gates[idx].name) + (2 if isinstance(self.gates[idx], Circuit) else 0)
+                    len(gates[idx].name) + (2 if isinstance(gates[idx], Circuit) else 0)
                     for idx in gate_indices
                 ) for depth, gate_indices in self._depth_gates[depth_resolution].items()
             }
             num_cols = sum(width+1 for width in max_col_widths.values()) - 1
         else:
-            num_cols = 2*self._num_circuits + sum(len(gate.name)+1 for gate in self.gates) - 1
+            num_cols = 2*self._num_circuits + sum(len(gate.name)+1 for gate in gates) - 1
 
         lines = [["─"] * num_cols for _ in range(self.num_qubits)]
 
-        for i, gate in enumerate(self.gates):
+        for i, gate in enumerate(gates):
             if isinstance(gate, Circuit):
                 draw_circuit(i, gate)
-        for i, gate in enumerate(self.gates):
+        for i, gate in enumerate(gates):
             if not isinstance(gate, Circuit):
                 draw_gate(i, gate)
 
@@ -262,24 +444,335 @@ class Circuit(Operation):
             for i, row in enumerate(lines)
         ) + "\n"
 
-    def _determine_parents(self, gate_idx: int):
-        gate = self.gates[gate_idx]
-        gate_qubits = set(gate.qubits)
-        # clear gate parents
-        gate.parents.clear()
-        for prev_gate in self.gates[:gate_idx]:
-            if gate_idx in prev_gate.children:
-                prev_gate.children.remove(gate_idx)
-        for i in range(gate_idx-1, -1, -1):
-            parent_gate = self.gates[i]
-            parent_qubits = parent_gate.qubits
-            qubit_overlap = gate_qubits & parent_qubits
-            if qubit_overlap:
-                gate.parents.append(i)
-                parent_gate.children.append(gate_idx)
-                gate_qubits -= qubit_overlap
-                if not gate_qubits:
+    def _iter_gates(self) -> Iterator[Union[Gate, 'Circuit']]:
+        """gates in order, as stored: for reading only, a shared gate must not be edited"""
+        gate_of = self._gate_of
+        for gate_key in self._keys:
+            yield gate_of[gate_key]
+
+    def _read_gate(self, gate_key: int) -> Union[Gate, 'Circuit']:
+        """a gate handed out through gates, sub-circuits are made private to this circuit first"""
+        if self._cow_owned is not None and gate_key not in self._cow_owned and isinstance(self._gate_of[gate_key], Circuit):
+            self._cow_touch(gate_key)
+        gate = self._gate_of[gate_key]
+        gate._owner = (self, gate_key)
+        return gate
+
+    def _cow_touch(self, *gate_keys: int):
+        """Replace each gate (given by key) that may still be shared with a clone by a private copy"""
+        owned = self._cow_owned
+        if owned is None:
+            return
+        for gate_key in gate_keys:
+            if gate_key in owned:
+                continue
+            gate = self._gate_of[gate_key]
+            new_gate = gate.clone()
+            new_gate._parent_keys, new_gate._child_keys = gate._parent_keys.copy(), gate._child_keys.copy()
+            new_gate.partition_id = gate.partition_id
+            self._gate_of[gate_key] = new_gate
+            owned.add(gate_key)
+
+    def _cow_own(self, gate_key: int):
+        """Mark a gate created by this circuit as private"""
+        if self._cow_owned is not None:
+            self._cow_owned.add(gate_key)
+
+    def _position(self, gate_key: int) -> int:
+        """:return: the current position of the gate with the given key, in O(log n)"""
+        label_of = self._label_of
+        return self._keys.bisect_by(label_of[gate_key], label_of.__getitem__)
+
+    def _positions(self, gate_keys: Iterable[int]) -> List[int]:
+        return [self._position(gate_key) for gate_key in gate_keys]
+
+    def _position_map(self) -> Dict[int, int]:
+        """:return: key -> position of every gate, for passes over the whole circuit"""
+        return {gate_key: i for i, gate_key in enumerate(self._keys)}
+
+    def _insert_slot(self, gate_idx: int, gate: Union[Gate, 'Circuit']) -> int:
+        """
+        Put a gate at position gate_idx with a fresh key, labelled between its neighbours
+        Only when repeated inserts have used up a gap are labels respaced, which touches no gate
+        :return: the key of the gate
+        """
+        keys, label_of = self._keys, self._label_of
+        if gate_idx == len(keys):
+            label = label_of[keys.last()] + ORDER_GAP if len(keys) else 0
+        elif gate_idx == 0:
+            label = label_of[keys[0]] - ORDER_GAP
+        else:
+            if label_of[keys[gate_idx]] - label_of[keys[gate_idx - 1]] < 2:
+                self._respace_labels(gate_idx)
+            label = (label_of[keys[gate_idx - 1]] + label_of[keys[gate_idx]]) // 2
+        gate_key = self._next_key
+        self._next_key += 1
+        keys.insert(gate_idx, gate_key)
+        label_of[gate_key] = label
+        self._gate_of[gate_key] = gate
+        self._cow_own(gate_key)
+        return gate_key
+
+    def _respace_labels(self, gate_idx: int):
+        """Spread out the labels of the smallest window around gate_idx that leaves room between every pair"""
+        keys, label_of, last = self._keys, self._label_of, len(self._keys) - 1
+        low, high, width = gate_idx - 1, gate_idx, 1
+        while label_of[keys[high]] - label_of[keys[low]] < 4 * (high - low):
+            if low == 0 and high == last:
+                for i, gate_key in enumerate(keys):
+                    label_of[gate_key] = i * ORDER_GAP
+                return
+            low, high, width = max(low - width, 0), min(high + width, last), width * 2
+        low_label = label_of[keys[low]]
+        step = (label_of[keys[high]] - low_label) // (high - low)
+        for i in range(low + 1, high):
+            label_of[keys[i]] = low_label + (i - low) * step
+
+    def _remove_slot(self, gate_idx: int):
+        gate_key = self._keys.pop(gate_idx)
+        self._gate_of[gate_key] = None
+        self._label_of[gate_key] = None
+        for cache in self._gate_depths:
+            if cache[gate_key] is not None:
+                cache[gate_key] = None
+        if self._cow_owned is not None:
+            self._cow_owned.discard(gate_key)
+        self._depth_gates_dirty = True
+
+    def _check_qubits(self, gate: Union[Gate, 'Circuit']):
+        involved_qubits = gate.qubits
+        if involved_qubits:
+            max_qubit = max(involved_qubits)
+            if max_qubit >= self.num_qubits:
+                raise IndexError(f"Qubit index {max_qubit} out of bounds for {self.num_qubits}-qubit Circuit")
+
+    def _wire_position(self, qubit: int, gate_key: int) -> int:
+        """:return: the position of the gate on the given wire, or where it would go, in O(log n)"""
+        label_of = self._label_of
+        return self._wires[qubit].bisect_by(label_of[gate_key], label_of.__getitem__)
+
+    def _add_to_wires(self, gate_key: int) -> Dict[int, int]:
+        """:return: the position the gate takes on each of its wires"""
+        edits = {}
+        self._wires_of[gate_key] = tuple(self._gate_of[gate_key].qubits)
+        for qubit in self._wires_of[gate_key]:
+            if qubit not in self._wires:
+                self._wires[qubit] = ChunkedList()
+            edits[qubit] = self._wire_position(qubit, gate_key)
+            self._wires[qubit].insert(edits[qubit], gate_key)
+        return edits
+
+    def _remove_from_wires(self, gate_key: int) -> Dict[int, int]:
+        """:return: the position the gate had on each of its wires, now taken by the gate after it"""
+        edits = {}
+        for qubit in self._wires_of[gate_key]:
+            edits[qubit] = self._wire_position(qubit, gate_key)
+            self._wires[qubit].pop(edits[qubit])
+        self._wires_of[gate_key] = None
+        return edits
+
+    def _wire_basis(self, gate_key: int, qubit: int):
+        """:return: the basis the gate is diagonal in on the wire, None when it commutes with nothing there"""
+        if self._commutation_table is None:
+            return None
+        return self._commutation_table.wire_basis(self._gate_of[gate_key], qubit)
+
+    def _wire_groups(self, qubit: int, wire_idx: int, num_groups: int) -> List[int]:
+        """
+        :return: keys of the gates on the wire from wire_idx to the end of the num_groups-th group starting there
+        A group is a maximal run of gates diagonal in the same basis, a gate with no basis is a group of its own
+        """
+        wire, gate_keys, group_basis, groups = self._wires[qubit], [], None, 0
+        for i in range(wire_idx, len(wire)):
+            gate_key = wire[i]
+            basis = self._wire_basis(gate_key, qubit)
+            if not gate_keys or basis is None or basis != group_basis:
+                groups += 1
+                if groups > num_groups:
                     break
+            group_basis = basis
+            gate_keys.append(gate_key)
+        return gate_keys
+
+    def _group_before(self, qubit: int, wire_idx: int) -> List[int]:
+        """:return: keys of the group ending at wire position wire_idx (inclusive), latest first"""
+        wire, gate_keys = self._wires[qubit], []
+        if wire_idx < 0:
+            return gate_keys
+        basis = self._wire_basis(wire[wire_idx], qubit)
+        gate_keys.append(wire[wire_idx])
+        wire_idx -= 1
+        while basis is not None and wire_idx >= 0 and self._wire_basis(wire[wire_idx], qubit) == basis:
+            gate_keys.append(wire[wire_idx])
+            wire_idx -= 1
+        return gate_keys
+
+    def _group_parents(self, gate_key: int) -> Set[int]:
+        """:return: keys of the gates the gate depends on: on each of its wires, the group before its own"""
+        parents = set()
+        for qubit in self._wires_of[gate_key]:
+            wire_idx = self._wire_position(qubit, gate_key) - 1
+            basis = self._wire_basis(gate_key, qubit)
+            wire = self._wires[qubit]
+            while basis is not None and wire_idx >= 0 and self._wire_basis(wire[wire_idx], qubit) == basis:
+                wire_idx -= 1
+            parents.update(self._group_before(qubit, wire_idx))
+        return parents
+
+    def _repair(self, edits: Dict[int, int], edited_keys: Iterable[int] = ()):
+        """
+        Recompute the dependencies around an edit instead of rebuilding the DAG
+        An edit at wire position p can only change the grouping from p on, so the parents of the gates in the group at p
+        and the next two groups (whose parents are the group before) are recomputed and the edges diffed;
+        the depths of every gate whose parents changed and of their downstream cone are invalidated
+        :param edits: wire -> position of the edit on that wire
+        :param edited_keys: gates changed by the edit itself, invalidated even when their parents are unchanged
+        """
+        affected = set()
+        for qubit, wire_idx in edits.items():
+            affected.update(self._wire_groups(qubit, wire_idx, 3))
+        changed = set(edited_keys)
+        for gate_key in affected:
+            parents, old_parents = self._group_parents(gate_key), set(self._gate_of[gate_key]._parent_keys)
+            if parents == old_parents:
+                continue
+            changed.add(gate_key)
+            for parent_key in old_parents - parents:
+                self._remove_edge(parent_key, gate_key)
+            for parent_key in parents - old_parents:
+                self._add_edge(parent_key, gate_key)
+        self._invalidate_depths(changed)
+        self._stale_wires.update(edits)
+
+    def _add_edge(self, parent_key: int, child_key: int):
+        if child_key in self._gate_of[parent_key]._child_keys:
+            return
+        self._cow_touch(parent_key, child_key)
+        self._gate_of[parent_key]._child_keys.append(child_key)
+        self._gate_of[child_key]._parent_keys.append(parent_key)
+
+    def _remove_edge(self, parent_key: int, child_key: int):
+        self._cow_touch(parent_key, child_key)
+        self._gate_of[parent_key]._child_keys.remove(child_key)
+        self._gate_of[child_key]._parent_keys.remove(parent_key)
+
+    def _key_depth(self, gate_key: int, depth_resolution: DepthResolution) -> int:
+        cache = self._gate_depths[depth_resolution]
+        gate_depth = cache[gate_key]
+        if gate_depth is not None:
+            return gate_depth
+
+        gate = self._gate_of[gate_key]
+        gate_depth = 1 + max(self._key_depth(p_key, depth_resolution) for p_key in gate._parent_keys) if gate._parent_keys else 1
+
+        if isinstance(gate, Circuit):
+            if depth_resolution == DepthResolution.EXPANDED or depth_resolution == DepthResolution.FRAGMENTED: # TODO: Remove extra condition
+                gate_depth = gate_depth - 1 + gate.get_circ_depth(DepthResolution.EXPANDED)
+            elif depth_resolution == DepthResolution.FRAGMENTED:
+                # TODO: Fragment sub-circuit
+                pass
+
+        cache[gate_key] = gate_depth
+        self._depth_gates_dirty = True
+        return gate_depth
+
+    def _invalidate_depths(self, gate_keys: Iterable[int]):
+        """
+        Clear the cached depths of the given gates and everything downstream of them
+        A depth is only cached once its parents' are, so the walk stops at gates that have none cached
+        """
+        stack, seen = [(gate_key, True) for gate_key in gate_keys], set()
+        while stack:
+            gate_key, edited = stack.pop()
+            if gate_key in seen:
+                continue
+            seen.add(gate_key)
+            cached = False
+            for cache in self._gate_depths:
+                if cache[gate_key] is not None:
+                    cached = True
+                    cache[gate_key] = None
+            if cached or edited:
+                stack.extend((child_key, False) for child_key in self._gate_of[gate_key]._child_keys)
+        self._depth_gates_dirty = True
+
+    def _rebuild_depth_gates(self):
+        """Regroup the cached depths by depth once edits have renumbered the gates"""
+        self._depth_gates_dirty = False
+        for resolution, cache in enumerate(self._gate_depths):
+            depth_gates = {}
+            for gate_idx, gate_key in enumerate(self._keys):
+                gate_depth = cache[gate_key]
+                if gate_depth is not None:
+                    depth_gates.setdefault(gate_depth, []).append(gate_idx)
+            self._depth_gates[resolution] = depth_gates
+
+    def _wire_state(self) -> Dict[int, Any]:
+        """:return: per-wire state of the dependency rule after the last gate, kept while gates are only appended"""
+        for qubit in self._stale_wires:
+            wire = self._wires.get(qubit)
+            if not wire:
+                self._wire_state_cache.pop(qubit, None)
+            elif self._commutation_table is None:
+                self._wire_state_cache[qubit] = wire.last()
+            else:
+                group = self._group_before(qubit, len(wire) - 1)
+                prev_group = self._group_before(qubit, len(wire) - 1 - len(group))
+                self._wire_state_cache[qubit] = (self._wire_basis(group[0], qubit), group[::-1], prev_group[::-1])
+        self._stale_wires.clear()
+        return self._wire_state_cache
+
+    def _copy_wire_state(self) -> Dict[int, Any]:
+        """:return: a copy of the wire state that appending to does not change, for a clone"""
+        wire_state = self._wire_state()
+        if self._commutation_table is None:
+            return dict(wire_state)
+        return {
+            qubit: (basis, list(group), list(prev_group))
+            for qubit, (basis, group, prev_group) in wire_state.items()
+        }
+
+    def _advance_wires(self, wire_state: Dict[int, Any], gate_key: int) -> Set[int]:
+        """
+        Append a gate to the per-wire state and return the keys of the gates it depends on
+        Without a commutation table a wire only remembers its last gate.
+        With one, a wire holds the current group of gates diagonal in the same basis and the group before it:
+        a gate joining the group depends on the previous group only, any other gate closes the group
+        """
+        parents = set()
+        for qubit in self._wires_of[gate_key]:
+            if self._commutation_table is None:
+                if qubit in wire_state:
+                    parents.add(wire_state[qubit])
+                wire_state[qubit] = gate_key
+                continue
+            basis = self._wire_basis(gate_key, qubit)
+            group_basis, group, prev_group = wire_state.get(qubit, (None, [], []))
+            if basis is not None and basis == group_basis:
+                parents.update(prev_group)
+                group.append(gate_key)
+            else:
+                parents.update(group)
+                wire_state[qubit] = (basis, [gate_key], group)
+        return parents
+
+    def _rebuild_dag(self):
+        """Recompute every edge with the current dependency rule and drop the depth caches"""
+        keys = list(self._keys)
+        self._cow_touch(*keys)
+        gate_of = self._gate_of
+        wire_state = {}
+        for gate_key in keys:
+            gate = gate_of[gate_key]
+            gate._parent_keys = list(self._advance_wires(wire_state, gate_key))
+            gate._child_keys = []
+            for parent_key in gate._parent_keys:
+                gate_of[parent_key]._child_keys.append(gate_key)
+        self._wire_state_cache, self._stale_wires = wire_state, set()
+        self._gate_depths = [KeyArray(), KeyArray(), KeyArray()]
+        self._depth_gates = [{}, {}, {}]
+        self._depth_gates_dirty = False
+        self._dependencies_dirty, self._depth_dirty = True, True
 
     def __repr__(self) -> str:
         return f"{self.name}({self.num_qubits})"
@@ -290,35 +783,37 @@ class Circuit(Operation):
 
     def validate_dependencies(self):
         print(f"validating_dependencies of circuit {self.name}")
+        gates = list(self._iter_gates())
         # check 1: All parent-child relationships are bidirectional and valid
-        for i, gate in enumerate(self.gates):
-            print(f"Gate {i} ({gate.name}): parents={gate.parents}, children={gate.children}")
+        for i, gate in enumerate(gates):
+            parents, children = self.get_parents(i), self.get_children(i)
+            print(f"Gate {i} ({gate.name}): parents={parents}, children={children}")
             # check parents
-            for parent_idx in gate.parents:
-                assert 0 <= parent_idx < len(self.gates), f"Gate {i} has invalid parent index {parent_idx}"
+            for parent_idx in parents:
+                assert 0 <= parent_idx < len(gates), f"Gate {i} has invalid parent index {parent_idx}"
                 assert parent_idx < i, f"Gate {i} has parent {parent_idx} that comes after it"
-                assert i in self.gates[parent_idx].children, \
+                assert i in self.get_children(parent_idx), \
                     f"Gate {i} claims parent {parent_idx}, but parent doesn't claim it as child"
             # check children
-            for child_idx in gate.children:
-                assert 0 <= child_idx < len(self.gates), f"Gate {i} has invalid child index {child_idx}"
+            for child_idx in children:
+                assert 0 <= child_idx < len(gates), f"Gate {i} has invalid child index {child_idx}"
                 assert child_idx > i, f"Gate {i} has child {child_idx} that comes before it"
-                assert i in self.gates[child_idx].parents, \
+                assert i in self.get_parents(child_idx), \
                     f"Gate {i} claims child {child_idx}, but child doesn't claim it as parent"
         # Check 2: dependencies make sense based on qubit overlap
-        for i, gate in enumerate(self.gates):
+        for i, gate in enumerate(gates):
             gate_qubits = gate.qubits
-            for parent_idx in gate.parents:
-                parent_qubits = self.gates[parent_idx].qubits
+            for parent_idx in self.get_parents(i):
+                parent_qubits = gates[parent_idx].qubits
                 assert gate_qubits & parent_qubits, f"Gate {i} and parent {parent_idx} have no qubit overlap"
         # Check 3: no duplicate relationships
-        for i, gate in enumerate(self.gates):
-            assert len(gate.parents) == len(set(gate.parents)), f"Gate {i} has duplicate parents"
-            assert len(gate.children) == len(set(gate.children)), f"Gate {i} has duplicate children"
+        for i, gate in enumerate(gates):
+            assert len(gate._parent_keys) == len(set(gate._parent_keys)), f"Gate {i} has duplicate parents"
+            assert len(gate._child_keys) == len(set(gate._child_keys)), f"Gate {i} has duplicate children"
 
-        for i, gate in enumerate(self.gates):
+        for i, gate in enumerate(gates):
             if isinstance(gate, Circuit):
-                print(f"  Validating sub-circuit: {gate.name}, {gate.parents}, {gate.children}")
+                print(f"  Validating sub-circuit: {gate.name}, {self.get_parents(i)}, {self.get_children(i)}")
                 gate.validate_dependencies()
 
         print(f"✓ Circuit {self.name} passes all dependency checks")
@@ -0,0 +1,101 @@
+from typing import List, Dict, Any, Iterable, Iterator, Union
+
+from .gate import Gate
+from .circuit import Circuit, DepthResolution
+
+# Circuit.metadata keys used to keep the frontend fields that qubitkit has no attribute for
+START_QUBIT_KEY = "start_qubit"
+CIRCUIT_ID_KEY = "circuit_id"
+
+def from_placed_gates(
+    placed_gates: Iterable[Dict[str, Any]],
+    num_qubits: int,
+    name: str = "Circuit",
+    start_qubit: int = 0
+) -> Circuit:
+    """
+    Build a Circuit from the frontend's placed_gates (SerializedGate) JSON
+    Gates are decoded and linked into the DAG in one streaming pass, nested circuits recursively
+    :param placed_gates: list (or any iterable) of serialized gates, in placement order
+    :param num_qubits: number of qubits of the outer circuit
+    :param name: name of the resulting circuit
+    :param start_qubit: absolute offset applied to every qubit index (used for nested circuits)
+    :return: circuit whose gates keep the serialized ids
+    """
+    circuit = Circuit(num_qubits, name)
+    circuit.extend(_decode_gates(placed_gates, num_qubits, start_qubit), clone=False)
+    return circuit
+
+def from_json(circuit_data: Dict[str, Any], name: str = "Circuit") -> Circuit:
+    """
+    Build a Circuit from the backend circuit payload ({'num_qubits': ..., 'placed_gates': [...]})
+    """
+    return from_placed_gates(circuit_data['placed_gates'], circuit_data['num_qubits'], name)
+
+def to_placed_gates(circuit: Circuit, start_qubit: int = 0) -> List[Dict[str, Any]]:
+    """
+    Serialize a Circuit to the frontend's placed_gates JSON
+    :param circuit: circuit to serialize
+    :param start_qubit: absolute offset of the circuit, subtracted from every qubit index
+    :return: list of serialized gates, depth is the gate's column in the circuit (0-based)
+    """
+    return list(_encode_gates(circuit, start_qubit))
+
+def to_json(circuit: Circuit) -> Dict[str, Any]:
+    """
+    Serialize a Circuit to the backend circuit payload ({'num_qubits': ..., 'placed_gates': [...]})
+    """
+    return {
+        'num_qubits': circuit.num_qubits,
+        'placed_gates': to_placed_gates(circuit)
+    }
+
+def _decode_gates(placed_gates: Iterable[Dict[str, Any]], num_qubits: int, start_qubit: int) -> Iterator[Union[Gate, Circuit]]:
+    for gate_info in placed_gates:
+        if gate_info.get('circuit'):
+            circuit_info = gate_info['circuit']
+            c_start_qubit = gate_info.get('start_qubit') or 0
+            sub_circuit = from_placed_gates(
+                circuit_info.get('gates', []),
+                num_qubits,
+                circuit_info.get('symbol') or "Circuit",
+                start_qubit + c_start_qubit
+            )
+            sub_circuit.id = gate_info.get('id')
+            sub_circuit.metadata[START_QUBIT_KEY] = c_start_qubit
+            sub_circuit.metadata[CIRCUIT_ID_KEY] = circuit_info.get('id')
+            yield sub_circuit
+            continue
+        gate = Gate(
+            gate_info['gate']['name'],
+            [q + start_qubit for q in gate_info.get('target_qubits') or []],
+            [q + start_qubit for q in gate_info.get('control_qubits') or []],
+            {f"p{i}": value for i, value in enumerate(gate_info.get('parameters') or [])}
+        )
+        gate.id = gate_info.get('id')
+        yield gate
+
+def _encode_gates(circuit: Circuit, start_qubit: int) -> Iterator[Dict[str, Any]]:
+    for i, gate in enumerate(circuit.gates):
+        depth = circuit.get_depth(i, DepthResolution.ATOMIC) - 1
+        if isinstance(gate, Circuit):
+            c_start_qubit = gate.metadata.get(START_QUBIT_KEY, 0)
+            yield {
+                'id': gate.id,
+                'depth': depth,
+                'circuit': {
+                    'id': gate.metadata.get(CIRCUIT_ID_KEY, gate.id),
+                    'symbol': gate.name,
+                    'gates': to_placed_gates(gate, start_qubit + c_start_qubit)
+                },
+                'start_qubit': c_start_qubit
+            }
+            continue
+        yield {
+            'id': gate.id,
+            'depth': depth,
+            'gate': {'name': gate.name},
+            'target_qubits': [q - start_qubit for q in gate.target_qubits],
+            'control_qubits': [q - start_qubit for q in gate.control_qubits],
+            'parameters': list(gate.parameters.values())
+        }
@@ -0,0 +1,66 @@
+from typing import Dict, Optional, Tuple
+
+from .interfaces import Operation
+
+Z_BASIS = "Z"
+X_BASIS = "X"
+
+class CommutationTable:
+    """
+    Basis in which each gate acts diagonally on each of its wires.
+    Two operations provably commute when, on every wire they share, both are diagonal in the same basis,
+    e.g. Z/RZ/CZ/CP/T on a common wire, or CNOTs sharing only a control (Z) or only a target (X)
+    """
+    # gate name -> (basis on target wires, basis on control wires), None if not diagonal in either basis
+    DEFAULT_BASES: Dict[str, Tuple[Optional[str], Optional[str]]] = {
+        'Z': (Z_BASIS, None),
+        'S': (Z_BASIS, None),
+        'SDG': (Z_BASIS, None),
+        'T': (Z_BASIS, None),
+        'TDG': (Z_BASIS, None),
+        'RZ': (Z_BASIS, None),
+        'U1': (Z_BASIS, None),
+        'P': (Z_BASIS, None),
+        'X': (X_BASIS, None),
+        'SX': (X_BASIS, None),
+        'RX': (X_BASIS, None),
+        'CNOT': (X_BASIS, Z_BASIS),
+        'CX': (X_BASIS, Z_BASIS),
+        'CRX': (X_BASIS, Z_BASIS),
+        'CCX': (X_BASIS, Z_BASIS),
+        'TOFFOLI': (X_BASIS, Z_BASIS),
+        'CZ': (Z_BASIS, Z_BASIS),
+        'CP': (Z_BASIS, Z_BASIS),
+        'CRZ': (Z_BASIS, Z_BASIS),
+        'CSWAP': (None, Z_BASIS),
+        'CH': (None, Z_BASIS),
+        'CRY': (None, Z_BASIS),
+    }
+
+    def __init__(self, bases: Optional[Dict[str, Tuple[Optional[str], Optional[str]]]] = None):
+        """
+        :param bases: entries added to (or overriding) the default table, keyed by gate name
+        """
+        self.bases: Dict[str, Tuple[Optional[str], Optional[str]]] = dict(self.DEFAULT_BASES)
+        for name, wire_bases in (bases or {}).items():
+            self.register(name, *wire_bases)
+
+    def register(self, name: str, target_basis: Optional[str], control_basis: Optional[str] = Z_BASIS):
+        self.bases[name.upper()] = (target_basis, control_basis)
+
+    def wire_basis(self, operation: Operation, qubit: int) -> Optional[str]:
+        """
+        :return: basis in which the operation is diagonal on the given wire, None if unknown
+        Sub-circuits and unregistered gates never commute
+        """
+        wire_bases = self.bases.get(operation.name.upper())
+        if wire_bases is None or not hasattr(operation, "control_qubits"):
+            return None
+        return wire_bases[1] if qubit in operation.control_qubits else wire_bases[0]
+
+    def commute(self, a: Operation, b: Operation) -> bool:
+        for qubit in a.qubits & b.qubits:
+            basis = self.wire_basis(a, qubit)
+            if basis is None or basis != self.wire_basis(b, qubit):
+                return False
+        return True
@@ -84,6 +84,7 @@ class Gate(Operation):
         )
         new_gate.num_qubits = self.num_qubits
         new_gate.source_library = self.source_library
+        new_gate.id = self.id
         return new_gate
 
 
@@ -1,15 +1,35 @@
 from abc import ABC, abstractmethod
-from typing import List, Set
+from typing import Any, List, Optional, Set, Tuple
 
 class Operation(ABC):
     def __init__(self):
         self.name: str = ""
-        # DAG info
-        self.parents: List[int] = []
-        self.children: List[int] = []
+        self.id: Optional[str] = None
+        # DAG info: stable keys of the neighbouring gates, parents / children resolve them to positions
+        self._parent_keys: List[int] = []
+        self._child_keys: List[int] = []
+        # (circuit, key) the gate was last read from, copy-on-write clones may share one gate object
+        self._owner: Optional[Tuple[Any, int]] = None
         self.partition_id: int = -1
         self.source_library: str = ""
 
+    @property
+    def parents(self) -> List[int]:
+        """positions of the gates this gate depends on, in the circuit it was last read from"""
+        circuit, gate_key = self._owner_entry()
+        return circuit.get_parents(circuit._position(gate_key)) if circuit is not None else []
+
+    @property
+    def children(self) -> List[int]:
+        """positions of the gates depending on this gate, in the circuit it was last read from"""
+        circuit, gate_key = self._owner_entry()
+        return circuit.get_children(circuit._position(gate_key)) if circuit is not None else []
+
+    def _owner_entry(self):
+        if self._owner is None or self._owner[0]._gate_of[self._owner[1]] is not self:
+            return None, None
+        return self._owner
+
     @property
     @abstractmethod
     def num_qubits(self) -> int:
@@ -0,0 +1,63 @@
+"""seeded random circuits for the benchmarks"""
+import random
+from functools import lru_cache
+from typing import List, Union
+
+from qubitkit import Circuit, Gate
+
+NUM_QUBITS = 16
+SINGLE_QUBIT_GATES = ["H", "X", "T", "RZ", "RX"]
+TWO_QUBIT_GATES = ["CNOT", "CZ", "CP"]
+PARAMETRIC_GATES = {"RZ", "RX", "CP"}
+
+def _random_gate(rng: random.Random, qubits: List[int]) -> Gate:
+    if len(qubits) > 1 and rng.random() < 0.5:
+        target, control = rng.sample(qubits, 2)
+        name = rng.choice(TWO_QUBIT_GATES)
+        return Gate(name, [target], [control], {"p0": rng.random()} if name in PARAMETRIC_GATES else None)
+    name = rng.choice(SINGLE_QUBIT_GATES)
+    return Gate(name, [rng.choice(qubits)], None, {"p0": rng.random()} if name in PARAMETRIC_GATES else None)
+
+def _random_sub_circuit(rng: random.Random, num_gates: int, depth: int) -> Circuit:
+    width = rng.randint(2, 5)
+    start_qubit = rng.randint(0, NUM_QUBITS - width)
+    qubits = list(range(start_qubit, start_qubit + width))
+    circuit = Circuit(NUM_QUBITS, f"block_{depth}")
+    items = []
+    remaining = num_gates
+    while remaining:
+        if depth < 2 and remaining > 4 and rng.random() < 0.1:
+            size = rng.randint(2, remaining // 2)
+            items.append(_random_sub_circuit(rng, size, depth + 1))
+            remaining -= size
+        else:
+            items.append(_random_gate(rng, qubits))
+            remaining -= 1
+    circuit.extend(items, clone=False)
+    return circuit
+
+@lru_cache(maxsize=None)
+def random_operations(num_gates: int, nested: bool = False, seed: int = 0) -> List[Union[Gate, Circuit]]:
+    """
+    Top-level operations of a random circuit with exactly num_gates leaf gates
+    Nested circuits wrap about half of the gates in sub-circuits of up to 64 gates, nested up to 3 levels
+    The result is cached, callers must not mutate it
+    """
+    rng = random.Random(seed)
+    qubits = list(range(NUM_QUBITS))
+    operations = []
+    remaining = num_gates
+    while remaining:
+        if nested and remaining > 4 and rng.random() < 0.05:
+            size = rng.randint(4, min(64, remaining))
+            operations.append(_random_sub_circuit(rng, size, 1))
+            remaining -= size
+        else:
+            operations.append(_random_gate(rng, qubits))
+            remaining -= 1
+    return operations
+
+def random_circuit(num_gates: int, nested: bool = False, seed: int = 0) -> Circuit:
+    circuit = Circuit(NUM_QUBITS, "nested" if nested else "flat")
+    circuit.extend(random_operations(num_gates, nested, seed))
+    return circuit
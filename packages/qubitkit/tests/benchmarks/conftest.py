@@ -0,0 +1,150 @@
+"""
+benchmark harness: per-operation wall time and peak memory, optionally checked against JSON baselines
+
+Wall times depend on the machine and on its load, so each case is also timed relative to a fixed
+pure-Python calibration loop run between its rounds, and only that relative time is compared
+"""
+import gc
+import json
+import math
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pytest
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+BASELINE_FILE = Path(__file__).parent / "baselines.json"
+RESULTS_FILE = Path(__file__).parent.parent / "fixtures" / "benchmark_results.json"
+# absolute slack so that timer-resolution cases and small allocations do not flap
+MIN_RELATIVE_REGRESSION = 0.25  # calibration loops, a few milliseconds
+MIN_MEMORY_REGRESSION = 64 * 1024
+
+_results: Dict[str, Dict[str, float]] = {}
+
+def pytest_generate_tests(metafunc):
+    if "num_gates" in metafunc.fixturenames:
+        max_gates = metafunc.config.getoption("--bench-max-gates")
+        metafunc.parametrize("num_gates", [n for n in SIZES if n <= max_gates])
+
+def _load_baselines() -> Dict[str, Dict[str, float]]:
+    if BASELINE_FILE.exists():
+        return json.loads(BASELINE_FILE.read_text())
+    return {}
+
+def _calibration_loop() -> int:
+    """the kind of work Circuit does per gate: small objects, per-wire dict state, sets and list appends"""
+    wire_state: Dict[int, int] = {}
+    edges: List[Tuple[int, ...]] = []
+    for i in range(20_000):
+        qubits = {i % 16, (i * 7) % 16}
+        parents = {wire_state[q] for q in qubits if q in wire_state}
+        for q in qubits:
+            wire_state[q] = i
+        edges.append(tuple(sorted(parents)))
+    return len(edges)
+
+def _timed(target: Callable, *args) -> float:
+    gc.collect()
+    # like timeit, keep collector pauses out of the timed region
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        target(*args)
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+def _measure(target: Callable, setup: Optional[Callable[[], Tuple]], rounds: int) -> Tuple[float, float, int]:
+    """
+    :return: fastest wall time over the rounds, fastest calibration loop run around them,
+             and the peak traced memory of one extra round
+    """
+    times, calibration_times = [], [_timed(_calibration_loop)]
+    for _ in range(rounds):
+        args = setup() if setup else ()
+        times.append(_timed(target, *args))
+        calibration_times.append(_timed(_calibration_loop))
+    args = setup() if setup else ()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        target(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), min(calibration_times), peak
+
+class Bench:
+    """pytest-benchmark style fixture: bench(target, *args) or bench.pedantic(target, setup=...)"""
+    def __init__(self, request):
+        self.name = request.node.name
+        self.config = request.config
+        params = dict(request.node.callspec.params) if hasattr(request.node, "callspec") else {}
+        self.num_gates = params.pop("num_gates", 0)
+        # the same case across sizes, used to estimate how the operation scales
+        self.series = request.node.originalname + "".join(f"[{v}]" for v in params.values())
+
+    def __call__(self, target: Callable, *args):
+        return self.pedantic(target, setup=lambda: args)
+
+    def pedantic(self, target: Callable, setup: Optional[Callable[[], Tuple]] = None, rounds: Optional[int] = None):
+        if rounds is None:
+            rounds = 1 if self.num_gates >= 100_000 else self.config.getoption("--bench-rounds")
+        elapsed, calibration, peak = _measure(target, setup, rounds)
+        relative = elapsed / calibration
+        _results[self.name] = {
+            "series": self.series, "num_gates": self.num_gates,
+            "time_s": elapsed, "relative_time": relative, "peak_bytes": peak,
+        }
+        if self.config.getoption("--bench-save") or not self.config.getoption("--bench-check"):
+            return
+        baseline = _load_baselines().get(self.name)
+        if baseline is None:
+            return
+        threshold = 1 + self.config.getoption("--bench-threshold")
+        regressions = []
+        if relative > baseline["relative_time"] * threshold and relative - baseline["relative_time"] > MIN_RELATIVE_REGRESSION:
+            regressions.append(
+                f"{relative:.3f} calibration loops vs baseline {baseline['relative_time']:.3f} (time {elapsed:.4f}s)"
+            )
+        if peak > baseline["peak_bytes"] * threshold and peak - baseline["peak_bytes"] > MIN_MEMORY_REGRESSION:
+            regressions.append(f"peak memory {peak} B vs baseline {baseline['peak_bytes']} B")
+        if regressions:
+            pytest.fail(f"{self.name} regressed: " + "; ".join(regressions))
+
+@pytest.fixture
+def bench(request):
+    return Bench(request)
+
+def pytest_sessionfinish(session, exitstatus):
+    if not _results:
+        return
+    RESULTS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    RESULTS_FILE.write_text(json.dumps(_results, indent=2, sort_keys=True))
+    if session.config.getoption("--bench-save"):
+        baselines = _load_baselines()
+        baselines.update(_results)
+        BASELINE_FILE.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+
+def pytest_terminal_summary(terminalreporter):
+    if not _results:
+        return
+    terminalreporter.section("qubitkit benchmarks")
+    terminalreporter.write_line(f"{'case':<48}{'time (s)':>12}{'relative':>10}{'peak (MiB)':>12}{'scaling':>9}")
+    previous = {}
+    for name in sorted(_results, key=lambda n: (_results[n]["series"], _results[n]["num_gates"])):
+        result = _results[name]
+        series = result["series"]
+        # empirical exponent k of time ~ gates^k against the previous size of the same series
+        scaling = ""
+        if series in previous:
+            prev = previous[series]
+            if prev["time_s"] > 0 and result["time_s"] > 0 and result["num_gates"] > prev["num_gates"]:
+                scaling = f"{math.log(result['time_s'] / prev['time_s']) / math.log(result['num_gates'] / prev['num_gates']):.2f}"
+        previous[series] = result
+        terminalreporter.write_line(
+            f"{name:<48}{result['time_s']:>12.4f}{result['relative_time']:>10.3f}"
+            f"{result['peak_bytes'] / 2**20:>12.2f}{scaling:>9}"
+        )
@@ -0,0 +1,58 @@
+"""scaling benchmarks of the core Circuit operations on random flat and nested circuits"""
+import pytest
+
+from qubitkit import Circuit, Gate
+from qubitkit.circuit import DepthResolution
+from .circuits import NUM_QUBITS, random_circuit, random_operations
+
+# draw lays out every gate against all depth columns before it, so it is quadratic in the gate count
+DRAW_MAX_GATES = 10_000
+
+pytestmark = pytest.mark.benchmark
+
+KINDS = pytest.mark.parametrize("nested", [False, True], ids=["flat", "nested"])
+
+@KINDS
+def test_add_gate(bench, nested, num_gates):
+    operations = random_operations(num_gates, nested)
+    def add_all(circuit):
+        for operation in operations:
+            circuit.add_gate(operation)
+    bench.pedantic(add_all, setup=lambda: (Circuit(NUM_QUBITS),))
+
+@KINDS
+def test_extend(bench, nested, num_gates):
+    operations = random_operations(num_gates, nested)
+    bench.pedantic(lambda circuit: circuit.extend(operations), setup=lambda: (Circuit(NUM_QUBITS),))
+
+@KINDS
+def test_get_circ_depth(bench, nested, num_gates):
+    bench.pedantic(lambda circuit: circuit.get_circ_depth(DepthResolution.ATOMIC), setup=lambda: (random_circuit(num_gates, nested),))
+
+@KINDS
+def test_flatten(bench, nested, num_gates):
+    circuit = random_circuit(num_gates, nested)
+    bench(circuit.flatten)
+
+@KINDS
+def test_clone(bench, nested, num_gates):
+    circuit = random_circuit(num_gates, nested)
+    bench(circuit.clone)
+
+@KINDS
+def test_clone_and_edit(bench, nested, num_gates):
+    """first mutation of a clone pays for detaching it from the source"""
+    circuit = random_circuit(num_gates, nested)
+    def clone_and_edit():
+        clone = circuit.clone()
+        clone.add_gate(Gate("H", [0]))
+        clone.remove_gate(clone.num_gates_flat // 2)
+    bench(clone_and_edit)
+
+@KINDS
+def test_draw(bench, nested, num_gates):
+    if num_gates > DRAW_MAX_GATES:
+        pytest.skip(f"draw is quadratic, benchmarked up to {DRAW_MAX_GATES} gates")
+    circuit = random_circuit(num_gates, nested)
+    circuit.get_circ_depth()
+    bench(circuit.draw)
@@ -0,0 +1,29 @@
+"""
+Command line options of the benchmark suite in tests/benchmarks (the harness lives in its conftest).
+Benchmarks carry the `benchmark` marker and are skipped unless --bench is given:
+
+    pytest tests/                                       # unit tests only
+    pytest tests/ --bench                               # benchmarks up to 1e5 gates, report only
+    pytest tests/ --bench --bench-check                 # also fail on regressions against the baselines
+    pytest tests/ --bench --bench-max-gates 1000000     # full range, up to 1e6 gates
+    pytest tests/ --bench --bench-save                  # record the measurements as new baselines
+"""
+import pytest
+
+def pytest_addoption(parser):
+    # options can only be added by the conftest at the root of the test tree
+    group = parser.getgroup("qubitkit benchmarks")
+    group.addoption("--bench", action="store_true", help="run the benchmarks (tests marked `benchmark`)")
+    group.addoption("--bench-check", action="store_true", help="fail benchmarks that regress past the baselines")
+    group.addoption("--bench-max-gates", type=int, default=100_000, help="largest circuit size to benchmark (default: 100000)")
+    group.addoption("--bench-rounds", type=int, default=5, help="timed rounds per case below 1e5 gates, the fastest counts (default: 5)")
+    group.addoption("--bench-threshold", type=float, default=1.0, help="allowed relative regression against the baseline (default: 1.0, i.e. twice as slow)")
+    group.addoption("--bench-save", action="store_true", help="store the measurements as the new baselines")
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--bench"):
+        return
+    skip = pytest.mark.skip(reason="benchmark, run with --bench")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,217 @@
+"""insert_gate / remove_gate / replace_gate keep the DAG and depth caches equal to a fresh build"""
+import random
+
+import pytest
+
+from qubitkit import Circuit, Gate
+from qubitkit.circuit import DepthResolution
+from .benchmarks.circuits import NUM_QUBITS, random_operations
+
+def _rebuilt(circuit: Circuit) -> Circuit:
+    fresh = Circuit(circuit.num_qubits, circuit.name, commutation_table=circuit.commutation_table)
+    fresh.extend(circuit.gates)
+    return fresh
+
+def _dag(circuit: Circuit):
+    return [(circuit.get_parents(i), circuit.get_children(i)) for i in range(circuit.num_gates_flat)]
+
+def _depths(circuit: Circuit):
+    return [
+        [circuit.get_depth(i, resolution) for i in range(circuit.num_gates_flat)]
+        for resolution in (DepthResolution.ATOMIC, DepthResolution.EXPANDED)
+    ]
+
+def assert_matches_rebuild(circuit: Circuit):
+    fresh = _rebuilt(circuit)
+    assert _dag(circuit) == _dag(fresh)
+    assert _depths(circuit) == _depths(fresh)
+    assert circuit.draw() == fresh.draw()
+
+def _circuit(num_gates: int, nested: bool, seed: int = 0) -> Circuit:
+    circuit = Circuit(NUM_QUBITS)
+    circuit.extend(random_operations(num_gates, nested, seed))
+    return circuit
+
+def _random_gate(rng: random.Random) -> Gate:
+    if rng.random() < 0.5:
+        target, control = rng.sample(range(NUM_QUBITS), 2)
+        return Gate("CNOT", [target], [control])
+    return Gate(rng.choice(["H", "X", "T"]), [rng.randrange(NUM_QUBITS)])
+
+def _random_edit(circuit: Circuit, rng: random.Random):
+    kind = rng.choice(["insert", "remove", "replace", "replace_same_wires"])
+    if kind == "insert" or circuit.num_gates_flat == 0:
+        circuit.insert_gate(rng.randint(0, circuit.num_gates_flat), _random_gate(rng))
+        return
+    gate_idx = rng.randrange(circuit.num_gates_flat)
+    if kind == "remove":
+        circuit.remove_gate(gate_idx)
+    elif kind == "replace":
+        circuit.replace_gate(gate_idx, _random_gate(rng))
+    elif not isinstance(circuit.gates[gate_idx], Circuit):
+        old_gate = circuit.gates[gate_idx]
+        circuit.replace_gate(gate_idx, Gate("U", old_gate.target_qubits.copy(), old_gate.control_qubits.copy()))
+
+@pytest.mark.parametrize("nested", [False, True], ids=["flat", "nested"])
+def test_edits_match_a_fresh_build(nested):
+    rng = random.Random(1)
+    circuit = _circuit(200, nested)
+    for _ in range(60):
+        # warm the depth caches so the edits have something to invalidate
+        circuit.get_circ_depth(DepthResolution.EXPANDED)
+        _random_edit(circuit, rng)
+        assert_matches_rebuild(circuit)
+
+def test_edit_returns_the_detached_gate():
+    circuit = _circuit(20, False)
+    expected_removed, expected_replaced = circuit.gates[5], circuit.gates[0]
+    removed = circuit.remove_gate(5)
+    assert removed == expected_removed
+    assert removed.parents == [] and removed.children == []
+    assert circuit.replace_gate(0, Gate("H", [3])) == expected_replaced
+    assert circuit.gates[0] == Gate("H", [3])
+
+def test_appending_after_edits_keeps_the_wire_state():
+    rng = random.Random(2)
+    circuit = _circuit(50, False)
+    for _ in range(20):
+        _random_edit(circuit, rng)
+        circuit.add_gate(_random_gate(rng))
+    assert_matches_rebuild(circuit)
+
+def test_repeated_inserts_at_one_position():
+    # enough inserts between the same two gates to use up the label gap and force a respacing
+    rng = random.Random(4)
+    circuit = _circuit(30, False)
+    for _ in range(80):
+        circuit.insert_gate(15, _random_gate(rng))
+    assert_matches_rebuild(circuit)
+
+def test_out_of_range_edits_raise():
+    circuit = _circuit(5, False)
+    with pytest.raises(IndexError):
+        circuit.insert_gate(6, Gate("H", [0]))
+    with pytest.raises(IndexError):
+        circuit.remove_gate(5)
+    with pytest.raises(IndexError):
+        circuit.replace_gate(-1, Gate("H", [0]))
+    with pytest.raises(IndexError):
+        circuit.insert_gate(0, Gate("H", [NUM_QUBITS]))
+
+@pytest.mark.parametrize("nested", [False, True], ids=["flat", "nested"])
+def test_clone_edits_leave_the_source_untouched(nested):
+    rng = random.Random(3)
+    source = _circuit(200, nested)
+    source.get_circ_depth(DepthResolution.EXPANDED)
+    gates, dag, depths, drawing = list(source.gates), _dag(source), _depths(source), source.draw()
+    snapshot = _snapshot(source)
+    clone = source.clone()
+    for _ in range(30):
+        _random_edit(clone, rng)
+        assert_matches_rebuild(clone)
+    # plain gates are still the source's own objects, sub-circuits read after the clone are private copies
+    assert all(a is b for a, b in zip(source.gates, gates) if not isinstance(a, Circuit))
+    assert _snapshot(source) == snapshot
+    assert _dag(source) == dag and _depths(source) == depths and source.draw() == drawing
+    # and the other way round: editing the source does not leak into the clone
+    clone_dag = _dag(clone)
+    for _ in range(30):
+        _random_edit(source, rng)
+    assert _dag(clone) == clone_dag
+    assert_matches_rebuild(clone)
+    assert_matches_rebuild(source)
+
+def test_clone_edit_copies_only_the_gates_whose_edges_change():
+    source = _circuit(2000, False)
+    clone = source.clone()
+    clone.insert_gate(10, Gate("H", [0]))
+    clone.remove_gate(20)
+    shared = sum(a is b for a, b in zip(source.gates[30:], clone.gates[30:]))
+    assert shared >= len(source.gates[30:]) - 10
+    assert_matches_rebuild(clone)
+
+def _nested_source() -> Circuit:
+    inner = Circuit(NUM_QUBITS, "inner")
+    inner.add_gate(Gate("H", [0]))
+    outer = Circuit(NUM_QUBITS, "outer")
+    outer.add_gate(inner)
+    outer.add_gate(Gate("CNOT", [1], [0]))
+    source = Circuit(NUM_QUBITS)
+    source.add_gate(Gate("X", [0]))
+    source.add_gate(outer)
+    source.add_gate(Gate("T", [1]))
+    source.metadata = {'tags': ['a'], 'layout': {'start_qubit': 0}}
+    return source
+
+def _snapshot(circuit: Circuit):
+    return circuit.draw(False), _dag(circuit), [
+        _snapshot(gate) if isinstance(gate, Circuit) else (gate.name, gate.target_qubits, gate.control_qubits, gate.parameters)
+        for gate in circuit.gates
+    ]
+
+def test_clone_mutations_leave_the_source_untouched():
+    source = _nested_source()
+    snapshot, metadata = _snapshot(source), {'tags': ['a'], 'layout': {'start_qubit': 0}}
+    clone = source.clone()
+    # top-level gates
+    clone.insert_gate(0, Gate("H", [2]))
+    clone.replace_gate(3, Gate("RX", [1], parameters={'theta': 0.5}))
+    clone.remove_gate(1)
+    clone.num_qubits = NUM_QUBITS + 1
+    # nested circuits, two levels deep
+    clone.gates[1].add_gate(Gate("Z", [2]))
+    clone.gates[1].gates[0].add_gate(Gate("Y", [1]))
+    clone.gates[1].gates[0].remove_gate(0)
+    # metadata
+    clone.metadata['tags'].append('b')
+    clone.metadata['layout']['start_qubit'] = 2
+    assert _snapshot(source) == snapshot and source.metadata == metadata
+    assert source.num_qubits == NUM_QUBITS
+    assert_matches_rebuild(source)
+
+def test_source_mutations_leave_the_clone_untouched():
+    source = _nested_source()
+    clone = source.clone()
+    snapshot = _snapshot(clone)
+    # the source touches its sub-circuits before the clone ever reads them
+    source.gates[1].add_gate(Gate("Z", [2]))
+    source.gates[1].gates[0].add_gate(Gate("Y", [1]))
+    source.gates[1].partition_id = 3
+    source.remove_gate(0)
+    source.metadata['tags'].append('b')
+    assert _snapshot(clone) == snapshot and clone.metadata['tags'] == ['a']
+    assert clone.gates[1].partition_id == -1
+    assert_matches_rebuild(clone)
+
+def test_clones_of_clones_stay_independent():
+    source = _nested_source()
+    clone = source.clone()
+    second = clone.clone()
+    snapshot = _snapshot(source)
+    clone.gates[1].add_gate(Gate("Z", [2]))
+    second.gates[1].gates[0].add_gate(Gate("Y", [1]))
+    assert _snapshot(source) == snapshot
+    assert clone.gates[1].num_gates_flat == 3 and clone.gates[1].gates[0].num_gates_flat == 1
+    assert second.gates[1].num_gates_flat == 2 and second.gates[1].gates[0].num_gates_flat == 2
+
+def test_clone_copies_a_sub_circuit_only_once_it_is_read():
+    source = _circuit(400, True)
+    clone = source.clone()
+    sub_idx = next(i for i, gate in enumerate(source._iter_gates()) if isinstance(gate, Circuit))
+    sub_circuit = clone.gates[sub_idx]
+    sub_circuit.add_gate(Gate("H", [min(sub_circuit.qubits)]))
+    shared = [a is b for a, b in zip(source._iter_gates(), clone._iter_gates())]
+    assert shared.count(False) == 1 and not shared[sub_idx]
+    assert_matches_rebuild(clone)
+
+def test_edge_positions_come_from_the_circuit():
+    circuit = _circuit(50, False)
+    circuit.insert_gate(5, Gate("H", [0]))
+    circuit.remove_gate(20)
+    for gate_idx, gate in enumerate(circuit.gates):
+        assert gate.parents == circuit.get_parents(gate_idx) and gate.children == circuit.get_children(gate_idx)
+    # a gate shared with a clone reports its positions in the circuit it was read from
+    clone = circuit.clone()
+    clone.insert_gate(0, Gate("X", [1]))
+    assert clone.gates[11].parents == clone.get_parents(11)
+    assert circuit.gates[10].parents == circuit.get_parents(10)
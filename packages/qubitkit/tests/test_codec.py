@@ -0,0 +1,99 @@
+"""codec maps the backend placed_gates JSON to circuits and back, keeping ids and nested start_qubit offsets"""
+import pytest
+
+from qubitkit import Circuit, Gate, codec
+from qubitkit.circuit import DepthResolution
+
+FLAT = {
+    'num_qubits': 3,
+    'placed_gates': [
+        {'id': 'g0', 'depth': 0, 'gate': {'name': 'H'}, 'target_qubits': [0], 'control_qubits': [], 'parameters': []},
+        {'id': 'g1', 'depth': 1, 'gate': {'name': 'CNOT'}, 'target_qubits': [1], 'control_qubits': [0], 'parameters': []},
+        {'id': 'g2', 'depth': 0, 'gate': {'name': 'RX'}, 'target_qubits': [2], 'control_qubits': [], 'parameters': [0.5]},
+        {'id': 'g3', 'depth': 2, 'gate': {'name': 'U'}, 'target_qubits': [2], 'control_qubits': [1], 'parameters': [0.1, 0.2, 0.3]},
+    ]
+}
+
+NESTED = {
+    'num_qubits': 5,
+    'placed_gates': [
+        {'id': 'g0', 'depth': 0, 'gate': {'name': 'H'}, 'target_qubits': [1], 'control_qubits': [], 'parameters': []},
+        {
+            'id': 'c0', 'depth': 1, 'start_qubit': 1,
+            'circuit': {'id': 'bell', 'symbol': 'BELL', 'gates': [
+                {'id': 'c0g0', 'depth': 0, 'gate': {'name': 'H'}, 'target_qubits': [0], 'control_qubits': [], 'parameters': []},
+                {
+                    'id': 'c0c0', 'depth': 0, 'start_qubit': 1,
+                    'circuit': {'id': 'rot', 'symbol': 'ROT', 'gates': [
+                        {'id': 'c0c0g0', 'depth': 0, 'gate': {'name': 'RY'}, 'target_qubits': [1], 'control_qubits': [0], 'parameters': [1.5]},
+                    ]}
+                },
+            ]}
+        },
+        {'id': 'g1', 'depth': 2, 'gate': {'name': 'CNOT'}, 'target_qubits': [4], 'control_qubits': [3], 'parameters': []},
+    ]
+}
+
+def _dag(circuit: Circuit):
+    return [(circuit.get_parents(i), circuit.get_children(i)) for i in range(circuit.num_gates_flat)]
+
+def _assert_same_gates(actual, expected):
+    assert len(actual) == len(expected)
+    for a, e in zip(actual, expected):
+        assert a['id'] == e['id']
+        assert a['depth'] == e['depth']
+        if 'circuit' in e:
+            assert a['start_qubit'] == e['start_qubit']
+            assert a['circuit']['id'] == e['circuit']['id'] and a['circuit']['symbol'] == e['circuit']['symbol']
+            _assert_same_gates(a['circuit']['gates'], e['circuit']['gates'])
+            continue
+        assert a['gate'] == e['gate']
+        assert a['target_qubits'] == e['target_qubits'] and a['control_qubits'] == e['control_qubits']
+        assert a['parameters'] == e['parameters']
+
+@pytest.mark.parametrize("payload", [FLAT, NESTED], ids=["flat", "nested"])
+def test_json_round_trip(payload):
+    encoded = codec.to_json(codec.from_json(payload))
+    assert encoded['num_qubits'] == payload['num_qubits']
+    _assert_same_gates(encoded['placed_gates'], payload['placed_gates'])
+
+def test_nested_circuits_use_absolute_qubits():
+    circuit = codec.from_json(NESTED)
+    outer = circuit.gates[1]
+    assert outer.id == 'c0' and outer.name == 'BELL'
+    assert outer.metadata[codec.START_QUBIT_KEY] == 1 and outer.metadata[codec.CIRCUIT_ID_KEY] == 'bell'
+    assert outer.gates[0].target_qubits == [1]
+    inner = outer.gates[1]
+    assert inner.id == 'c0c0' and inner.metadata[codec.START_QUBIT_KEY] == 1
+    rotation = inner.gates[0]
+    assert rotation.id == 'c0c0g0'
+    assert rotation.target_qubits == [3] and rotation.control_qubits == [2]
+    assert rotation.parameters == {'p0': 1.5}
+    assert circuit.qubits == {1, 2, 3, 4}
+    # the sub-circuit now sits between the H on q1 and the CNOT on q3
+    assert circuit.get_parents(1) == [0] and circuit.get_children(1) == [2]
+
+def _added_one_by_one(num_qubits: int, placed_gates, start_qubit: int = 0, name: str = "Circuit") -> Circuit:
+    circuit = Circuit(num_qubits, name)
+    for gate_info in placed_gates:
+        if gate_info.get('circuit'):
+            circuit_info = gate_info['circuit']
+            circuit.add_gate(_added_one_by_one(
+                num_qubits, circuit_info['gates'], start_qubit + gate_info['start_qubit'], circuit_info['symbol']
+            ))
+            continue
+        circuit.add_gate(Gate(
+            gate_info['gate']['name'],
+            [q + start_qubit for q in gate_info['target_qubits']],
+            [q + start_qubit for q in gate_info['control_qubits']]
+        ))
+    return circuit
+
+@pytest.mark.parametrize("payload", [FLAT, NESTED], ids=["flat", "nested"])
+def test_from_placed_gates_builds_the_same_dag_as_add_gate(payload):
+    decoded = codec.from_placed_gates(payload['placed_gates'], payload['num_qubits'])
+    expected = _added_one_by_one(payload['num_qubits'], payload['placed_gates'])
+    assert _dag(decoded) == _dag(expected)
+    for resolution in (DepthResolution.ATOMIC, DepthResolution.EXPANDED):
+        assert decoded.get_circ_depth(resolution) == expected.get_circ_depth(resolution)
+    assert decoded.draw() == expected.draw()
@@ -0,0 +1,123 @@
+"""Commutation-aware dependencies: gates diagonal in the same basis on a shared wire get no edge"""
+import random
+
+import pytest
+
+from qubitkit import Circuit, CommutationTable, Gate
+from qubitkit.commutation import X_BASIS, Z_BASIS
+from .test_circuit_edits import assert_matches_rebuild
+
+def _circuit(gates, commutation_table=None, num_qubits: int = 4) -> Circuit:
+    circuit = Circuit(num_qubits, commutation_table=commutation_table or CommutationTable())
+    circuit.extend(gates)
+    return circuit
+
+def _edges(circuit: Circuit):
+    return {(parent, child) for child in range(circuit.num_gates_flat) for parent in circuit.get_parents(child)}
+
+def test_diagonal_gates_on_a_shared_wire_commute():
+    gates = [
+        Gate("Z", [0]),
+        Gate("RZ", [0], parameters={"theta": 0.3}),
+        Gate("CZ", [1], [0]),
+        Gate("CP", [0], [1], parameters={"phi": 0.2}),
+        Gate("T", [0]),
+    ]
+    circuit = _circuit(gates)
+    assert _edges(circuit) == set()
+    assert circuit.get_circ_depth() == 1
+    ordered = Circuit(4)
+    ordered.extend(gates)
+    assert ordered.get_circ_depth() == 5
+
+def test_cnots_sharing_only_a_control_or_only_a_target_commute():
+    assert _edges(_circuit([Gate("CNOT", [1], [0]), Gate("CNOT", [2], [0])])) == set()
+    assert _edges(_circuit([Gate("CNOT", [2], [0]), Gate("CNOT", [2], [1])])) == set()
+    # the control of one sits on the target of the other: Z against X
+    assert _edges(_circuit([Gate("CNOT", [1], [0]), Gate("CNOT", [0], [1])])) == {(0, 1)}
+
+@pytest.mark.parametrize("gates", [
+    [Gate("H", [0]), Gate("Z", [0])],
+    [Gate("CNOT", [1], [0]), Gate("Z", [1])],
+    [Gate("X", [0]), Gate("RZ", [0], parameters={"theta": 0.1})],
+], ids=["H-Z", "CNOT_target-Z", "X-RZ"])
+def test_non_commuting_pair_keeps_its_edge(gates):
+    circuit = _circuit(gates)
+    assert _edges(circuit) == {(0, 1)}
+    assert circuit.get_circ_depth() == 2
+
+def test_a_group_depends_on_the_whole_previous_group():
+    circuit = _circuit([Gate("Z", [0]), Gate("T", [0]), Gate("X", [0]), Gate("RX", [0]), Gate("S", [0])])
+    assert _edges(circuit) == {(0, 2), (1, 2), (0, 3), (1, 3), (2, 4), (3, 4)}
+    assert circuit.get_circ_depth() == 3
+
+def test_unregistered_gates_and_sub_circuits_never_commute():
+    sub_circuit = Circuit(4)
+    sub_circuit.add_gate(Gate("Z", [0]))
+    circuit = _circuit([Gate("Z", [0]), Gate("MYZ", [0]), sub_circuit, Gate("Z", [0])])
+    assert _edges(circuit) == {(0, 1), (1, 2), (2, 3)}
+
+def test_register_a_custom_gate():
+    table = CommutationTable()
+    table.register("myz", Z_BASIS)
+    table.register("MYCX", X_BASIS)
+    circuit = _circuit([Gate("Z", [0]), Gate("MYZ", [0]), Gate("CNOT", [1], [0]), Gate("MYCX", [1], [2])], table)
+    assert _edges(circuit) == set()
+    assert not CommutationTable().commute(Gate("Z", [0]), Gate("MYZ", [0]))
+
+def test_constructor_bases_override_the_defaults():
+    table = CommutationTable({"H": (X_BASIS, None), "Z": (None, None)})
+    assert table.commute(Gate("H", [0]), Gate("X", [0]))
+    assert not table.commute(Gate("Z", [0]), Gate("T", [0]))
+    assert "H" not in CommutationTable().bases
+
+def test_setting_the_table_rebuilds_the_edges():
+    circuit = Circuit(4)
+    circuit.extend([Gate("Z", [0]), Gate("T", [0])])
+    assert _edges(circuit) == {(0, 1)}
+    circuit.commutation_table = CommutationTable()
+    assert _edges(circuit) == set()
+    circuit.commutation_table = None
+    assert _edges(circuit) == {(0, 1)}
+
+def _random_gate(rng: random.Random) -> Gate:
+    target, control = rng.sample(range(4), 2)
+    return rng.choice([
+        Gate("Z", [target]), Gate("T", [target]), Gate("X", [target]), Gate("H", [target]),
+        Gate("CZ", [target], [control]), Gate("CNOT", [target], [control]),
+    ])
+
+def test_edits_match_a_fresh_build():
+    rng = random.Random(5)
+    circuit = _circuit([_random_gate(rng) for _ in range(60)])
+    clone = circuit.clone()
+    for _ in range(40):
+        kind = rng.choice(["insert", "remove", "replace"])
+        if kind == "insert":
+            clone.insert_gate(rng.randint(0, clone.num_gates_flat), _random_gate(rng))
+        elif kind == "remove":
+            clone.remove_gate(rng.randrange(clone.num_gates_flat))
+        else:
+            clone.replace_gate(rng.randrange(clone.num_gates_flat), _random_gate(rng))
+        assert_matches_rebuild(clone)
+    assert_matches_rebuild(circuit)
+
+def test_edits_only_touch_the_neighbouring_groups():
+    rng = random.Random(6)
+    circuit = _circuit([_random_gate(rng) for _ in range(2000)])
+    clone = circuit.clone()
+    clone.insert_gate(10, Gate("Z", [0]))
+    clone.remove_gate(20)
+    clone.replace_gate(30, Gate("X", [1]))
+    shared = sum(a is b for a, b in zip(circuit.gates[60:], clone.gates[60:]))
+    assert shared == len(circuit.gates[60:])
+    assert_matches_rebuild(clone)
+
+def test_appending_after_edits_keeps_the_group_state():
+    rng = random.Random(7)
+    circuit = _circuit([_random_gate(rng) for _ in range(60)])
+    for _ in range(30):
+        circuit.insert_gate(rng.randint(0, circuit.num_gates_flat), _random_gate(rng))
+        circuit.remove_gate(rng.randrange(circuit.num_gates_flat))
+        circuit.add_gate(_random_gate(rng))
+        assert_matches_rebuild(circuit)